@@ -1,4 +1,5 @@
 import os
+import sys
 import django
 from django.conf import settings
 
@@ -15,8 +16,17 @@ from django.core.asgi import get_asgi_application
 from pong.routing import websocket_pong_urlpatterns
 from liarsbar.routing import websocket_liarsbar_urlpatterns
 from social.routing import websocket_social_urlpatterns
+from utilities.GameMetrics import start_metrics_server
+from utilities.MatchManager import start_match_workers
 
 django_asgi_app = get_asgi_application()
+start_metrics_server()
+
+# Served by daphne: listen for the rooms created by the HTTP views as soon as its event loop runs,
+# instead of waiting for a websocket of this process to open a room.
+if "twisted.internet.reactor" in sys.modules:
+    from twisted.internet import reactor
+    reactor.callLater(0, start_match_workers)
 
 websocket_urlpatterns = websocket_pong_urlpatterns + websocket_liarsbar_urlpatterns + websocket_social_urlpatterns
 
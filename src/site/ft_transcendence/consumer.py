@@ -2,18 +2,58 @@ import json
 
 from autobahn.websocket.protocol import Disconnected
 from channels.generic.websocket import AsyncWebsocketConsumer
+from utilities.SnapshotStream import FRAME_FORMAT_JSON, FRAME_FORMATS
+
+# Event fields that are already sent as lobby_info or as a pre-encoded frame, never forwarded inside event_info.
+EXCLUDED_EVENT_FIELDS = {"frames", "lobby_snapshot", "tournament_snapshot"}
 
 class BaseConsumer(AsyncWebsocketConsumer):
 	"""
 	Base consumer that provides common functionality for joining/leaving groups,
 	sending messages safely, and parsing incoming JSON.
 	"""
+	frame_format = FRAME_FORMAT_JSON
+
 	async def join_group(self, group_name: str):
 		await self.channel_layer.group_add(group_name, self.channel_name)
 
 	async def leave_group(self, group_name: str):
 		await self.channel_layer.group_discard(group_name, self.channel_name)
 
+	async def join_match(self, match):
+		"""
+		Joins the group of a lobby or tournament and subscribes to its snapshot stream.
+		"""
+		await self.join_group(match.room_group_name)
+		match.snapshot_stream.subscribe(self.channel_name, self.frame_format)
+
+	async def leave_match(self, match):
+		match.snapshot_stream.unsubscribe(self.channel_name)
+		await self.leave_group(match.room_group_name)
+
+	def get_match(self):
+		"""
+		Returns the lobby or tournament this consumer is attached to, if any.
+		"""
+		return getattr(self, "lobby", None) or getattr(self, "tournament", None)
+
+	async def set_frame_format(self, data: dict):
+		"""
+		Switches the format of the 'game_loop' frames sent to this connection ('json', 'delta' or 'binary').
+		Also used by delta clients to ask for a new keyframe after a missed frame.
+		"""
+		frame_format = data.get("format", self.frame_format)
+		match = self.get_match()
+		try:
+			if match:
+				match.snapshot_stream.subscribe(self.channel_name, frame_format)
+			elif frame_format not in FRAME_FORMATS:
+				raise ValueError(f"Unsupported frame format: {frame_format}")
+		except ValueError as e:
+			print(f"Error in set_frame_format: {e}")
+			return
+		self.frame_format = frame_format
+
 	async def safe_send(self, data: dict):
 		try:
 			await self.send(text_data=json.dumps(data))
@@ -32,6 +72,9 @@ class BaseConsumer(AsyncWebsocketConsumer):
 		if data.get("type") == "ping":
 			await self.safe_send({'type': 'pong', 'time': data.get('time')})
 			return
+		if data.get("type") == "set_frame_format":
+			await self.set_frame_format(data)
+			return
 		await self.handle_event(data)
 
 	async def handle_event(self, data: dict):
@@ -45,15 +88,53 @@ class BaseConsumer(AsyncWebsocketConsumer):
 		if hasattr(self, "user_id"):
 			await self.channel_layer.group_send(f"user_{self.user_id}", data)
 
+	@staticmethod
+	def get_event_info(event: dict) -> dict:
+		"""
+		Returns the event without the snapshot and frame fields, to be forwarded to the client as event_info.
+		"""
+		return {key: value for key, value in event.items() if key not in EXCLUDED_EVENT_FIELDS}
+
+	async def send_game_frame(self, event: dict) -> bool:
+		"""
+		Forwards the pre-encoded frame of a 'game_loop' event in the format used by this connection.
+		Falls back to the JSON frame when the game has no frame in that format.
+
+		A frame in neither format is skipped: the format change of this connection has not reached
+		the owner of the match yet, and the next frames will be in the right format. Rebuilding the
+		state here would send an empty one when the match runs on another worker.
+
+		Returns:
+			bool: True if the event was handled, False if it has to be serialized by the consumer.
+		"""
+		frames = event.get("frames")
+		if not frames:
+			return False
+
+		frame = frames.get(self.frame_format) or frames.get(FRAME_FORMAT_JSON)
+		if frame is None:
+			return True
+
+		try:
+			if isinstance(frame, bytes):
+				await self.send(bytes_data=frame)
+			else:
+				await self.send(text_data=frame)
+		except Disconnected:
+			print("Attempted to send a game frame on closed connection.")
+		return True
+
 	async def lobby_state(self, event: dict):
 		"""
 		Sends updated state information to the client.
 		Falls back to self.lobby.to_dict() if no snapshot is provided.
 		"""
+		if await self.send_game_frame(event):
+			return
 		snapshot_key = "lobby_snapshot" if "lobby_snapshot" in event else "tournament_snapshot"
 		state_info = event.get(snapshot_key) or (self.lobby.to_dict() if self.lobby else {})
 		data_to_send = {
-			"event_info": event,
+			"event_info": self.get_event_info(event),
 			"lobby_info": state_info,
 		}
 		await self.safe_send(data_to_send)
\ No newline at end of file
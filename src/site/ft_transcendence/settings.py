@@ -80,7 +80,7 @@ if not DEBUG:
     # Use Redis for production channel layers.
     CHANNEL_LAYERS = {
         "default": {
-            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "BACKEND": "utilities.ChannelLayers.BatchRedisChannelLayer",
             "CONFIG": {
                 "hosts": [("redis", 6379)],
                 "capacity": 1500,
@@ -88,6 +88,20 @@ if not DEBUG:
             },
         },
     }
+    # Rooms are registered in Redis so every Daphne worker can reach the worker running them.
+    MATCH_REGISTRY = {
+        "hosts": [("redis", 6379)],
+        "ttl": 30,
+    }
+    # Matchmaking queues are kept in Redis so players connected to different workers can be matched.
+    MATCHMAKING = {
+        "hosts": [("redis", 6379)],
+    }
+    # User statuses are kept in Redis, with a TTL refreshed by the worker holding the connections.
+    PRESENCE = {
+        "hosts": [("redis", 6379)],
+        "ttl": 60,
+    }
     # Secure cookies.
     SESSION_COOKIE_SECURE = True
     CSRF_COOKIE_SECURE = True
@@ -101,6 +115,17 @@ else:
     CHANNEL_LAYERS = {
         "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
     }
+    MATCH_REGISTRY = None
+    MATCHMAKING = None
+    PRESENCE = None
+
+# --- GAME SIMULATION ---
+# Number of worker processes running the Pong physics, 0 to keep it on the event loop.
+PONG_SIMULATION_SHARDS = int(os.environ.get("PONG_SIMULATION_SHARDS", 0))
+# Step the balls of each shard with the vectorized NumPy engine (see pong/scripts/BatchPhysics.py).
+PONG_BATCH_PHYSICS = bool(int(os.environ.get("PONG_BATCH_PHYSICS", 0)))
+# Port of the Prometheus endpoint of the websocket server, where the game loops run. 0 disables it.
+GAME_METRICS_PORT = int(os.environ.get("GAME_METRICS_PORT", 0 if DEBUG else 9100))
 
 # --- CONTENT SECURITY POLICY (CSP) ---
 CSP_DEFAULT_SRC = ("'self'", "blob:")
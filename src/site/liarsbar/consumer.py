@@ -1,18 +1,18 @@
 import json
-import uuid
 
 from utilities.lobby import Lobby
 from utilities.MatchManager import MatchManager
+from utilities.Matchmaking import MatchmakingService
 from ft_transcendence.consumer import BaseConsumer
 from channels.generic.websocket import AsyncWebsocketConsumer
 from .scripts.LiarsBarGameManager import LiarsBarGameManager
 
 LOBBY_NAME = "lobby"
-match_manager = MatchManager()
+match_manager = MatchManager("liarsbar", LiarsBarGameManager)
+matchmaking = MatchmakingService("liarsbar", group_size=4, room_prefix="liarsbar_")
 
 
 class LiarsBarMatchmaking(AsyncWebsocketConsumer):
-	matchmaking_queue = list()
 	room_group_name = "liarsbar_matchmaking"
 
 	async def connect(self):
@@ -24,8 +24,7 @@ class LiarsBarMatchmaking(AsyncWebsocketConsumer):
 	async def disconnect(self, close_code):
 		"""Handles WebSocket disconnection"""
 		await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
-		if self.channel_name in self.matchmaking_queue:
-			self.matchmaking_queue.remove(self.channel_name)
+		await matchmaking.leave(self.channel_name)
 
 	async def receive(self, text_data):
 		"""Handles messages received from WebSocket clients"""
@@ -33,35 +32,18 @@ class LiarsBarMatchmaking(AsyncWebsocketConsumer):
 		action = request.get("action")
 
 		if action == "join_matchmaking":
-			if self.channel_name in self.matchmaking_queue:
+			if not await matchmaking.join(self.channel_name, self.scope["user"].id):
 				print(f"Player {self.channel_name} is already in the matchmaking queue.")
 				return
-			
-			self.matchmaking_queue.append(self.channel_name)
 
-			print(f"Player {self.channel_name} joined matchmaking. Queue size: {len(self.matchmaking_queue)}")
-			await self.check_for_match()
+			print(f"Player {self.channel_name} joined matchmaking.")
 		elif action == "close_matchmaking":
-			self.disconnect(0)
-
-	async def check_for_match(self):
-		"""Checks if there are enough players to create a match"""
-		while len(self.matchmaking_queue) >= 4:
-			players = [self.matchmaking_queue.pop() for _ in range(4)]
-			room_name = f"liarsbar_{uuid.uuid4()}"
-
-			for player in players:
-				await self.channel_layer.send(
-					player,
-					{
-						"type": "send.match.found",
-						"room_name": room_name,
-					}
-				)
+			await matchmaking.leave(self.channel_name)
 
 	async def send_match_found(self, event):
 		"""Sends match found event to a player"""
 		room_name = event["room_name"]
+		matchmaking.matched(self.channel_name)
 		await self.send(text_data=json.dumps({
 			"type": "setup_liarsbar_lobby",
 			"room_name": room_name
@@ -71,16 +53,14 @@ class LiarsBarConsumer(BaseConsumer):
 	async def connect(self):
 		self.room_name = self.scope["url_route"]["kwargs"]["room_name"]
 	
-		self.lobby: Lobby = match_manager.get_match(self.room_name) 
-		if self.lobby == None:
-			self.lobby = match_manager.create_match("liarsbar", self.room_name,  LiarsBarGameManager(), LOBBY_NAME)
+		self.lobby: Lobby = await match_manager.open_match("liarsbar", self.room_name, LOBBY_NAME)
 
-		await self.channel_layer.group_add(self.lobby.room_group_name, self.channel_name)
+		await self.join_match(self.lobby)
 		await self.accept()
 
 	async def disconnect(self, close_code):
 		await self.lobby.broadcast_message({"type": "lobby_state"})
-		await self.channel_layer.group_discard(self.lobby.room_group_name, self.channel_name)
+		await self.leave_match(self.lobby)
 
 	async def handle_event(self, data: dict):
 		if self.lobby:
@@ -89,10 +69,13 @@ class LiarsBarConsumer(BaseConsumer):
 	async def lobby_state(self, event: dict):
 		"""Aggiorna lo stato lato client."""
 
+		if await self.send_game_frame(event):
+			return
+
 		lobby_info = event.get("lobby_snapshot") or self.lobby.to_dict()
 
 		data_to_send = {
-			"event_info": event,
+			"event_info": self.get_event_info(event),
 			"lobby_info": lobby_info
 		}
 
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('liarsbar', '0004_alter_liarsbarmatch_end_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='liarsbarmatch',
+            name='result_id',
+            field=models.UUIDField(blank=True, editable=False, help_text='Idempotency key of the result the match was saved from.', null=True, unique=True),
+        ),
+    ]
@@ -58,6 +58,13 @@ class LiarsBarMatch(models.Model):
         help_text="Timestamp when the match ended.",
         auto_now=True
     )
+    result_id = models.UUIDField(
+        null=True,
+        blank=True,
+        unique=True,
+        editable=False,
+        help_text="Idempotency key of the result the match was saved from."
+    )
 
     def __str__(self):
         """
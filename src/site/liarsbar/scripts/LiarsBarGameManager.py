@@ -1,4 +1,3 @@
-from datetime import datetime
 import random
 import asyncio
 import time
@@ -7,9 +6,11 @@ from .card import Card
 from .LiarsBarPlayer import LiarsBarPlayer
 from utilities.GameManager import GameManager
 from utilities.Player import Player
-from website.models import User, MatchHistory, UserStats
-from channels.db import database_sync_to_async
+from website.models import User, MatchHistory, MatchTimeline, UserStats
+from django.db import transaction
+from django.utils import timezone
 from liarsbar.models import LiarsBarMatch
+from utilities.PersistenceQueue import match_results
 
 class LiarsBarGameManager(GameManager):
 	"""
@@ -34,7 +35,7 @@ class LiarsBarGameManager(GameManager):
 
 	def start_game(self):
 		"""Marks the game as started."""
-		self.start_match_timestamp = datetime.now()
+		self.start_match_timestamp = timezone.now()
 		self.game_loop_is_active = True
 		
 	def init_cards(self) -> list[Card]:
@@ -222,68 +223,78 @@ class LiarsBarGameManager(GameManager):
 			
 	
 	async def clear_and_save(self, is_game_ended: bool, player_disconnected_id: int = None):
-			"""Saves the match results and updates players' match history."""
+			"""Ends the match and hands its result to the write-behind queue, without waiting for the database."""
 			"""to do: controlli se ci sono tutti i player, se il player si disconnette"""
 			players_list = list(self.players.keys())
 			if len(players_list) < 4:
 				return
-			users = []
-			winner_user = None
+			winner_id = None
 			for player in self.players.values():
-				user = await database_sync_to_async(User.objects.get)(id=player.player_id)
-				users.append(user)
 				if player.status == LiarsBarPlayer.PlayerStatus.ALIVE:
-					winner_user = user
+					winner_id = player.player_id
 
-			match = await database_sync_to_async(LiarsBarMatch.objects.create)(
+			self.game_loop_is_active = False
+			await match_results.submit("liarsbar", {
+				"player_ids": [player.player_id for player in self.players.values()],
+				"winner_id": winner_id,
+				"start_date": self.start_match_timestamp,
+				"end_date": timezone.now(),
+			})
+
+	@staticmethod
+	def save_match(record: dict):
+		"""
+		Records a finished match, the players' stats and their match history in a single transaction.
+		Called by the write-behind queue; a record whose result_id is already saved is skipped.
+
+		Args:
+			record (dict): The result queued by clear_and_save.
+		"""
+		with transaction.atomic():
+			if LiarsBarMatch.objects.filter(result_id=record["result_id"]).exists():
+				return
+
+			player_ids = [int(player_id) for player_id in record["player_ids"]]
+			users = User.objects.in_bulk(player_ids)
+			if len(users) != len(player_ids):
+				raise User.DoesNotExist("User matching query does not exist.")
+			users = [users[player_id] for player_id in player_ids]
+			winner_user = next((user for user in users if user.id == record["winner_id"]), None)
+
+			match = LiarsBarMatch.objects.create(
 				first_user=users[0],
 				second_user=users[1],
 				third_user=users[2],
 				fourth_user=users[3],
-    			user_winner=winner_user,
-				start_date=self.start_match_timestamp
+				user_winner=winner_user,
+				start_date=record["start_date"],
+				result_id=record["result_id"],
 			)
-			# print("2 prova")
-			await database_sync_to_async(match.save)()
+			# end_date is auto_now: put back when the match actually ended, not when it was written.
+			match.end_date = record["end_date"]
+			LiarsBarMatch.objects.filter(pk=match.pk).update(end_date=match.end_date)
 
-			try:
-				first_player_stats = await database_sync_to_async(
-					lambda: UserStats.objects.select_related('user').get(user=users[0])
-				)()
-				second_player_stats = await database_sync_to_async(
-					lambda: UserStats.objects.select_related('user').get(user=users[1])
-				)()
-				third_player_stats = await database_sync_to_async(
-					lambda: UserStats.objects.select_related('user').get(user=users[2])
-				)()
-				fourth_player_stats = await database_sync_to_async(
-					lambda: UserStats.objects.select_related('user').get(user=users[3])
-				)()
-			except UserStats.DoesNotExist:
-				return
-			first_player_stats.update_with_match_info_liarsbar(match)
-			second_player_stats.update_with_match_info_liarsbar(match)
-			third_player_stats.update_with_match_info_liarsbar(match)
-			fourth_player_stats.update_with_match_info_liarsbar(match)
+			# Lock the stats rows in a fixed order so two matches ending together cannot deadlock.
+			players_stats = list(
+				UserStats.objects.select_for_update()
+				.select_related('user')
+				.filter(user_id__in=player_ids)
+				.order_by("user_id")
+			)
+			if len(players_stats) != len(player_ids):
+				# Raised so the whole record is rolled back, retried and logged by the write-behind queue.
+				raise UserStats.DoesNotExist(f"UserStats not found for some of the users {player_ids}.")
+			updated_at = timezone.now()
+			for player_stats in players_stats:
+				player_stats.update_with_match_info_liarsbar(match)
+				player_stats.date_updated = updated_at
+			UserStats.objects.bulk_update(
+				players_stats,
+				["exp", "liarsbar_win", "liarsbar_lose", "time_on_site", "date_updated"],
+			)
 
-			await database_sync_to_async(first_player_stats.save)()
-			await database_sync_to_async(second_player_stats.save)()
-			await database_sync_to_async(third_player_stats.save)()
-			await database_sync_to_async(fourth_player_stats.save)()
-   
-			player1_history, _ = await database_sync_to_async(MatchHistory.objects.get_or_create)(user=users[0])
-			player2_history, _ = await database_sync_to_async(MatchHistory.objects.get_or_create)(user=users[1])
-			player3_history, _ = await database_sync_to_async(MatchHistory.objects.get_or_create)(user=users[2])
-			player4_history, _ = await database_sync_to_async(MatchHistory.objects.get_or_create)(user=users[3])
-			async def add_match_to_history(history):
-				await database_sync_to_async(history.add_liarsbar_match)(match)
-				await database_sync_to_async(history.save)()
-			await add_match_to_history(player1_history)
-			await add_match_to_history(player2_history)
-			await add_match_to_history(player3_history)
-			await add_match_to_history(player4_history)
-			self.game_loop_is_active = False
-			
+			MatchHistory.add_match_for_users(match, player_ids)
+			MatchTimeline.add_match(match)
 
 	def to_dict(self) -> dict[str, any]:
 		"""
@@ -299,4 +310,6 @@ class LiarsBarGameManager(GameManager):
 			"turn_duration": self.turn_duration,
 			"card_required": self.card_required.name if self.card_required else None
 		})
-		return base_dict
\ No newline at end of file
+		return base_dict
+
+match_results.register("liarsbar", LiarsBarGameManager.save_match)
@@ -1,24 +1,21 @@
 import json
 import uuid
-import time
 
 from utilities.lobby import Lobby
-from website.models import User, UserStats
 from utilities.Tournament import Tournament
-from channels.db import database_sync_to_async
 from utilities.MatchManager import MatchManager
 from ft_transcendence.consumer import BaseConsumer
 from pong.scripts.PongGameManager import PongGameManager
 from channels.generic.websocket import AsyncWebsocketConsumer
+from utilities.Matchmaking import MatchmakingService
+from utilities.ProfileCache import profile_cache
 
-match_manager = MatchManager()
+match_manager = MatchManager("pong", PongGameManager)
+matchmaking = MatchmakingService("pong")
 LOBBY_NAME = "lobby"
 TOURNAMENT_NAME = "tournament"
 
 class PongMatchmaking(AsyncWebsocketConsumer):
-	base_mmr_gap = 20
-	max_mmr_gap = 100
-	matchmaking_queue = list()
 	room_group_name = "pong_matchmaking"
 
 	async def connect(self):
@@ -26,16 +23,8 @@ class PongMatchmaking(AsyncWebsocketConsumer):
 		self.user = self.scope["user"]
 		self.user_id = self.user.id
 
-		user = await database_sync_to_async(User.objects.get)(id=self.user_id)
-		user_stat: UserStats = await database_sync_to_async(UserStats.objects.get)(user=user)
-		self.user_mmr = user_stat.mmr
-		self.join_time = time.time()
-
-		self.user_object = {
-			'channel_name': self.channel_name,
-			'user_id': self.user_id,
-			'mmr': self.user_mmr
-		}
+		profile = await profile_cache.get(self.user_id)
+		self.user_mmr = profile["mmr"]
 
 		await self.channel_layer.group_add(self.room_group_name, self.channel_name)
 		await self.accept()
@@ -45,8 +34,7 @@ class PongMatchmaking(AsyncWebsocketConsumer):
 	async def disconnect(self, close_code):
 		"""Handles WebSocket disconnection"""
 		await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
-		if self.user_object in self.matchmaking_queue:
-			self.matchmaking_queue.remove(self.user_object)
+		await matchmaking.leave(self.channel_name)
 		print(f"Player disconnected: {self.user_id} | MMR: {self.user_mmr}")
 
 	async def receive(self, text_data):
@@ -55,76 +43,17 @@ class PongMatchmaking(AsyncWebsocketConsumer):
 		action = request.get("action")
 
 		if action == "join_matchmaking":
-			if any(obj['channel_name'] == self.channel_name for obj in self.matchmaking_queue):
+			if not await matchmaking.join(self.channel_name, self.user_id, self.user_mmr):
 				print(f"Player {self.user_id} is already in the matchmaking queue.")
 				return
-
-			self.matchmaking_queue.append(self.user_object)
-			print(f"Player {self.user_id} joined matchmaking. Queue size: {len(self.matchmaking_queue)}")
-			await self.check_for_match()
+			print(f"Player {self.user_id} joined matchmaking.")
 		elif action == "close_matchmaking":
-			self.disconnect(0)
-
-	async def check_for_match(self):
-		"""Checks if there are enough players to create a match"""
-
-		while len(self.matchmaking_queue) >= 2:
-			elapsed_time = time.time() - self.join_time
-			mmr_gap = self.base_mmr_gap
-
-			if elapsed_time > 20:
-				mmr_gap = min(self.base_mmr_gap + (elapsed_time // 20) * 20, self.max_mmr_gap)
-
-			player1 = self.matchmaking_queue[0]
-			player2 = self.matchmaking_queue[1]
-
-			player1_mmr = player1['mmr']
-			player2_mmr = player2['mmr']
-
-			if abs(player1_mmr - player2_mmr) <= mmr_gap:
-				room_name = str(uuid.uuid4())
-				await self.channel_layer.send(
-					player1['channel_name'],
-					{
-						"type": "send.match.found",
-						"room_name": room_name,
-					}
-				)
-				await self.channel_layer.send(
-					player2['channel_name'],
-					{
-						"type": "send.match.found",
-						"room_name": room_name,
-					}
-				)
-
-				self.matchmaking_queue.remove(player1)
-				self.matchmaking_queue.remove(player2)
-
-			if elapsed_time > 60:
-				room_name = str(uuid.uuid4())
-				await self.channel_layer.send(
-					player1['channel_name'],
-					{
-						"type": "send.match.found",
-						"room_name": room_name,
-					}
-				)
-				await self.channel_layer.send(
-					player2['channel_name'],
-					{
-						"type": "send.match.found",
-						"room_name": room_name,
-					}
-				)
-
-				self.matchmaking_queue.remove(player1)
-				self.matchmaking_queue.remove(player2)
-				break
+			await matchmaking.leave(self.channel_name)
 
 	async def send_match_found(self, event):
 		"""Sends match found event to a player"""
 		room_name = event["room_name"]
+		matchmaking.matched(self.channel_name)
 		await self.send(text_data=json.dumps({
 			"type": "setup_pong_lobby",
 			"room_name": room_name
@@ -135,16 +64,14 @@ class PongMultiplayerConsumer(BaseConsumer):
 		self.user_id = self.scope["user"].id
 		self.room_name = self.scope["url_route"]["kwargs"]["room_name"]
 
-		self.lobby: Lobby = match_manager.get_match(self.room_name)
-		if self.lobby is None:
-			self.lobby: Lobby = match_manager.create_match("pong", self.room_name, PongGameManager(True), LOBBY_NAME)
+		self.lobby: Lobby = await match_manager.open_match("pong", self.room_name, LOBBY_NAME, True)
 
-		await self.join_group(self.lobby.room_group_name)
+		await self.join_match(self.lobby)
 		await self.accept()
 
 	async def disconnect(self, close_code):
 		if self.lobby:
-			await self.leave_group(self.lobby.room_group_name)
+			await self.leave_match(self.lobby)
 
 	async def handle_event(self, data: dict):
 		if self.lobby:
@@ -160,12 +87,12 @@ class PongSingleplayerConsumer(BaseConsumer):
 		self.room_name = self.generate_random_room_name()
 		self.lobby: Lobby = match_manager.create_match("pong", self.room_name, PongGameManager(False), LOBBY_NAME)
 
-		await self.join_group(self.lobby.room_group_name)
+		await self.join_match(self.lobby)
 		await self.accept()
 
 	async def disconnect(self, close_code):
 		if self.lobby:
-			await self.leave_group(self.lobby.room_group_name)
+			await self.leave_match(self.lobby)
 
 	async def handle_event(self, data: dict):
 		event_type = data.get("type")
@@ -197,16 +124,14 @@ class PongLobbyConsumer(BaseConsumer):
 				"room_name": self.room_name,
 			})
 
-		self.lobby: Lobby = match_manager.get_match(self.room_name)
-		if self.lobby is None:
-			self.lobby: Lobby = match_manager.create_match("pong", self.room_name, PongGameManager(False), LOBBY_NAME)
+		self.lobby: Lobby = await match_manager.open_match("pong", self.room_name, LOBBY_NAME, False)
 
-		await self.join_group(self.lobby.room_group_name)
+		await self.join_match(self.lobby)
 		await self.accept()
 
 	async def disconnect(self, close_code):
 		if self.lobby:
-			await self.leave_group(self.lobby.room_group_name)
+			await self.leave_match(self.lobby)
 
 	async def handle_event(self, data: dict):
 		event_type = data.get("type")
@@ -220,13 +145,12 @@ class PongLobbyConsumer(BaseConsumer):
 
 	async def lobby_state(self, event: dict):
 		if event.get("event_name") == "player_join" and event.get("player_id"):
-			try:
-				user = await database_sync_to_async(User.objects.get)(id=event["player_id"])
-			except Exception as e:
-				raise ValueError(f"error while retrieving user: {str(e)}")
+			profile = await profile_cache.get(event["player_id"])
+			if profile is None:
+				raise ValueError(f"error while retrieving user: {event['player_id']} does not exist")
 			await self.send_to_social({
 				"type": "user_join_lobby",
-				"username": user.username,
+				"username": profile["username"],
 			})
 		await super().lobby_state(event)
 
@@ -243,16 +167,14 @@ class PongTournament(BaseConsumer):
 				"room_name": self.room_name,
 			})
 
-		self.tournament: Tournament = match_manager.get_match(self.room_name)
-		if self.tournament is None:
-			self.tournament: Tournament = match_manager.create_match("pong", self.room_name, PongGameManager(False), TOURNAMENT_NAME)
+		self.tournament: Tournament = await match_manager.open_match("pong", self.room_name, TOURNAMENT_NAME, False)
 
-		await self.join_group(self.tournament.room_group_name)
+		await self.join_match(self.tournament)
 		await self.accept()
 
 	async def disconnect(self, close_code):
 		if self.tournament:
-			await self.leave_group(self.tournament.room_group_name)
+			await self.leave_match(self.tournament)
 
 	async def handle_event(self, data: dict):
 		event_type = data.get("type")
@@ -269,8 +191,8 @@ class PongTournament(BaseConsumer):
 				"type": "user_join_tournament",
 				"players": event.get("players")
 			})
-		else:
+		elif not await self.send_game_frame(event):
 			await self.safe_send({
-				"event_info": event,
+				"event_info": self.get_event_info(event),
 				"lobby_info": event.get("tournament_snapshot") or self.tournament.to_dict(),
 			})
\ No newline at end of file
@@ -0,0 +1,117 @@
+import random
+import time
+from django.core.management.base import BaseCommand
+from pong.scripts import constants
+from pong.scripts.ball import Ball
+from pong.scripts.Paddle import Paddle
+from pong.scripts.BatchPhysics import BatchBallPhysics
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the scalar Ball against the vectorized BatchBallPhysics and report rooms per core at 60 Hz.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, nargs='+', default=[10, 100, 1000, 5000],
+                            help='Room counts to benchmark.')
+        parser.add_argument('--ticks', type=int, default=600, help='Ticks simulated for each room count.')
+        parser.add_argument('--tick-rate', type=int, default=60, help='Tick rate used to compute rooms per core.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def create_rooms(self, count):
+        """Helper method to create rooms with a served ball and paddles at random heights."""
+        rooms = []
+        half_reach = constants.GAME_BOUNDS["yMax"] - constants.PADDLE_HEIGHT / 2
+        for _ in range(count):
+            ball = Ball()
+            ball.start()
+            paddles = [
+                Paddle(constants.PADDLE_COLOR, constants.GAME_BOUNDS["xMin"] + 1),
+                Paddle(constants.PADDLE_COLOR, constants.GAME_BOUNDS["xMax"] - 1),
+            ]
+            for paddle in paddles:
+                paddle.y = random.uniform(-half_reach, half_reach)
+            rooms.append((ball, paddles))
+        return rooms
+
+    def step_scalar(self, rooms):
+        """Same physics as PongGameManager.step_simulation, without the players and the scores."""
+        for ball, paddles in rooms:
+            ball.update_position()
+            for paddle in paddles:
+                ball.handle_paddle_collision(paddle)
+            out_of_bounds = ball.is_out_of_bounds()
+            if out_of_bounds in {"right", "left"}:
+                ball.reset("player1" if out_of_bounds == "right" else "player2")
+
+    def step_batch(self, physics):
+        out = physics.step()
+        scored = out.nonzero()[0]
+        if len(scored):
+            physics.reset(scored, out[scored])
+
+    def check_parity(self, rooms, ticks):
+        """Steps the same rooms with both engines until the first goal and returns the largest difference."""
+        physics = BatchBallPhysics(len(rooms))
+        for index, (ball, paddles) in enumerate(rooms):
+            physics.add_room(index, ball, paddles)
+
+        max_difference = 0.0
+        active = list(range(len(rooms)))
+        for _ in range(ticks):
+            out = physics.step()
+            still_active = []
+            for index in active:
+                ball, paddles = rooms[index]
+                ball.update_position()
+                for paddle in paddles:
+                    ball.handle_paddle_collision(paddle)
+                scalar_out = {"right": 1, "left": -1}.get(ball.is_out_of_bounds(), 0)
+                if scalar_out != out[index]:
+                    return float("inf")
+                max_difference = max(
+                    max_difference,
+                    abs(ball.x - physics.x[index]),
+                    abs(ball.y - physics.y[index]),
+                    abs(ball.speed_x - physics.speed_x[index]),
+                    abs(ball.speed_y - physics.speed_y[index]),
+                    abs(ball.speed_multiplier - physics.speed_multiplier[index]),
+                )
+                # Serving is random, so rooms are only compared up to their first goal.
+                if scalar_out == 0:
+                    still_active.append(index)
+            active = still_active
+        return max_difference
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        ticks = options['ticks']
+        tick_budget = 1 / options['tick_rate']
+
+        difference = self.check_parity(self.create_rooms(200), ticks)
+        if difference == 0:
+            self.stdout.write(self.style.SUCCESS("Parity: batch engine matches the scalar Ball exactly"))
+        else:
+            self.stdout.write(self.style.WARNING(f"Parity: largest difference with the scalar Ball is {difference}"))
+
+        self.stdout.write(f"{'rooms':>8} {'scalar us/tick':>15} {'batch us/tick':>15} {'speedup':>8} "
+                          f"{'scalar rooms/core':>18} {'batch rooms/core':>17}")
+        for count in options['rooms']:
+            rooms = self.create_rooms(count)
+            physics = BatchBallPhysics(count)
+            for index, (ball, paddles) in enumerate(rooms):
+                physics.add_room(index, ball, paddles)
+
+            start = time.perf_counter()
+            for _ in range(ticks):
+                self.step_scalar(rooms)
+            scalar_tick = (time.perf_counter() - start) / ticks
+
+            start = time.perf_counter()
+            for _ in range(ticks):
+                self.step_batch(physics)
+            batch_tick = (time.perf_counter() - start) / ticks
+
+            self.stdout.write(
+                f"{count:>8} {scalar_tick * 1e6:>15.1f} {batch_tick * 1e6:>15.1f} {scalar_tick / batch_tick:>7.1f}x "
+                f"{int(tick_budget / (scalar_tick / count)):>18} {int(tick_budget / (batch_tick / count)):>17}"
+            )
@@ -0,0 +1,182 @@
+import json
+import time
+import random
+import asyncio
+import platform
+import statistics
+import subprocess
+import tracemalloc
+from datetime import datetime, timezone
+from django.core.management.base import BaseCommand
+from pong.scripts import constants
+from pong.scripts.ai import PongAI
+from pong.scripts.PongPlayer import PongPlayer
+from pong.scripts.PongGameManager import PongGameManager
+from utilities.lobby import Lobby
+from utilities.TickScheduler import TickScheduler
+
+
+class StubChannelLayer:
+    """Channel layer that drops every message, only counting the size of the game_loop frames."""
+
+    def __init__(self):
+        self.frame_counts = {}
+        self.frame_bytes = {}
+
+    async def group_send(self, group, message):
+        for frame_format, frame in message.get("frames", {}).items():
+            self.frame_counts[frame_format] = self.frame_counts.get(frame_format, 0) + 1
+            self.frame_bytes[frame_format] = self.frame_bytes.get(frame_format, 0) + len(frame)
+
+
+class Command(BaseCommand):
+    help = 'Run Pong rooms headless and report tick throughput, latency percentiles, frame size and allocations.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, nargs='+', default=[10, 100, 500], help='Room counts to sweep.')
+        parser.add_argument('--bot-ratios', type=float, nargs='+', default=[0.0, 0.5, 1.0],
+                            help='Share of the player seats taken by bots.')
+        parser.add_argument('--tick-rates', type=int, nargs='+', default=[60], help='Tick rates to sweep.')
+        parser.add_argument('--ticks', type=int, default=300, help='Ticks timed for each configuration.')
+        parser.add_argument('--alloc-ticks', type=int, default=30, help='Ticks traced with tracemalloc for each configuration.')
+        parser.add_argument('--frame-format', choices=['json', 'delta', 'binary'], default='json',
+                            help='Frame format the human players subscribe with.')
+        parser.add_argument('--input-rate', type=float, default=0.05, help='Chance per tick that a human sends a key event.')
+        parser.add_argument('--input-lag', type=int, default=4, help='Maximum age in ticks of the human inputs.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', default='bench_pong.json', help='Where to write the JSON results.')
+
+    def create_lobbies(self, room_count, bot_ratio, frame_format, layer):
+        """Helper method to create started lobbies without touching the database."""
+        lobbies = []
+        bot_seats = round(bot_ratio * room_count * 2)
+        seat = 0
+        for room_index in range(room_count):
+            game_manager = PongGameManager(False)
+            lobby = Lobby("pong", f"bench_{room_index}", game_manager)
+            lobby.channel_layer = layer
+
+            for x in (constants.GAME_BOUNDS["xMin"] + 1, constants.GAME_BOUNDS["xMax"] - 1):
+                seat += 1
+                if seat <= bot_seats:
+                    game_manager.players[-seat] = PongAI(-seat, game_manager.ball, x, constants.PADDLE_COLOR)
+                else:
+                    game_manager.players[seat] = PongPlayer(seat, x, constants.PADDLE_COLOR)
+                    lobby.snapshot_stream.subscribe(f"bench.{seat}", frame_format)
+
+            lobby.lobby_status = Lobby.LobbyStatus.PLAYING
+            game_manager.start_game()
+            game_manager.is_countdown_finish = True
+            lobbies.append(lobby)
+        return lobbies
+
+    async def send_inputs(self, lobbies, input_rate, input_lag):
+        """Sends random key events for the human players, tagged with a seq and a slightly old tick."""
+        for lobby in lobbies:
+            game_manager = lobby.game_manager
+            for player in list(game_manager.players.values()):
+                if isinstance(player, PongAI) or random.random() >= input_rate:
+                    continue
+                await lobby.manage_event({
+                    "type": "update_player",
+                    "playerId": player.player_id,
+                    "action_type": random.choice(["key_down", "key_up"]),
+                    "key": random.choice(["KeyW", "KeyS"]),
+                    "seq": player.last_processed_seq + 1,
+                    "tick": game_manager.tick - random.randint(0, input_lag),
+                }, None)
+
+    async def run_configuration(self, room_count, bot_ratio, tick_rate, options):
+        layer = StubChannelLayer()
+        lobbies = self.create_lobbies(room_count, bot_ratio, options['frame_format'], layer)
+        scheduler = TickScheduler(tick_rate)
+        for lobby in lobbies:
+            # Stepped by hand below, so the clock task is never started.
+            scheduler.matches[lobby.room_group_name] = lobby
+
+        tick_times = []
+        start = time.perf_counter()
+        for _ in range(options['ticks']):
+            tick_start = time.perf_counter()
+            await self.send_inputs(lobbies, options['input_rate'], options['input_lag'])
+            await scheduler.step()
+            tick_times.append(time.perf_counter() - tick_start)
+        elapsed = time.perf_counter() - start
+
+        alloc_ticks = options['alloc_ticks']
+        peaks = []
+        tracemalloc.start()
+        blocks_before = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+        for _ in range(alloc_ticks):
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            await self.send_inputs(lobbies, options['input_rate'], options['input_lag'])
+            await scheduler.step()
+            peaks.append(tracemalloc.get_traced_memory()[1] - current)
+        blocks_after = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+        tracemalloc.stop()
+
+        tick_times.sort()
+        budget = 1 / tick_rate
+        return {
+            "rooms": room_count,
+            "bot_ratio": bot_ratio,
+            "tick_rate": tick_rate,
+            "frame_format": options['frame_format'],
+            "ticks": options['ticks'],
+            "ticks_per_sec": options['ticks'] / elapsed,
+            "tick_p50_ms": tick_times[len(tick_times) // 2] * 1000,
+            "tick_p99_ms": tick_times[min(len(tick_times) - 1, int(len(tick_times) * 0.99))] * 1000,
+            "tick_mean_ms": statistics.fmean(tick_times) * 1000,
+            "budget_used_p99": tick_times[min(len(tick_times) - 1, int(len(tick_times) * 0.99))] / budget,
+            "overrun_ratio": sum(tick_time > budget for tick_time in tick_times) / len(tick_times),
+            "bytes_per_frame": {
+                frame_format: total / layer.frame_counts[frame_format]
+                for frame_format, total in layer.frame_bytes.items()
+            },
+            "peak_alloc_kib_per_tick": statistics.fmean(peaks) / 1024 if peaks else 0,
+            "net_alloc_blocks_per_tick": (blocks_after - blocks_before) / max(1, alloc_ticks),
+            "live_rooms": sum(lobby.game_manager.game_loop_is_active for lobby in lobbies),
+        }
+
+    def git_revision(self):
+        try:
+            return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        max_score = constants.MAX_SCORE
+        # Rooms must not end (and hit the database) during the benchmark.
+        constants.MAX_SCORE = float("inf")
+        try:
+            results = []
+            self.stdout.write(f"{'rooms':>6} {'bots':>5} {'rate':>5} {'ticks/s':>9} {'p50 ms':>8} {'p99 ms':>8} "
+                              f"{'overrun':>8} {'bytes/frame':>12} {'peak KiB/tick':>14}")
+            for tick_rate in options['tick_rates']:
+                for room_count in options['rooms']:
+                    for bot_ratio in options['bot_ratios']:
+                        result = asyncio.run(self.run_configuration(room_count, bot_ratio, tick_rate, options))
+                        results.append(result)
+                        frame_size = sum(result["bytes_per_frame"].values())
+                        self.stdout.write(
+                            f"{room_count:>6} {bot_ratio:>5.2f} {tick_rate:>5} {result['ticks_per_sec']:>9.1f} "
+                            f"{result['tick_p50_ms']:>8.2f} {result['tick_p99_ms']:>8.2f} "
+                            f"{result['overrun_ratio']:>7.1%} {frame_size:>12.0f} {result['peak_alloc_kib_per_tick']:>14.1f}"
+                        )
+        finally:
+            constants.MAX_SCORE = max_score
+
+        report = {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "git_revision": self.git_revision(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "options": {key: options[key] for key in ('rooms', 'bot_ratios', 'tick_rates', 'ticks', 'frame_format',
+                                                       'input_rate', 'input_lag', 'seed')},
+            "results": results,
+        }
+        with open(options['output'], 'w') as output:
+            json.dump(report, output, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
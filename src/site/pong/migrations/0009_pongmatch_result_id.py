@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pong', '0008_alter_pongtournament_players'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pongmatch',
+            name='result_id',
+            field=models.UUIDField(blank=True, editable=False, help_text='Idempotency key of the result the match was saved from.', null=True, unique=True),
+        ),
+    ]
@@ -52,6 +52,13 @@ class PongMatch(models.Model):
 		help_text="Timestamp when the match ended.",
 		auto_now=True
 	)
+	result_id = models.UUIDField(
+		null=True,
+		blank=True,
+		unique=True,
+		editable=False,
+		help_text="Idempotency key of the result the match was saved from."
+	)
 
 	def get_winner(self):
 		if self.first_user is None or self.second_user is None:
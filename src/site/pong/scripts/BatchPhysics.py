@@ -0,0 +1,223 @@
+import numpy as np
+from pong.scripts import constants
+
+class BatchBallPhysics:
+	"""
+	Vectorized counterpart of Ball: keeps the ball and paddles of many rooms in NumPy arrays
+	and steps all of them at once.
+
+	Each step does the same operations as Ball.update_position, Ball.handle_paddle_collision
+	(for each paddle, in order) and Ball.is_out_of_bounds, so a room simulated here follows
+	the same trajectory as with the scalar Ball.
+	"""
+
+	def __init__(self, capacity: int = 64, paddles_per_room: int = 2):
+		"""
+		Initializes an empty engine.
+
+		:param capacity: The number of rooms the arrays are allocated for; they grow when needed.
+		:param paddles_per_room: The number of paddles in each room.
+		"""
+		self.count = 0
+		self.paddles_per_room = paddles_per_room
+		self.room_ids = []
+		self.indexes = {}
+		self.trajectory_changed = np.zeros(0, dtype=bool)
+		self.radius = constants.BALL_RADIUS
+		self.bounds = constants.GAME_BOUNDS
+		self.allocate(capacity)
+
+	def allocate(self, capacity: int):
+		"""
+		(Re)allocates the state arrays, keeping the rooms already loaded.
+
+		:param capacity: The new number of rooms the arrays can hold.
+		"""
+		previous = getattr(self, "x", None)
+		new_arrays = {
+			"x": np.zeros(capacity),
+			"y": np.zeros(capacity),
+			"speed_x": np.zeros(capacity),
+			"speed_y": np.zeros(capacity),
+			"speed_multiplier": np.ones(capacity),
+			"paddle_x": np.zeros((capacity, self.paddles_per_room)),
+			"paddle_y": np.zeros((capacity, self.paddles_per_room)),
+			"paddle_width": np.zeros((capacity, self.paddles_per_room)),
+			"paddle_height": np.zeros((capacity, self.paddles_per_room)),
+		}
+		for name, array in new_arrays.items():
+			if previous is not None:
+				array[:self.count] = getattr(self, name)[:self.count]
+			setattr(self, name, array)
+		self.capacity = capacity
+
+	def __len__(self) -> int:
+		return self.count
+
+	def add_room(self, room_id, ball, paddles: list):
+		"""
+		Adds a room and loads its current ball and paddles.
+
+		:param room_id: The identifier of the room.
+		:param ball: The Ball of the room.
+		:param paddles: The paddles of the room, in the order Ball.handle_paddle_collision is called on them.
+		"""
+		if self.count == self.capacity:
+			self.allocate(self.capacity * 2)
+
+		index = self.count
+		self.count += 1
+		self.room_ids.append(room_id)
+		self.indexes[room_id] = index
+		self.load_ball(room_id, ball)
+		for paddle_index, paddle in enumerate(paddles):
+			self.paddle_x[index, paddle_index] = paddle.x
+			self.paddle_width[index, paddle_index] = paddle.width
+			self.paddle_height[index, paddle_index] = paddle.height
+		self.load_paddles(room_id, paddles)
+
+	def remove_room(self, room_id):
+		"""
+		Removes a room, moving the last room into its slot.
+
+		:param room_id: The identifier of the room.
+		"""
+		index = self.indexes.pop(room_id, None)
+		if index is None:
+			return
+
+		last = self.count - 1
+		if index != last:
+			for array in (self.x, self.y, self.speed_x, self.speed_y, self.speed_multiplier,
+					self.paddle_x, self.paddle_y, self.paddle_width, self.paddle_height):
+				array[index] = array[last]
+			moved_room_id = self.room_ids[last]
+			self.room_ids[index] = moved_room_id
+			self.indexes[moved_room_id] = index
+		self.room_ids.pop()
+		self.count -= 1
+
+	def load_ball(self, room_id, ball):
+		index = self.indexes[room_id]
+		self.x[index] = ball.x
+		self.y[index] = ball.y
+		self.speed_x[index] = ball.speed_x
+		self.speed_y[index] = ball.speed_y
+		self.speed_multiplier[index] = ball.speed_multiplier
+
+	def store_ball(self, room_id, ball):
+		index = self.indexes[room_id]
+		ball.x = float(self.x[index])
+		ball.y = float(self.y[index])
+		ball.speed_x = float(self.speed_x[index])
+		ball.speed_y = float(self.speed_y[index])
+		ball.speed_multiplier = float(self.speed_multiplier[index])
+		if index < len(self.trajectory_changed) and self.trajectory_changed[index]:
+			ball.change_trajectory()
+
+	def load_paddles(self, room_id, paddles: list):
+		"""
+		Copies the paddles y, which are moved by the players outside of the engine.
+		"""
+		index = self.indexes[room_id]
+		self.paddle_y[index] = [paddle.y for paddle in paddles]
+
+	def step(self) -> np.ndarray:
+		"""
+		Moves every ball, bounces it on the walls and the paddles, and checks for scoring.
+
+		:return: For each room, 1 if the ball left on the right, -1 on the left, 0 otherwise.
+		"""
+		n = self.count
+		x, y = self.x[:n], self.y[:n]
+		speed_x, speed_y = self.speed_x[:n], self.speed_y[:n]
+		speed_multiplier = self.speed_multiplier[:n]
+		radius = self.radius
+
+		# Rooms whose ball changed trajectory (paddle hit or reset), see Ball.change_trajectory
+		self.trajectory_changed = np.zeros(n, dtype=bool)
+
+		# Ball.update_position
+		x += speed_x * speed_multiplier
+		y += speed_y * speed_multiplier
+
+		over_top = y + radius > self.bounds["yMax"]
+		under_bottom = ~over_top & (y - radius < self.bounds["yMin"])
+		y[over_top] = self.bounds["yMax"] - radius
+		y[under_bottom] = self.bounds["yMin"] + radius
+		speed_y[over_top | under_bottom] *= -1
+
+		# Ball.handle_paddle_collision
+		for paddle_index in range(self.paddles_per_room):
+			self.collide_paddle(paddle_index)
+
+		# Ball.is_out_of_bounds
+		out = np.zeros(n, dtype=np.int8)
+		out_right = x + radius > self.bounds["xMax"]
+		out[out_right] = 1
+		out[~out_right & (x - radius < self.bounds["xMin"])] = -1
+		return out
+
+	def collide_paddle(self, paddle_index: int):
+		n = self.count
+		x, y = self.x[:n], self.y[:n]
+		speed_x, speed_y = self.speed_x[:n], self.speed_y[:n]
+		paddle_x = self.paddle_x[:n, paddle_index]
+		paddle_y = self.paddle_y[:n, paddle_index]
+		paddle_width = self.paddle_width[:n, paddle_index]
+		paddle_height = self.paddle_height[:n, paddle_index]
+
+		paddle_left = paddle_x - paddle_width / 2
+		paddle_right = paddle_x + paddle_width / 2
+		paddle_top = paddle_y - paddle_height / 2
+		paddle_bottom = paddle_y + paddle_height / 2
+
+		closest_x = np.maximum(paddle_left, np.minimum(x, paddle_right))
+		closest_y = np.maximum(paddle_top, np.minimum(y, paddle_bottom))
+
+		distance_x = x - closest_x
+		distance_y = y - closest_y
+		distance = np.sqrt(distance_x**2 + distance_y**2)
+
+		hit = distance <= self.radius
+		if not hit.any():
+			return
+		self.trajectory_changed |= hit
+
+		penetration = self.radius - distance
+		pushed = hit & (distance != 0)
+		x[pushed] += distance_x[pushed] / distance[pushed] * penetration[pushed]
+		y[pushed] += distance_y[pushed] / distance[pushed] * penetration[pushed]
+
+		speed_x[hit & ((closest_x == paddle_left) | (closest_x == paddle_right))] *= -1
+		speed_y[hit & ((closest_y == paddle_top) | (closest_y == paddle_bottom))] *= -1
+
+		offset = (y[hit] - paddle_y[hit]) / (paddle_height[hit] / 2)
+		speed_y[hit] += offset * 0.15
+
+		multiplier = self.speed_multiplier[:n]
+		multiplier[hit] = np.minimum(multiplier[hit] * 1.05, 2.5)
+
+		speed_magnitude = np.sqrt(speed_x**2 + speed_y**2)
+		normalized = hit & (speed_magnitude != 0)
+		speed_x[normalized] = speed_x[normalized] / speed_magnitude[normalized] * constants.BALL_SPEED_X
+		speed_y[normalized] = speed_y[normalized] / speed_magnitude[normalized] * constants.BALL_SPEED_X
+
+	def reset(self, indexes: np.ndarray, directions: np.ndarray):
+		"""
+		Vectorized Ball.reset: puts the balls back in the center and serves them in the given direction.
+
+		:param indexes: The indexes of the rooms to reset.
+		:param directions: For each room, 1 to serve to the right, -1 to the left.
+		"""
+		self.trajectory_changed[indexes] = True
+		self.x[indexes] = (self.bounds["xMin"] + self.bounds["xMax"]) / 2
+		self.y[indexes] = (self.bounds["yMin"] + self.bounds["yMax"]) / 2
+		self.speed_multiplier[indexes] = 1.0
+
+		angles = np.random.uniform(-np.pi / 4, np.pi / 4, len(indexes))
+		speed_x = directions * np.cos(angles)
+		speed_y = np.sin(angles)
+		speed_magnitude = np.sqrt(speed_x**2 + speed_y**2)
+		self.speed_x[indexes] = constants.BALL_SPEED_X * (speed_x / speed_magnitude)
+		self.speed_y[indexes] = constants.BALL_SPEED_Y * (speed_y / speed_magnitude)
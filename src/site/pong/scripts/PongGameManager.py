@@ -1,14 +1,30 @@
 import math
 import time
+import struct
+import bisect
 from pong.scripts import constants
 from pong.models import *
 from pong.scripts.ball import Ball
 from pong.scripts.PongPlayer import PongPlayer
 from utilities.GameManager import GameManager
+from utilities.StateHistory import StateHistory
 from pong.scripts.ai import PongAI
-from website.models import User, MatchHistory, UserStats
-from channels.db import database_sync_to_async
+from pong.scripts.SimulationShards import shard_pool
+from website.models import User, MatchHistory, MatchTimeline, UserStats
 from django.utils import timezone
+from django.db import transaction
+from utilities.ProfileCache import profile_cache
+from utilities.PersistenceQueue import match_results
+
+# Binary 'game_loop' frame, 42 bytes, little endian:
+# frame type (uint8), game tick (uint32),
+# ball x, y, speed_x, speed_y (float32), left and right paddle y (float32),
+# player1 and player2 score (uint16), count down (uint8),
+# last input sequence processed for the left and right player (uint32).
+# It only carries the moving parts of the state: the rest comes from the keyframes, see SnapshotStream.
+# Decoded by SocketManager.decodeGameFrame in common_static/js/SocketManager.js.
+FRAME_TYPE_GAME_LOOP = 1
+FRAME_STRUCT = struct.Struct("<BI6f2HB2I")
 
 class PongGameManager(GameManager):
 	
@@ -22,6 +38,14 @@ class PongGameManager(GameManager):
 		self.is_countdown_finish = False
 		self.has_ranked_value = has_ranked_value
 		self.time_elapsed = 0
+		self.shard_room_id = None
+		# Set on the copy simulated by a shard, which steps the room without recording its history.
+		self.in_shard = False
+		self.tick = 0
+		self.history = StateHistory(constants.HISTORY_SIZE)
+		self.input_log = []
+		self.dynamic_players = None
+		self.dynamic_paths = ()
 
 	def start_game(self):
 		"""Marks the game as started."""
@@ -31,64 +55,105 @@ class PongGameManager(GameManager):
 		self.ball.start()
 
 	async def clear_and_save(self, is_game_ended: bool, player_disconnected_id: int = None):
-		"""Saves the match results and updates players' match history."""
+		"""
+		Ends the match and hands its result to the write-behind queue, without waiting for the database.
+		"""
 		players_list = list(self.players.keys())
 		
 		if len(players_list) < 2:
 			print("Not enough players to save the match.")
 			return
 
-		try:
-			# Fetch player objects
-			first_player, second_player = await database_sync_to_async(User.objects.get)(id=players_list[0]), \
-										await database_sync_to_async(User.objects.get)(id=players_list[1])
+		# Handle disconnection scenario
+		if not is_game_ended:
+			self.scores["player1"], self.scores["player2"] = (0, 5) if player_disconnected_id == players_list[0] else (5, 0)
 
-			# Handle disconnection scenario
-			if not is_game_ended:
-				self.scores["player1"], self.scores["player2"] = (0, 5) if player_disconnected_id == players_list[0] else (5, 0)
+		self.game_loop_is_active = False
+		await match_results.submit("pong", {
+			"first_player_id": players_list[0],
+			"second_player_id": players_list[1],
+			"scores": dict(self.scores),
+			"start_date": self.start_match_timestamp or timezone.now(),
+			"end_date": timezone.now(),
+			"ranked": self.has_ranked_value,
+		})
 
-			# Create match record
-			match: PongMatch = await database_sync_to_async(PongMatch.objects.create)(
+	@staticmethod
+	def save_match(record: dict):
+		"""
+		Records a finished match in a single transaction: the match, both players' stats and their match history.
+		Called by the write-behind queue; a record whose result_id is already saved is skipped.
+
+		:param record: The result queued by clear_and_save.
+		"""
+		with transaction.atomic():
+			if PongMatch.objects.filter(result_id=record["result_id"]).exists():
+				return
+
+			first_player_id, second_player_id = int(record["first_player_id"]), int(record["second_player_id"])
+			users = User.objects.in_bulk([first_player_id, second_player_id])
+			if first_player_id not in users or second_player_id not in users:
+				raise User.DoesNotExist("User matching query does not exist.")
+			first_player, second_player = users[first_player_id], users[second_player_id]
+
+			# Lock the stats rows in a fixed order so two matches ending together cannot deadlock.
+			players_stats = list(
+				UserStats.objects.select_for_update()
+				.filter(user_id__in=[first_player.id, second_player.id])
+				.order_by("user_id")
+			)
+			if len(players_stats) != 2:
+				raise UserStats.DoesNotExist(f"UserStats not found for users: {first_player.username}, {second_player.username}")
+			for player_stats in players_stats:
+				player_stats.user = users[player_stats.user_id]
+
+			match = PongMatch.objects.create(
 				first_user=first_player,
 				second_user=second_player,
-				first_user_score=self.scores["player1"],
-				second_user_score=self.scores["player2"],
-				start_date=self.start_match_timestamp or timezone.now()
+				first_user_score=record["scores"]["player1"],
+				second_user_score=record["scores"]["player2"],
+				start_date=record["start_date"],
+				result_id=record["result_id"],
 			)
 
-			# Calculate MMR gains if is ranked 
-			if self.has_ranked_value == True:
+			# end_date is auto_now: put back when the match actually ended, not when it was written.
+			match.end_date = record["end_date"]
+			# Calculate MMR gains if is ranked
+			if record["ranked"] == True:
 				match.set_player_mmr_gained()
+			PongMatch.objects.filter(pk=match.pk).update(
+				end_date=match.end_date,
+				first_user_mmr_gain=match.first_user_mmr_gain,
+				second_user_mmr_gain=match.second_user_mmr_gain,
+			)
 
-			await database_sync_to_async(match.save)()
-
-			# Fetch or update player statistics
-			try:
-				first_player_stats = await database_sync_to_async(lambda: UserStats.objects.select_related('user').get(user=first_player))()
-				second_player_stats = await database_sync_to_async(lambda: UserStats.objects.select_related('user').get(user=second_player))()
-			except UserStats.DoesNotExist:
-				print(f"UserStats not found for user: {first_player.username}")
-				return
-
-			first_player_stats.update_with_match_info(match)
-			second_player_stats.update_with_match_info(match)
-
-			await database_sync_to_async(first_player_stats.save)()
-			await database_sync_to_async(second_player_stats.save)()
+			PongGameManager.update_players_stats(match, players_stats)
+			MatchHistory.add_match_for_users(match, [first_player.id, second_player.id])
+			MatchTimeline.add_match(match)
 
-			# Update match history
-			async def update_match_history(player):
-				history, _ = await database_sync_to_async(MatchHistory.objects.get_or_create)(user=player)
-				await database_sync_to_async(history.add_pong_match)(match)
-				await database_sync_to_async(history.save)()
+			def invalidate_profiles():
+				for user_id in (first_player_id, second_player_id):
+					profile_cache.invalidate(user_id)
 
-			await update_match_history(first_player)
-			await update_match_history(second_player)
+			transaction.on_commit(invalidate_profiles)
 
-		except Exception as e:
-			raise ValueError(f"Error while saving the match: {str(e)}")
+	@staticmethod
+	def update_players_stats(match: PongMatch, players_stats: list):
+		"""
+		Applies the result of a match to the locked stats of its players (see UserStats.update_with_match_info)
+		and saves them with a single bulk UPDATE.
 
-		self.game_loop_is_active = False
+		:param match: The saved match.
+		:param players_stats: The UserStats of the two players, locked with select_for_update.
+		"""
+		updated_at = timezone.now()
+		for player_stats in players_stats:
+			player_stats.update_with_match_info(match)
+			player_stats.date_updated = updated_at
+		UserStats.objects.bulk_update(
+			players_stats,
+			["exp", "mmr", "win", "lose", "total_points_scored", "longest_game_duration", "time_on_site", "date_updated"],
+		)
 
 	async def add_player(self, players_id: int, is_bot: bool):
 		"""
@@ -122,6 +187,11 @@ class PongGameManager(GameManager):
 		"""
 		Update player data based on the provided dictionary.
 
+		Inputs can carry a client sequence number ("seq"), used to drop duplicated or out of order
+		inputs and echoed back in the player state, and the simulation tick at which the client
+		pressed the key ("tick"). An input for a past tick rewinds the room to that tick and
+		re-simulates up to the current one, within constants.MAX_ROLLBACK_TICKS.
+
 		:param data: Dictionary containing player update data.
 		:raises KeyError: If the player ID is not found.
 		"""
@@ -130,10 +200,59 @@ class PongGameManager(GameManager):
 			if player_id not in self.players:
 				raise KeyError(f"Player ID {player_id} not found.")
 
-			self.players[player_id].update_player_data(data)
-		except (KeyError, ValueError) as e:
+			player = self.players[player_id]
+			seq = data.get("seq")
+			if seq is not None:
+				seq = int(seq)
+				if seq <= player.last_processed_seq:
+					return
+				player.last_processed_seq = seq
+
+			if self.in_shard:
+				# No history to rewind to in a shard: logging the input would only leak it.
+				player.update_player_data(data)
+			elif self.shard_room_id is None and self.is_countdown_finish:
+				self.apply_input_at(player_id, data, int(data.get("tick", self.tick)))
+			else:
+				player.update_player_data(data)
+
+			if self.shard_room_id is not None:
+				shard_pool.send_input(self, player_id, data)
+		except (KeyError, ValueError, TypeError) as e:
 			print(f"Error updating player data: {e}")
 
+	def apply_input_at(self, player_id: int, data: dict, input_tick: int):
+		"""
+		Apply an input as if it had been received at the start of `input_tick`.
+
+		The inputs of the last ticks are logged so that rewinding replays them too.
+
+		:param player_id: The ID of the player sending the input.
+		:param data: The input data.
+		:param input_tick: The tick the client pressed the key at.
+		"""
+		rollback_tick = min(self.tick, max(input_tick, self.tick - constants.MAX_ROLLBACK_TICKS))
+		state = self.history.get(rollback_tick) if rollback_tick < self.tick else None
+		if state is None:
+			rollback_tick = self.tick
+
+		bisect.insort(self.input_log, (rollback_tick, player_id, data), key=lambda entry: entry[0])
+		if state is None:
+			self.players[player_id].update_player_data(data)
+			return
+
+		current_tick = self.tick
+		self.restore_world(state)
+		while True:
+			start = bisect.bisect_left(self.input_log, self.tick, key=lambda entry: entry[0])
+			end = bisect.bisect_right(self.input_log, self.tick, key=lambda entry: entry[0])
+			for _, logged_player_id, logged_data in self.input_log[start:end]:
+				if logged_player_id in self.players:
+					self.players[logged_player_id].update_player_data(logged_data)
+			if self.tick >= current_tick:
+				break
+			self.advance()
+
 	def player_disconnected(self, player_id: int):
 		"""
 		Handle logic for when a player disconnects.
@@ -158,28 +277,112 @@ class PongGameManager(GameManager):
 					self.is_countdown_finish = True
 
 			if self.is_countdown_finish == True:
-				players = self.players.values()
-
-				for player in players:
-					player.player_loop()
-
-				self.ball.update_position()
-				for player in players:
-					self.ball.handle_paddle_collision(player.paddle)
-
-				out_of_bounds = self.ball.is_out_of_bounds()
-				if out_of_bounds in {"right", "left"}:
-					scoring_player = "player1" if out_of_bounds == "right" else "player2"
-					self.scores[scoring_player] += 1
-					self.ball.reset(scoring_player)
+				if self.shard_room_id is None:
+					if shard_pool.enabled:
+						shard_pool.add_room(self)
+					else:
+						self.advance()
 
 				if any(score >= constants.MAX_SCORE for score in self.scores.values()):
 					print(f" game finit for {self.scores} amnd  sa sa {self.players}", flush=True)
+					if self.shard_room_id is not None:
+						shard_pool.remove_room(self)
 					await self.clear_and_save(True)
 					return
 		except Exception as e:
 			print(f" teste di modi {e}", flush=True)
 
+	def advance(self):
+		"""
+		Record the world state of the current tick in the history, then simulate it.
+		"""
+		self.history.record(self.tick, self.capture_world())
+		oldest_tick = self.tick - constants.HISTORY_SIZE
+		if self.input_log and self.input_log[0][0] < oldest_tick:
+			del self.input_log[:bisect.bisect_left(self.input_log, oldest_tick, key=lambda entry: entry[0])]
+		self.step_simulation()
+
+	def capture_world(self) -> tuple:
+		"""
+		Return everything step_simulation depends on, to be restored with restore_world.
+		"""
+		return (
+			self.simulation_state(),
+			tuple(player.save_state() for player in self.players.values()),
+		)
+
+	def restore_world(self, world: tuple):
+		simulation_state, players_state = world
+		self.apply_simulation_state(simulation_state)
+		self.ball.change_trajectory()
+		for player, player_state in zip(self.players.values(), players_state):
+			player.load_state(player_state)
+
+	def step_simulation(self):
+		"""
+		Run one physics step: moves the paddles and the ball, handles collisions and scoring.
+		Pure computation, so it can run either here or in a simulation shard process.
+		"""
+		self.tick += 1
+		players = self.players.values()
+
+		for player in players:
+			player.player_loop()
+
+		self.ball.update_position()
+		for player in players:
+			self.ball.handle_paddle_collision(player.paddle)
+
+		out_of_bounds = self.ball.is_out_of_bounds()
+		if out_of_bounds in {"right", "left"}:
+			scoring_player = "player1" if out_of_bounds == "right" else "player2"
+			self.scores[scoring_player] += 1
+			self.ball.reset(scoring_player)
+
+	def simulation_state(self) -> tuple:
+		"""
+		Return the state produced by step_simulation, as sent back by a simulation shard.
+
+		:return: The ball position, speed and multiplier, the paddles y, the scores and the tick.
+		"""
+		return (
+			self.ball.x,
+			self.ball.y,
+			self.ball.speed_x,
+			self.ball.speed_y,
+			self.ball.speed_multiplier,
+			tuple(player.paddle.y for player in self.players.values()),
+			self.scores["player1"],
+			self.scores["player2"],
+			self.tick,
+		)
+
+	def apply_simulation_state(self, state: tuple):
+		"""
+		Apply a state received from a simulation shard (see simulation_state).
+
+		:param state: The state to apply.
+		"""
+		ball_x, ball_y, speed_x, speed_y, speed_multiplier, paddles_y, score1, score2, tick = state
+		self.ball.x = ball_x
+		self.ball.y = ball_y
+		self.ball.speed_x = speed_x
+		self.ball.speed_y = speed_y
+		self.ball.speed_multiplier = speed_multiplier
+		for player, paddle_y in zip(self.players.values(), paddles_y):
+			player.paddle.y = paddle_y
+		self.scores["player1"] = score1
+		self.scores["player2"] = score2
+		self.tick = tick
+
+	def __getstate__(self) -> dict:
+		"""
+		Pickle everything but the shard bookkeeping when the game manager is sent to a simulation shard.
+		"""
+		state = self.__dict__.copy()
+		state["shard_room_id"] = None
+		return state
+
 	def get_loser(self):
 		player_list = list(self.players)
 
@@ -195,11 +398,67 @@ class PongGameManager(GameManager):
 		return player_list[1]
 
 	def reset(self):
+		if self.shard_room_id is not None:
+			shard_pool.remove_room(self)
 		self.players.clear()
 		self.scores = {"player1": 0, "player2": 0}
 		self.game_loop_is_active = False
 		self.is_countdown_finish = False
 		self.time_elapsed = 0
+		self.tick = 0
+		self.history.clear()
+		self.input_log.clear()
+
+	def pack_frame(self) -> bytes:
+		"""
+		Pack the moving parts of the game state into a binary 'game_loop' frame (see FRAME_STRUCT).
+
+		:return: The packed frame.
+		"""
+		players = sorted(self.players.values(), key=lambda player: player.paddle.x)[:2]
+		paddles_y = [player.paddle.y for player in players] + [0.0] * (2 - len(players))
+		last_seqs = [player.last_processed_seq for player in players] + [0] * (2 - len(players))
+
+		return FRAME_STRUCT.pack(
+			FRAME_TYPE_GAME_LOOP,
+			self.tick & 0xFFFFFFFF,
+			self.ball.x,
+			self.ball.y,
+			self.ball.speed_x,
+			self.ball.speed_y,
+			*paddles_y,
+			self.scores["player1"],
+			self.scores["player2"],
+			max(0, min(255, math.ceil(constants.COUNTDOWN - self.time_elapsed))),
+			*(seq & 0xFFFFFFFF for seq in last_seqs),
+		)
+
+	def dynamic_fields(self) -> tuple[tuple, tuple]:
+		"""
+		List the fields of to_dict that change during play (see GameManager.dynamic_fields).
+
+		:return: The paths of the fields, rebuilt only when the players change, and their current values.
+		"""
+		players = tuple(self.players.values())
+		if players != self.dynamic_players:
+			self.dynamic_players = players
+			self.dynamic_paths = (
+				("ball", "x"), ("ball", "y"), ("ball", "speed_x"), ("ball", "speed_y"),
+				("scores", "player1"), ("scores", "player2"), ("count_down",), ("tick",),
+			) + tuple(
+				("players", str(player.player_id), key)
+				for player in players
+				for key in player.DYNAMIC_KEYS
+			)
+
+		values = [
+			self.ball.x, self.ball.y, self.ball.speed_x, self.ball.speed_y,
+			self.scores["player1"], self.scores["player2"],
+			math.ceil(constants.COUNTDOWN - self.time_elapsed), self.tick,
+		]
+		for player in players:
+			values += player.dynamic_values()
+		return self.dynamic_paths, tuple(values)
 
 	def to_dict(self) -> dict:
 		"""
@@ -212,6 +471,9 @@ class PongGameManager(GameManager):
 			"ball": self.ball.to_dict(),
 			"scores": self.scores,
 			"bounds": constants.GAME_BOUNDS,
-			"count_down": math.ceil(constants.COUNTDOWN - self.time_elapsed)
+			"count_down": math.ceil(constants.COUNTDOWN - self.time_elapsed),
+			"tick": self.tick,
 		})
-		return base_dict
\ No newline at end of file
+		return base_dict
+
+match_results.register("pong", PongGameManager.save_match)
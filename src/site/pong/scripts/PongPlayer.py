@@ -2,7 +2,7 @@ from website.models import User
 from pong.scripts import constants
 from utilities.Player import Player
 from pong.scripts.Paddle import Paddle
-from channels.db import database_sync_to_async
+from utilities.ProfileCache import profile_cache
 
 class PongPlayer(Player):
 	"""
@@ -22,11 +22,13 @@ class PongPlayer(Player):
 		self.isMovingUp = False
 		self.isMovingDown = False
 		self.username = None
+		self.last_processed_seq = 0
 
 	async def get_username(self):
-		return await database_sync_to_async(
-			lambda: User.objects.values_list("username", flat=True).get(id=self.player_id)
-		)()
+		profile = await profile_cache.get(self.player_id)
+		if profile is None:
+			raise User.DoesNotExist(f"User {self.player_id} does not exist.")
+		return profile["username"]
 
 	async def setup(self):
 		self.username = await self.get_username()
@@ -47,6 +49,15 @@ class PongPlayer(Player):
 		self.paddle.y = max(min_y_reachable, min(max_y_reachable, self.paddle.y))
 
 
+	def save_state(self) -> tuple:
+		"""
+		Return the state the simulation depends on, to rewind the player on late inputs.
+		"""
+		return (self.paddle.y, self.isMovingUp, self.isMovingDown)
+
+	def load_state(self, state: tuple):
+		self.paddle.y, self.isMovingUp, self.isMovingDown = state
+
 	def update_player_data(self, data: dict):
 		"""
 		Processes input data to update the paddle's movement state.
@@ -81,6 +92,12 @@ class PongPlayer(Player):
 	def player_disconnection(self):
 		super().player_disconnection()
 
+	# Keys of to_dict that change during play, in the order of dynamic_values.
+	DYNAMIC_KEYS = ("y", "isMovingUp", "isMovingDown", "last_processed_seq", "player_connection_state")
+
+	def dynamic_values(self) -> tuple:
+		return (self.paddle.y, self.isMovingUp, self.isMovingDown, self.last_processed_seq, self.status.name)
+
 	def to_dict(self) -> dict:
 		"""
 		Converts the PongPlayer object to a dictionary for broadcasting.
@@ -92,6 +109,7 @@ class PongPlayer(Player):
 		base_dict.update({
 			"isMovingUp": self.isMovingUp,
 			"isMovingDown": self.isMovingDown,
+			"last_processed_seq": self.last_processed_seq,
 		})
 
 		if self.username != None:
@@ -0,0 +1,301 @@
+import os
+import time
+import queue
+import asyncio
+import itertools
+import threading
+import multiprocessing
+from multiprocessing.reduction import ForkingPickler
+from django.conf import settings
+from utilities.TickScheduler import TICK_RATE
+
+def step_rooms_batch(rooms: dict, physics) -> dict:
+	"""
+	Same as calling step_simulation on every room, but with the ball physics of all rooms done at once
+	by the vectorized engine. The players still move their paddles one by one.
+
+	Args:
+		rooms (dict): The game managers of the shard, keyed by room id.
+		physics (BatchBallPhysics): The engine holding the balls and paddles of those rooms.
+
+	Returns:
+		dict: The simulation state of every room, keyed by room id.
+	"""
+	for room_id, room in rooms.items():
+		room.tick += 1
+		players = room.players.values()
+		for player in players:
+			player.player_loop()
+		physics.load_paddles(room_id, [player.paddle for player in players])
+
+	out = physics.step()
+	scored = out.nonzero()[0]
+	if len(scored):
+		for index in scored:
+			scoring_player = "player1" if out[index] == 1 else "player2"
+			rooms[physics.room_ids[index]].scores[scoring_player] += 1
+		physics.reset(scored, out[scored])
+
+	states = {}
+	for room_id, room in rooms.items():
+		physics.store_ball(room_id, room.ball)
+		states[room_id] = room.simulation_state()
+	return states
+
+def send_states(connection, pending: dict, condition: threading.Condition):
+	"""
+	Writer thread of a shard. Sends the pending states to the main process, so the simulation loop
+	keeps stepping and reading inputs while the main process is not reading. The states are absolute,
+	so the states of a room that were not sent yet are replaced by the newer ones.
+
+	Args:
+		connection (Connection): The shard end of the pipe to the main process.
+		pending (dict): The states not sent yet, keyed by room id, filled by the simulation loop.
+		condition (threading.Condition): Guards pending and is notified when states are added.
+	"""
+	while True:
+		with condition:
+			while not pending:
+				condition.wait()
+			states = pending.copy()
+			pending.clear()
+		try:
+			connection.send(("states", states))
+		except (BrokenPipeError, OSError):
+			return
+
+def write_messages(connection, outbox: queue.SimpleQueue):
+	"""
+	Writer thread of the main process for one shard. Sends the pickled messages of the outbox,
+	so a shard that is not reading never blocks the event loop.
+
+	Args:
+		connection (Connection): The main process end of the pipe to the shard.
+		outbox (queue.SimpleQueue): The pickled messages to send.
+	"""
+	while True:
+		message = outbox.get()
+		try:
+			connection.send_bytes(message)
+		except (BrokenPipeError, OSError) as e:
+			print(f"Simulation shard disconnected: {e}", flush=True)
+			return
+
+def run_shard(connection, tick_rate: int, batch_physics: bool = False):
+	"""
+	Entry point of a simulation shard process.
+
+	The shard owns a subset of the Pong rooms and steps all of them at a fixed rate in a tight loop,
+	away from the event loop that serves the websockets. After every step it hands the state of its
+	rooms to the send_states thread, which sends it back to the main process.
+
+	Messages received from the main process:
+		("add", room_id, game_manager): starts simulating a copy of the game manager.
+		("input", room_id, player_id, data): forwards a player input.
+		("remove", room_id): stops simulating the room.
+		("stop",): stops the shard.
+
+	Args:
+		connection (Connection): The shard end of the pipe to the main process.
+		tick_rate (int): The number of simulation steps per second.
+		batch_physics (bool): Whether to step the balls with the vectorized BatchBallPhysics engine.
+	"""
+	os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ft_transcendence.settings")
+	import django
+	django.setup()
+
+	physics = None
+	if batch_physics:
+		from pong.scripts.BatchPhysics import BatchBallPhysics
+		physics = BatchBallPhysics()
+
+	pending_states = {}
+	condition = threading.Condition()
+	writer = threading.Thread(target=send_states, args=(connection, pending_states, condition), daemon=True)
+	writer.start()
+
+	rooms = {}
+	tick_interval = 1 / tick_rate
+	next_deadline = time.perf_counter()
+
+	while True:
+		if not rooms:
+			# Nothing to simulate: block until the main process sends something.
+			connection.poll(None)
+			next_deadline = time.perf_counter()
+
+		try:
+			while connection.poll():
+				message = connection.recv()
+				match message[0]:
+					case "add":
+						room = rooms[message[1]] = message[2]
+						room.in_shard = True
+						if physics:
+							physics.add_room(message[1], room.ball, [player.paddle for player in room.players.values()])
+					case "input":
+						room = rooms.get(message[1])
+						if room:
+							room.update_player({**message[3], "playerId": message[2]})
+					case "remove":
+						rooms.pop(message[1], None)
+						if physics:
+							physics.remove_room(message[1])
+					case "stop":
+						return
+		except (EOFError, OSError):
+			return
+
+		states = {}
+		if physics:
+			try:
+				states = step_rooms_batch(rooms, physics)
+			except Exception as e:
+				print(f"Error while simulating the shard rooms: {e}", flush=True)
+		else:
+			for room_id, room in rooms.items():
+				try:
+					room.step_simulation()
+					states[room_id] = room.simulation_state()
+				except Exception as e:
+					print(f"Error while simulating room {room_id}: {e}", flush=True)
+
+		if not writer.is_alive():
+			return
+		if states:
+			with condition:
+				pending_states.update(states)
+				condition.notify()
+
+		next_deadline += tick_interval
+		time.sleep(max(0, next_deadline - time.perf_counter()))
+
+class SimulationShardPool:
+	"""
+	Runs the physics of the Pong rooms in a pool of worker processes, each owning a subset of the rooms.
+
+	Disabled unless the PONG_SIMULATION_SHARDS setting is greater than zero. Rooms are assigned to the
+	least loaded shard when their countdown ends, inputs are forwarded to the owning shard, and the state
+	sent back by the shards is applied to the game managers living in this process, which keep
+	broadcasting and saving the matches as usual.
+
+	Messages are pickled on the event loop and written to the pipes by one thread per shard,
+	since a write blocks once the pipe is full.
+	"""
+
+	def __init__(self, shard_count: int, tick_rate: int = TICK_RATE, batch_physics: bool = False):
+		"""
+		Initializes the pool. The worker processes are only started when the first room is added.
+
+		Args:
+			shard_count (int): The number of worker processes, 0 to disable sharding.
+			tick_rate (int): The number of simulation steps per second in each shard.
+			batch_physics (bool): Whether the shards use the vectorized BatchBallPhysics engine.
+		"""
+		self.shard_count = shard_count
+		self.tick_rate = tick_rate
+		self.batch_physics = batch_physics
+		self.processes = []
+		self.connections = []
+		self.outboxes: list[queue.SimpleQueue] = []
+		self.room_shards: dict[int, int] = {}
+		self.rooms: dict[int, object] = {}
+		self.room_ids = itertools.count(1)
+
+	@property
+	def enabled(self) -> bool:
+		return self.shard_count > 0
+
+	def start(self):
+		"""
+		Spawns the shard processes and starts reading their states on the running event loop.
+		"""
+		context = multiprocessing.get_context("spawn")
+		loop = asyncio.get_running_loop()
+
+		for index in range(self.shard_count):
+			parent_connection, shard_connection = context.Pipe()
+			process = context.Process(
+				target=run_shard,
+				args=(shard_connection, self.tick_rate, self.batch_physics),
+				name=f"pong-shard-{index}",
+				daemon=True,
+			)
+			process.start()
+			outbox = queue.SimpleQueue()
+			threading.Thread(
+				target=write_messages,
+				args=(parent_connection, outbox),
+				name=f"pong-shard-{index}-writer",
+				daemon=True,
+			).start()
+			self.processes.append(process)
+			self.connections.append(parent_connection)
+			self.outboxes.append(outbox)
+			loop.add_reader(parent_connection.fileno(), self.read_states, parent_connection)
+
+	def read_states(self, connection):
+		"""
+		Applies the states received from a shard to the game managers of this process.
+		"""
+		try:
+			while connection.poll():
+				kind, states = connection.recv()
+				if kind != "states":
+					continue
+				for room_id, state in states.items():
+					game_manager = self.rooms.get(room_id)
+					if game_manager is not None:
+						game_manager.apply_simulation_state(state)
+		except (EOFError, OSError) as e:
+			print(f"Simulation shard disconnected: {e}", flush=True)
+			asyncio.get_running_loop().remove_reader(connection.fileno())
+
+	def send(self, shard_index: int, message: tuple):
+		"""
+		Queues a message for a shard. It is pickled right away, while the game manager it may hold
+		is not being modified, and written to the pipe by the writer thread of the shard.
+		"""
+		self.outboxes[shard_index].put(bytes(ForkingPickler.dumps(message)))
+
+	def add_room(self, game_manager):
+		"""
+		Hands the simulation of a game manager to the least loaded shard.
+
+		Args:
+			game_manager (PongGameManager): The game manager to simulate.
+		"""
+		if not self.processes:
+			self.start()
+
+		room_id = next(self.room_ids)
+		loads = [0] * self.shard_count
+		for shard_index in self.room_shards.values():
+			loads[shard_index] += 1
+		shard_index = loads.index(min(loads))
+
+		self.send(shard_index, ("add", room_id, game_manager))
+		self.room_shards[room_id] = shard_index
+		self.rooms[room_id] = game_manager
+		game_manager.shard_room_id = room_id
+
+	def send_input(self, game_manager, player_id: int, data: dict):
+		room_id = game_manager.shard_room_id
+		if room_id in self.room_shards:
+			self.send(self.room_shards[room_id], ("input", room_id, player_id, data))
+
+	def remove_room(self, game_manager):
+		"""
+		Stops simulating a game manager in its shard. The game manager keeps the last state received.
+		"""
+		room_id = game_manager.shard_room_id
+		game_manager.shard_room_id = None
+		shard_index = self.room_shards.pop(room_id, None)
+		self.rooms.pop(room_id, None)
+		if shard_index is not None:
+			self.send(shard_index, ("remove", room_id))
+
+shard_pool = SimulationShardPool(
+	getattr(settings, "PONG_SIMULATION_SHARDS", 0),
+	batch_physics=getattr(settings, "PONG_BATCH_PHYSICS", False),
+)
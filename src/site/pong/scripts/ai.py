@@ -1,7 +1,7 @@
 import random
-import asyncio
 from pong.scripts import constants
 from pong.scripts.Paddle import Paddle
+from utilities.TickScheduler import TICK_RATE
 
 class PongAI():
 
@@ -11,11 +11,13 @@ class PongAI():
 		self.player_id = players_id
 
 		self.current_target = None
-		self.last_decision_time = 0
-		self.decision_delay = 1
+		self.decision_delay = TICK_RATE
+		self.ticks = 0
+		self.last_decision_tick = -self.decision_delay
 		self.tracking_ball = False
 		self.returning_to_center = False
 		self.waiting = False
+		self.last_processed_seq = 0
 
 
 	def player_loop(self):
@@ -25,11 +27,10 @@ class PongAI():
 		This method makes the AI move its paddle towards the predicted ball trajectory. 
 		It includes decision-making delays and waits for the ball to come back into play.
 		
-		Args:
-			ball (Ball): The ball object, used to determine the ball's position and speed.
+		Decisions are taken at most once every `decision_delay` ticks. The intercept comes from the
+		ball's closed-form prediction, computed once per trajectory and shared by every AI.
 		"""
-		
-		current_time = asyncio.get_event_loop().time()
+		self.ticks += 1
 		
 		min_y_reachable = constants.GAME_BOUNDS["yMin"] + self.paddle.height / 2
 		max_y_reachable = constants.GAME_BOUNDS["yMax"] - self.paddle.height / 2
@@ -51,10 +52,10 @@ class PongAI():
 				self.tracking_ball = False
 				self.returning_to_center = False
 
-		if current_time - self.last_decision_time < self.decision_delay:
+		if self.ticks - self.last_decision_tick < self.decision_delay:
 			return
 
-		self.last_decision_time = current_time
+		self.last_decision_tick = self.ticks
 
 		self.paddle.y = max(min_y_reachable, min(max_y_reachable, self.paddle.y))
 
@@ -72,29 +73,7 @@ class PongAI():
 				self.returning_to_center = True
 
 			if self.tracking_ball and self.current_target is None:
-				time_to_reach_paddle = abs((self.paddle.x - self.ball.x) / (self.ball.speed_x * self.ball.speed_multiplier))
-				
-				simulated_speed_y = self.ball.speed_y
-				predicted_y = self.ball.y
-				remaining_time = time_to_reach_paddle
-
-				while remaining_time > 0:
-					if simulated_speed_y > 0:
-						distance_to_next_bounce = constants.GAME_BOUNDS["yMax"] - predicted_y
-					else:
-						distance_to_next_bounce = predicted_y - constants.GAME_BOUNDS["yMin"]
-
-					time_to_next_bounce = distance_to_next_bounce / abs(simulated_speed_y * self.ball.speed_multiplier)
-
-					if time_to_next_bounce > remaining_time:
-						predicted_y += simulated_speed_y * remaining_time * self.ball.speed_multiplier
-						break
-					else:
-						predicted_y += simulated_speed_y * time_to_next_bounce * self.ball.speed_multiplier
-						remaining_time -= time_to_next_bounce
-
-						simulated_speed_y *= -1
-
+				predicted_y = self.ball.predict_y_at(self.paddle.x)
 				self.current_target = max(min_y_reachable, min(max_y_reachable, predicted_y))
 
 			elif self.returning_to_center and self.current_target is None:
@@ -102,6 +81,37 @@ class PongAI():
 				offset = random.uniform(-2, 2)
 				self.current_target = max(min_y_reachable, min(max_y_reachable, center_target + offset))
 
+	def save_state(self) -> tuple:
+		"""
+		Returns the state the simulation depends on, to rewind the AI on late inputs of the other player.
+		"""
+		return (
+			self.paddle.y,
+			self.current_target,
+			self.ticks,
+			self.last_decision_tick,
+			self.tracking_ball,
+			self.returning_to_center,
+			self.waiting,
+		)
+
+	def load_state(self, state: tuple):
+		(
+			self.paddle.y,
+			self.current_target,
+			self.ticks,
+			self.last_decision_tick,
+			self.tracking_ball,
+			self.returning_to_center,
+			self.waiting,
+		) = state
+
+	# Keys of to_dict that change during play, in the order of dynamic_values.
+	DYNAMIC_KEYS = ("y",)
+
+	def dynamic_values(self) -> tuple:
+		return (self.paddle.y,)
+
 	def to_dict(self) -> dict:
 		"""
 		Converts the PongPlayer object to a dictionary for broadcasting.
@@ -13,12 +13,48 @@ class Ball:
 		self.speed_y = constants.BALL_SPEED_Y
 		self.bounds = constants.GAME_BOUNDS 
 		self.speed_multiplier = 1.0
+		self.trajectory_version = 0
+		self.prediction_cache = {}
+
+	def change_trajectory(self):
+		"""Invalida le previsioni: chiamato quando la velocità cambia per un motivo diverso dai rimbalzi sui muri."""
+		self.trajectory_version += 1
+		self.prediction_cache.clear()
+
+	def predict_y_at(self, x):
+		"""
+		Calcola in forma chiusa la y della palla quando raggiungerà la coordinata x.
+
+		I rimbalzi sui muri sono ottenuti "srotolando" la traiettoria: la palla si muove in linea retta
+		e la posizione reale è la riflessione del punto srotolato nell'intervallo [yMin, yMax] (modulo 2 * altezza).
+		Il risultato è condiviso da tutte le AI tramite una cache valida finché la traiettoria non cambia.
+		"""
+		cached = self.prediction_cache.get(x)
+		if cached is not None:
+			return cached
+
+		speed_x = self.speed_x * self.speed_multiplier
+		if speed_x == 0:
+			return self.y
+
+		time_to_reach = abs((x - self.x) / speed_x)
+		unfolded_y = self.y + self.speed_y * self.speed_multiplier * time_to_reach
+
+		height = self.bounds["yMax"] - self.bounds["yMin"]
+		offset = (unfolded_y - self.bounds["yMin"]) % (2 * height)
+		if offset > height:
+			offset = 2 * height - offset
+		predicted_y = self.bounds["yMin"] + offset
+
+		self.prediction_cache[x] = predicted_y
+		return predicted_y
 		
 	def start(self):
 		"""Imposta la palla al centro dello schermo con una direzione casuale."""
 		self.x = (self.bounds["xMin"] + self.bounds["xMax"]) / 2
 		self.y = (self.bounds["yMin"] + self.bounds["yMax"]) / 2
 		self.speed_multiplier = 1.0
+		self.change_trajectory()
 
 		angle = random.uniform(-math.pi / 4, math.pi / 4)
 		direction_x = random.choice([-1, 1])
@@ -37,6 +73,7 @@ class Ball:
 		self.x = (self.bounds["xMin"] + self.bounds["xMax"]) / 2
 		self.y = (self.bounds["yMin"] + self.bounds["yMax"]) / 2
 		self.speed_multiplier = 1.0
+		self.change_trajectory()
 
 		if scored_player == "player1":
 			direction_x = 1
@@ -96,6 +133,7 @@ class Ball:
 		distance = math.sqrt(distance_x**2 + distance_y**2)
 
 		if distance <= self.radius:
+			self.change_trajectory()
 			penetration = self.radius - distance
 			if distance != 0:
 				self.x += distance_x / distance * penetration
@@ -24,4 +24,8 @@ GAME_BOUNDS = {
 
 # game data
 MAX_SCORE = 5
-COUNTDOWN = 5
\ No newline at end of file
+COUNTDOWN = 5
+
+# Netcode
+HISTORY_SIZE = 32          # Number of past world states kept per room (in ticks)
+MAX_ROLLBACK_TICKS = 30    # How far back a late input can rewind the simulation
@@ -0,0 +1,328 @@
+import copy
+import json
+import random
+from django.test import SimpleTestCase
+from pong.scripts import constants
+from pong.scripts.PongGameManager import PongGameManager
+from pong.scripts.PongPlayer import PongPlayer
+from utilities.MatchmakingQueue import MatchmakingQueue
+from utilities.GameManager import GameManager
+from utilities.SnapshotStream import SnapshotStream, diff_snapshot, changed_fields
+
+class PongRollbackTests(SimpleTestCase):
+	"""
+	Late inputs rewind the room and replay the logged inputs (PongGameManager.apply_input_at).
+	"""
+
+	def setUp(self):
+		random.seed(42)
+		self.game_manager = PongGameManager(False)
+		self.game_manager.players[1] = PongPlayer(1, constants.GAME_BOUNDS["xMin"] + 1, constants.PADDLE_COLOR)
+		self.game_manager.players[2] = PongPlayer(2, constants.GAME_BOUNDS["xMax"] - 1, constants.PADDLE_COLOR)
+		self.game_manager.is_countdown_finish = True
+
+	def send_input(self, game_manager, player_id: int, seq: int, tick: int, action_type: str = "key_down"):
+		game_manager.update_player({
+			"playerId": player_id,
+			"action_type": action_type,
+			"key": "KeyW",
+			"seq": seq,
+			"tick": tick,
+		})
+
+	def advance(self, game_manager, ticks: int):
+		for _ in range(ticks):
+			game_manager.advance()
+
+	def assert_same_world(self, first, second):
+		self.assertEqual(first.tick, second.tick)
+		self.assertEqual(first.capture_world(), second.capture_world())
+
+	def test_late_input_matches_input_on_time(self):
+		on_time = copy.deepcopy(self.game_manager)
+		late = self.game_manager
+
+		self.advance(on_time, 5)
+		self.send_input(on_time, 1, 1, 5)
+		self.advance(on_time, 5)
+
+		self.advance(late, 10)
+		self.send_input(late, 1, 1, 5)
+
+		self.assert_same_world(on_time, late)
+		self.assertTrue(late.players[1].isMovingUp)
+
+	def test_rewind_replays_logged_inputs(self):
+		on_time = copy.deepcopy(self.game_manager)
+		late = self.game_manager
+
+		self.advance(on_time, 3)
+		self.send_input(on_time, 2, 1, 3)
+		self.advance(on_time, 3)
+		self.send_input(on_time, 1, 1, 6)
+		self.advance(on_time, 4)
+
+		# The input of player 2 arrives on time, the older one of player 1 rewinds past it.
+		self.advance(late, 3)
+		self.send_input(late, 2, 1, 3)
+		self.advance(late, 7)
+		self.send_input(late, 1, 1, 6)
+
+		self.assert_same_world(on_time, late)
+
+	def test_rollback_is_bounded(self):
+		self.advance(self.game_manager, constants.MAX_ROLLBACK_TICKS + 10)
+		self.send_input(self.game_manager, 1, 1, 0)
+
+		self.assertEqual(self.game_manager.input_log[0][0], self.game_manager.tick - constants.MAX_ROLLBACK_TICKS)
+
+	def test_old_and_duplicated_inputs_are_dropped(self):
+		self.advance(self.game_manager, 5)
+		self.send_input(self.game_manager, 1, 2, 5)
+		self.send_input(self.game_manager, 1, 2, 5, "key_up")
+		self.send_input(self.game_manager, 1, 1, 5, "key_up")
+
+		self.assertTrue(self.game_manager.players[1].isMovingUp)
+		self.assertEqual(len(self.game_manager.input_log), 1)
+
+	def test_input_log_is_trimmed(self):
+		for seq in range(1, 4 * constants.HISTORY_SIZE):
+			self.send_input(self.game_manager, 1, seq, self.game_manager.tick, "key_down" if seq % 2 else "key_up")
+			self.advance(self.game_manager, 1)
+
+		oldest_tick = self.game_manager.tick - constants.HISTORY_SIZE - 1
+		self.assertLessEqual(len(self.game_manager.input_log), constants.HISTORY_SIZE + 1)
+		self.assertTrue(all(entry[0] >= oldest_tick for entry in self.game_manager.input_log))
+
+	def test_shard_copy_does_not_log_inputs(self):
+		shard_copy = copy.deepcopy(self.game_manager)
+		shard_copy.in_shard = True
+
+		for seq in range(1, 10):
+			self.send_input(shard_copy, 1, seq, shard_copy.tick, "key_down" if seq % 2 else "key_up")
+			shard_copy.step_simulation()
+
+		self.assertEqual(shard_copy.input_log, [])
+		self.assertTrue(shard_copy.players[1].isMovingUp)
+		self.assertEqual(shard_copy.players[1].last_processed_seq, 9)
+
+class DictGameManager:
+	"""
+	Game manager without dynamic fields, whose snapshot is diffed as a whole.
+	"""
+
+	def __init__(self, state: dict):
+		self.state = state
+
+	def dynamic_fields(self):
+		return GameManager.dynamic_fields(self)
+
+	def to_dict(self) -> dict:
+		return copy.deepcopy(self.state)
+
+def apply_delta(state: dict, delta: dict) -> dict:
+	"""
+	Rebuilds the state of a client from the delta frames it received.
+	"""
+	if delta["keyframe"]:
+		return copy.deepcopy(delta["state"])
+
+	def merge(target: dict, changed: dict):
+		for key, value in changed.items():
+			if isinstance(value, dict) and isinstance(target.get(key), dict):
+				merge(target[key], value)
+			else:
+				target[key] = copy.deepcopy(value)
+
+	state = copy.deepcopy(state)
+	merge(state, delta["changed"])
+	for path in delta.get("removed", []):
+		node = state
+		for key in path[:-1]:
+			node = node[key]
+		del node[path[-1]]
+	return state
+
+class SnapshotStreamTests(SimpleTestCase):
+	"""
+	Delta frames of the snapshot stream (utilities/SnapshotStream.py).
+	"""
+
+	def next_delta(self, stream: SnapshotStream, game_manager) -> dict:
+		stream.tick += 1
+		return stream.next_delta(game_manager, game_manager.to_dict)
+
+	def test_diff_snapshot(self):
+		previous = {"ball": {"x": 1, "y": 2}, "scores": [0, 0], "players": {"1": {"y": 0}, "2": {"y": 0}}, "status": "RUNNING"}
+		current = {"ball": {"x": 1, "y": 3}, "scores": [0, 1], "players": {"1": {"y": 0}}, "status": "RUNNING", "winner": 1}
+
+		changed, removed = diff_snapshot(previous, current)
+
+		self.assertEqual(changed, {"ball": {"y": 3}, "scores": [0, 1], "winner": 1})
+		self.assertEqual(removed, [["players", "2"]])
+		self.assertEqual(diff_snapshot(current, copy.deepcopy(current)), ({}, []))
+
+	def test_changed_fields(self):
+		paths = (("ball", "x"), ("ball", "y"), ("tick",))
+
+		self.assertEqual(changed_fields(paths, (1, 2, 3), (1, 2, 3)), {})
+		self.assertEqual(changed_fields(paths, (1, 2, 3), (1, 5, 4)), {"ball": {"y": 5}, "tick": 4})
+
+	def test_keyframe_then_diffs(self):
+		stream = SnapshotStream(keyframe_interval=10)
+		game_manager = DictGameManager({"ball": {"x": 0, "y": 0}, "players": {"1": {"y": 0}, "2": {"y": 0}}})
+
+		first = self.next_delta(stream, game_manager)
+		self.assertTrue(first["keyframe"])
+		self.assertEqual(first["state"], game_manager.state)
+
+		game_manager.state["ball"]["x"] = 1
+		del game_manager.state["players"]["2"]
+		second = self.next_delta(stream, game_manager)
+		self.assertFalse(second["keyframe"])
+		self.assertEqual(second["base_tick"], first["tick"])
+		self.assertEqual(second["changed"], {"ball": {"x": 1}})
+		self.assertEqual(second["removed"], [["players", "2"]])
+		self.assertEqual(apply_delta(apply_delta({}, first), second), game_manager.state)
+
+		third = self.next_delta(stream, game_manager)
+		self.assertEqual(third["changed"], {})
+		self.assertNotIn("removed", third)
+
+	def test_periodic_and_requested_keyframes(self):
+		stream = SnapshotStream(keyframe_interval=3)
+		game_manager = DictGameManager({"tick": 0})
+
+		keyframes = []
+		for tick in range(1, 8):
+			game_manager.state["tick"] = tick
+			if tick == 5:
+				stream.subscribe("late_client", "delta")
+			keyframes.append(self.next_delta(stream, game_manager)["keyframe"])
+
+		self.assertEqual(keyframes, [True, False, False, True, True, False, False])
+
+	def test_dynamic_fields_rebuild_the_snapshot(self):
+		random.seed(42)
+		game_manager = PongGameManager(False)
+		game_manager.players[1] = PongPlayer(1, constants.GAME_BOUNDS["xMin"] + 1, constants.PADDLE_COLOR)
+		game_manager.players[2] = PongPlayer(2, constants.GAME_BOUNDS["xMax"] - 1, constants.PADDLE_COLOR)
+		game_manager.is_countdown_finish = True
+		stream = SnapshotStream(keyframe_interval=1000)
+
+		state = apply_delta({}, self.next_delta(stream, game_manager))
+		for tick in range(200):
+			if tick % 7 == 0:
+				game_manager.update_player({
+					"playerId": 1 + tick % 2,
+					"action_type": "key_down" if tick % 3 else "key_up",
+					"key": "KeyW",
+					"seq": tick + 1,
+					"tick": game_manager.tick,
+				})
+			game_manager.advance()
+			delta = self.next_delta(stream, game_manager)
+			self.assertFalse(delta["keyframe"])
+			state = apply_delta(state, delta)
+			self.assertEqual(json.loads(json.dumps(state)), json.loads(json.dumps(game_manager.to_dict())))
+
+	def test_new_player_forces_a_keyframe(self):
+		game_manager = PongGameManager(False)
+		game_manager.players[1] = PongPlayer(1, constants.GAME_BOUNDS["xMin"] + 1, constants.PADDLE_COLOR)
+		stream = SnapshotStream(keyframe_interval=1000)
+
+		self.assertTrue(self.next_delta(stream, game_manager)["keyframe"])
+		self.assertFalse(self.next_delta(stream, game_manager)["keyframe"])
+		game_manager.players[2] = PongPlayer(2, constants.GAME_BOUNDS["xMax"] - 1, constants.PADDLE_COLOR)
+		self.assertTrue(self.next_delta(stream, game_manager)["keyframe"])
+
+class MatchmakingQueueTests(SimpleTestCase):
+	"""
+	Pairing of the MMR-sorted matchmaking queue (utilities/MatchmakingQueue.py).
+	"""
+
+	def setUp(self):
+		self.queue = MatchmakingQueue(
+			base_mmr_gap=20,
+			max_mmr_gap=100,
+			mmr_gap_step=20,
+			widen_interval=20,
+			force_match_after=60,
+		)
+
+	def assert_consistent(self):
+		self.assertEqual(self.queue.keys, sorted(self.queue.keys))
+		self.assertEqual(self.queue.keys, [player.key for player in self.queue.sorted_players])
+		self.assertEqual(sorted(self.queue.players), sorted(player.channel_name for player in self.queue.sorted_players))
+
+	def pair_names(self, pairs):
+		return [tuple(sorted((first.channel_name, second.channel_name))) for first, second in pairs]
+
+	def test_pairs_closest_opponent(self):
+		self.queue.add("a", 1, 1000, 0)
+		self.queue.add("b", 2, 1015, 0)
+		self.queue.add("c", 3, 1005, 0)
+
+		pairs = self.queue.match(0)
+
+		self.assertEqual(self.pair_names(pairs), [("a", "c")])
+		self.assertEqual(list(self.queue.players), ["b"])
+		self.assert_consistent()
+
+	def test_gap_widens_with_waiting(self):
+		self.queue.add("a", 1, 1000, 0)
+		self.queue.add("b", 2, 1050, 0)
+
+		self.assertEqual(self.queue.match(0), [])
+		self.assertEqual(self.queue.match(39), [])
+		self.assertEqual(self.pair_names(self.queue.match(40)), [("a", "b")])
+
+	def test_gap_is_capped(self):
+		self.queue.force_match_after = 1000
+		self.queue.add("a", 1, 1000, 0)
+		self.queue.add("b", 2, 1150, 0)
+
+		self.assertEqual(self.queue.tolerance(self.queue.players["a"], 500), 100)
+		self.assertEqual(self.queue.match(500), [])
+
+	def test_forced_match_after_long_wait(self):
+		self.queue.add("a", 1, 0, 0)
+		self.queue.add("b", 2, 5000, 0)
+
+		self.assertEqual(self.queue.match(59), [])
+		self.assertEqual(self.pair_names(self.queue.match(60)), [("a", "b")])
+		self.assertEqual(len(self.queue), 0)
+
+	def test_longest_waiting_player_decides(self):
+		self.queue.add("old", 1, 1000, 0)
+		self.queue.add("new", 2, 1060, 55)
+
+		# The gap of 60 fits the tolerance of the player who joined first, not of the newcomer.
+		self.assertEqual(self.pair_names(self.queue.match(55)), [("new", "old")])
+
+	def test_longest_waiting_players_are_matched_first(self):
+		self.queue.add("b", 2, 1010, 10)
+		self.queue.add("a", 1, 1000, 0)
+		self.queue.add("c", 3, 1020, 20)
+
+		pairs = self.queue.match(20)
+
+		self.assertEqual([(first.channel_name, second.channel_name) for first, second in pairs], [("b", "a")])
+		self.assertEqual(list(self.queue.players), ["c"])
+
+	def test_remove_player_with_equal_mmr(self):
+		for index, name in enumerate("abcd"):
+			self.queue.add(name, index, 1000, 0)
+
+		removed = self.queue.remove("c")
+
+		self.assertEqual(removed.channel_name, "c")
+		self.assertEqual([player.channel_name for player in self.queue.sorted_players], ["a", "b", "d"])
+		self.assertIsNone(self.queue.remove("c"))
+		self.assert_consistent()
+
+	def test_add_twice_is_ignored(self):
+		self.assertTrue(self.queue.add("a", 1, 1000, 0))
+		self.assertFalse(self.queue.add("a", 1, 1200, 0))
+		self.assertEqual(len(self.queue), 1)
+		self.assertEqual(self.queue.players["a"].mmr, 1000)
@@ -8,6 +8,7 @@ urlpatterns = [
     path('api/pong/room_state', PongRoomState.as_view()),
     path('api/pong/start_lobby', PongStartLobbyView.as_view()),
     path('api/pong/player_control', PongPlayerControlView.as_view()),
+    path('api/pong/room_profile', PongRoomProfileView.as_view()),
     path('api/pong/last_match', LastPongMatchView.as_view()),
     path('api/pong/last_tournament', LastPongTournamentMatchView.as_view()),
 ]
\ No newline at end of file
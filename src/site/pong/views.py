@@ -3,7 +3,7 @@ from asgiref.sync import async_to_sync
 from rest_framework.response import Response
 from .models import *
 from .serializers import *
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.views import APIView
 from rest_framework import status
 from django.db.models import Q
@@ -16,10 +16,11 @@ from pong.consumer import match_manager
 class PongRoomState(APIView):
 	def post(self, request):
 		room_name = request.data.get('room_name')
-		match: Lobby = match_manager.get_match(room_name)
+		match: Lobby = async_to_sync(match_manager.find_match)(room_name)
 		if not match:
 			return Response({"error": "Match not found."}, status=status.HTTP_404_NOT_FOUND)
-		return Response({"lobby_info": match.to_dict()}, status=status.HTTP_201_CREATED)
+		lobby_info = async_to_sync(match_manager.call)(match, "to_dict")
+		return Response({"lobby_info": lobby_info}, status=status.HTTP_201_CREATED)
 
 class PongCheckLobby(APIView):
 
@@ -35,7 +36,7 @@ class PongCheckLobby(APIView):
 		print(f" room to find {room_name}")
 		print(f" all  matchs {match_manager.matches}")
 
-		match = match_manager.get_match(room_name)
+		match = async_to_sync(match_manager.find_match)(room_name)
 		if not match:
 			print(f" sadas das dsa {match_manager.matches}")
 			return Response({"success": "false"}, status=status.HTTP_404_NOT_FOUND)
@@ -72,16 +73,17 @@ class PongStartLobbyView(APIView):
 	def post(self, request):
 
 		room_name = request.data.get('room_name')
-		match: Lobby = match_manager.get_match(room_name)
+		match: Lobby = async_to_sync(match_manager.find_match)(room_name)
 		if not match:
 			return Response({"error": "Match not found."}, status=status.HTTP_404_NOT_FOUND)
 
-		if len(match.game_manager.players) != 2:
+		if async_to_sync(match_manager.call)(match, "len_player") != 2:
 			return Response({"error": "not enough player."}, status=status.HTTP_404_NOT_FOUND)
 
-		async_to_sync(match.force_player_ready)()
-		async_to_sync(match.start_game)()
-		return Response({"lobby_info": match.to_dict()}, status=status.HTTP_201_CREATED)
+		async_to_sync(match_manager.call)(match, "force_player_ready")
+		async_to_sync(match_manager.call)(match, "start_game")
+		lobby_info = async_to_sync(match_manager.call)(match, "to_dict")
+		return Response({"lobby_info": lobby_info}, status=status.HTTP_201_CREATED)
 
 class PongInitView(APIView):
 	def post(self, request):
@@ -89,13 +91,17 @@ class PongInitView(APIView):
 		Create a new game.
 		"""
 		room_name = str(uuid.uuid4())
-		match: Lobby = match_manager.create_match("pong", room_name, PongGameManager(False), "Lobby")
+		try:
+			match: Lobby = async_to_sync(match_manager.open_match_on_worker)("pong", room_name, "Lobby", False)
+		except TimeoutError:
+			return Response({"server_error": "No game server is available."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
-		async_to_sync(match.add_player_to_lobby)({"player_id": "-1"}, False)
-		async_to_sync(match.mark_player_ready)({"player_id": "-1"})
+		async_to_sync(match_manager.call)(match, "add_player_to_lobby", {"player_id": "-1"}, False)
+		async_to_sync(match_manager.call)(match, "mark_player_ready", {"player_id": "-1"})
+		lobby_info = async_to_sync(match_manager.call)(match, "to_dict")
 
 		return Response(
-			{"room_name": room_name, "lobby_info": match.to_dict()},
+			{"room_name": room_name, "lobby_info": lobby_info},
 			status=status.HTTP_201_CREATED
 		)
 
@@ -112,14 +118,46 @@ class PongPlayerControlView(APIView):
 		}
 		"""
 		room_name = request.data.get('room_name')
-		match: Lobby = match_manager.get_match(room_name)
+		match: Lobby = async_to_sync(match_manager.find_match)(room_name)
+		if not match:
+			return Response({"error": "Match not found."}, status=status.HTTP_404_NOT_FOUND)
+		try:
+			async_to_sync(match_manager.call)(match, "game_manager.update_player", {**request.data, "playerId": -1})
+			lobby_info = async_to_sync(match_manager.call)(match, "to_dict")
+		except Exception as e:
+			return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+		return Response({"lobby_info": lobby_info}, status=status.HTTP_200_OK)
+
+class PongRoomProfileView(APIView):
+	permission_classes = [IsAdminUser]
+
+	def get(self, request):
+		"""
+		Returns the cProfile report of a profiled room.
+		"""
+		match = async_to_sync(match_manager.find_match)(request.query_params.get('room_name'))
+		if not match:
+			return Response({"error": "Match not found."}, status=status.HTTP_404_NOT_FOUND)
+		report = async_to_sync(match_manager.call)(match, "profile_report")
+		return Response({"report": report}, status=status.HTTP_200_OK)
+
+	def post(self, request):
+		"""
+		Turns sampled profiling of a room on or off.
+		Expected payload: {
+			"room_name": <room_name>,
+			"sample_rate": <share of the ticks to profile, 0 to stop>,
+		}
+		"""
+		match = async_to_sync(match_manager.find_match)(request.data.get('room_name'))
 		if not match:
 			return Response({"error": "Match not found."}, status=status.HTTP_404_NOT_FOUND)
 		try:
-			match.game_manager.players[-1].update_player_data(request.data)
+			sample_rate = float(request.data.get('sample_rate', 0.01))
+			report = async_to_sync(match_manager.call)(match, "set_profiling", sample_rate)
 		except Exception as e:
 			return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
-		return Response({"lobby_info": match.to_dict()}, status=status.HTTP_200_OK)
+		return Response({"report": report}, status=status.HTTP_200_OK)
 
 class LastPongMatchView(APIView):
     permission_classes = [IsAuthenticated]
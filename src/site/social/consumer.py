@@ -1,36 +1,20 @@
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from social.scripts.SocialUser import SocialUser
+from utilities.PresenceService import presence
+from utilities.FriendGraph import friend_graph
 from channels.layers import get_channel_layer
-from website.models import User
-from channels.db import database_sync_to_async
-
-async def get_active_users():
-	"""Fetch active users asynchronously (Online, Away, Busy, Matchmaking, Playing)."""
-	active_statuses = [
-		User.UserStatus.ONLINE,
-		User.UserStatus.AWAY,
-		User.UserStatus.BUSY,
-		User.UserStatus.MATCHMAKING,
-		User.UserStatus.PLAYING,
-	]
-	return await database_sync_to_async(lambda: list(User.objects.filter(status__in=active_statuses).values_list('id', flat=True)))()
+
+# Group joined by every social socket, to reach the whole site with a single group_send.
+BROADCAST_GROUP = "social_broadcast"
 
 async def send_event_to_all_consumer(event_type: str, message: dict):
-	"""Send a WebSocket event to all active users."""
+	"""Send a WebSocket event to all connected users."""
 	channel_layer = get_channel_layer()
 	try:
-		active_user_ids = await get_active_users()
+		await channel_layer.group_send(BROADCAST_GROUP, {"type": event_type, **message})
 	except Exception as e:
-		raise ValueError(f"error while retrieving user: {str(e)}")
-	for user_id in active_user_ids:
-		group_name = f"user_{user_id}"
-		payload = {"type": event_type, **message}
-
-		try:
-			await channel_layer.group_send(group_name, payload)
-		except Exception as e:
-			print(f"Failed to send event to {group_name}: {e}")
+		print(f"Failed to send event to {BROADCAST_GROUP}: {e}")
 
 class SocialConsumer(AsyncWebsocketConsumer):
 	async def connect(self):
@@ -41,8 +25,9 @@ class SocialConsumer(AsyncWebsocketConsumer):
 		self.user = SocialUser(self.scope["user"])
 
 		await self.channel_layer.group_add(self.group_name, self.channel_name)
+		await self.channel_layer.group_add(BROADCAST_GROUP, self.channel_name)
 		await self.accept()
-		await self.user.change_status({"new_status": "Online"})
+		await presence.connect(self.scope["user"])
 
 
 		self.event_mapping = {
@@ -63,8 +48,9 @@ class SocialConsumer(AsyncWebsocketConsumer):
 		"""
 		Remove the user from the channel group when they disconnect.
 		"""
-		await self.user.change_status({"new_status": "Offline"})
+		presence.disconnect(self.scope["user"])
 		await self.channel_layer.group_discard(self.group_name, self.channel_name)
+		await self.channel_layer.group_discard(BROADCAST_GROUP, self.channel_name)
 
 	async def receive(self, text_data: str):
 		"""
@@ -97,22 +83,48 @@ class SocialConsumer(AsyncWebsocketConsumer):
 	async def get_status_change(self, event: dict):
 		await self.send_event("get_status_change", friend_username=event["friend_username"], new_status=event["status"])
 
+	async def get_status_changes(self, event: dict):
+		changes = [
+			{"friend_username": change["friend_username"], "new_status": change["status"]}
+			for change in event["changes"]
+		]
+		await self.send_event("get_status_changes", changes=changes)
+
+	def apply_friendship_change(self, event: dict):
+		"""
+		Applies to the friend graph of this worker a friendship edited on the worker of one of its users.
+		"""
+		if event["are_friends"]:
+			friend_graph.add_friendship(event["user_id"], event["friend_id"])
+		else:
+			friend_graph.remove_friendship(event["user_id"], event["friend_id"])
+
+	async def friendship_changed(self, event: dict):
+		self.apply_friendship_change(event)
+
 	async def get_blocked(self, event: dict):
+		self.apply_friendship_change(event)
+		self.user.forget_conversation(event["username"])
 		await self.send_event("get_blocked", username=event["username"])
 
 	async def get_unblocked(self, event: dict):
+		self.apply_friendship_change(event)
 		await self.send_event("get_unblocked", username=event["username"])
 
 	async def get_friend_request(self, event: dict):
 		await self.send_event("get_friend_request", username=event["username"])
 
 	async def get_friend_request_declined(self, event: dict):
+		self.apply_friendship_change(event)
 		await self.send_event("get_friend_request_declined", username=event["username"])
 
 	async def get_friend_removed(self, event: dict):
+		self.apply_friendship_change(event)
+		self.user.forget_conversation(event["username"])
 		await self.send_event("get_friend_removed", username=event["username"])
 
 	async def get_friend_request_accepted(self, event: dict):
+		self.apply_friendship_change(event)
 		await self.user.notify_friends_status()
 		await self.send_event("get_friend_request_accepted", username=event["username"])
 
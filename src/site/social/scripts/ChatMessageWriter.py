@@ -0,0 +1,78 @@
+import asyncio
+from django.db import close_old_connections
+from channels.db import database_sync_to_async
+from social.models import ChatMessage
+
+# Messages buffered before a flush is started without waiting for the interval.
+FLUSH_SIZE = 100
+# Seconds a message waits in the buffer at most.
+FLUSH_INTERVAL = 0.5
+
+class ChatMessageWriter:
+	"""
+	Buffered writer of the chat messages.
+
+	Messages are delivered to the recipient before they are saved: SocialUser.send_message only adds
+	them to the buffer, which is written with a single bulk insert when it holds FLUSH_SIZE messages
+	or FLUSH_INTERVAL seconds after its first message. Insertion order is kept, so the history read
+	by ChatView stays in sending order. The created_at of a message is the time of its flush.
+
+	Messages still buffered when the process stops are lost.
+	"""
+
+	def __init__(self, flush_size: int = FLUSH_SIZE, flush_interval: float = FLUSH_INTERVAL):
+		"""
+		Args:
+			flush_size (int): The number of buffered messages that triggers a flush.
+			flush_interval (float): The number of seconds a message waits in the buffer at most.
+		"""
+		self.flush_size = flush_size
+		self.flush_interval = flush_interval
+		self.buffer: list[ChatMessage] = []
+		self.flush_event = None
+		self.flush_task = None
+
+	def add(self, message: ChatMessage):
+		"""
+		Buffers an unsaved message.
+		"""
+		self.buffer.append(message)
+		if self.flush_task is None or self.flush_task.done():
+			self.flush_event = asyncio.Event()
+			self.flush_task = asyncio.create_task(self.run())
+		if len(self.buffer) >= self.flush_size:
+			self.flush_event.set()
+
+	async def run(self):
+		"""
+		Writer loop, running while messages are buffered. Waits for the buffer to fill up or for the interval, then flushes.
+		"""
+		while self.buffer:
+			try:
+				await asyncio.wait_for(self.flush_event.wait(), self.flush_interval)
+			except asyncio.TimeoutError:
+				pass
+			self.flush_event.clear()
+			messages, self.buffer = self.buffer, []
+			try:
+				await self.write(messages)
+			except Exception as e:
+				print(f"Failed to save {len(messages)} chat messages: {e}")
+
+	@database_sync_to_async
+	def write(self, messages: list[ChatMessage]):
+		close_old_connections()
+		try:
+			ChatMessage.objects.bulk_create(messages)
+			return
+		except Exception as e:
+			print(f"Bulk insert of {len(messages)} chat messages failed, saving them one by one: {e}")
+
+		# One bad message, e.g. of a friendship deleted in between, must not drop the others.
+		for message in messages:
+			try:
+				message.save()
+			except Exception as e:
+				print(f"Dropping chat message of user {message.sender_id} in friendship {message.friendship_id}: {e}")
+
+chat_messages = ChatMessageWriter()
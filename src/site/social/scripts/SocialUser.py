@@ -4,14 +4,29 @@ from website.models import Friendships, User
 from channels.layers import get_channel_layer
 from social.models import ChatMessage
 from django.utils.html import escape
+from utilities.FriendGraph import friend_graph
+from utilities.PresenceService import presence
+from utilities.ChannelLayers import group_send_many
+from social.scripts.ChatMessageWriter import chat_messages
 
 MAX_MESSAGE_LENGTH = 500
 
+class Conversation:
+	"""
+	A friend the user is chatting with, cached by SocialUser._get_conversation.
+	"""
+
+	def __init__(self, target_user_id: int, friendship_id: int, version: int):
+		self.target_user_id = target_user_id
+		self.friendship_id = friendship_id
+		self.version = version
+
 class SocialUser:
 
 	def __init__(self, user):
 		self.user = user
 		self.channel_layer = get_channel_layer()
+		self.conversations: dict[str, Conversation] = {}
 
 	async def _validate_user(self, username):
 		if username == self.user.username:
@@ -34,70 +49,63 @@ class SocialUser:
 			raise ValueError(f"error while getting friendships: {str(e)}")
 		return friendship
 
+	async def _send_friendship_event(self, target_user_id: int, event_type: str, are_friends: bool):
+		"""
+		Sends a friendship event to the target user, and the edit of the friendship to the other
+		connections of the user. The friend graph of each worker is only edited by the SocialUser
+		methods running on it, so the workers of both users apply the edit when they receive it.
+
+		Args:
+			target_user_id (int): The ID of the other user of the friendship.
+			event_type (str): The type of the event sent to the target user.
+			are_friends (bool): Whether the users are friends after the edit.
+		"""
+		change = {"user_id": self.user.id, "friend_id": target_user_id, "are_friends": are_friends}
+		await group_send_many(self.channel_layer, [
+			(f"user_{target_user_id}", {"type": event_type, "username": self.user.username, **change}),
+			(f"user_{self.user.id}", {"type": "friendship_changed", **change}),
+		])
+
 	async def notify_friends_status(self):
+		"""
+		Sends the status of the user to each of its friends, read from the friend graph.
+		"""
 		try:
-			friendships = await database_sync_to_async(list)(
-				Friendships.objects.filter(
-					Q(first_user=self.user) | Q(second_user=self.user)
-				).select_related("first_user", "second_user")
-			)
+			friend_ids = await friend_graph.get_friends(self.user.id)
 		except Exception as e:
 			raise ValueError(f"error while getting friendships: {str(e)}")
 
-		notifications = []
-		for friendship in friendships:
-			
-			if friendship.status != Friendships.FriendshipsStatus.FRIENDS:
-				continue
-			
-			actor = self.user
-			recipient = friendship.second_user if friendship.first_user == self.user else friendship.first_user
-
-			payload = {
-				"type": "get_status_change",
-				"friend_username": actor.username,
-				"status": User.get_status_name(actor.status),
-			}
-			notifications.append((f"user_{recipient.id}", payload))
-
-		for group, payload in notifications:
-			await self.channel_layer.group_send(group, payload)
+		payload = {
+			"type": "get_status_change",
+			"friend_username": self.user.username,
+			"status": User.get_status_name(presence.get_status(self.user.id)),
+		}
+
+		await group_send_many(self.channel_layer, [(f"user_{friend_id}", payload) for friend_id in friend_ids])
 
 	async def notify_friend_status(self, friend_user):
 		try:
-			friendship = await database_sync_to_async(
-				Friendships.objects.filter(
-					(Q(first_user=self.user, second_user=friend_user) | Q(first_user=friend_user, second_user=self.user))
-					& Q(status=Friendships.FriendshipsStatus.FRIENDS)
-				).select_related("first_user", "second_user").first
-			)()
-			
-			if not friendship:
-				return
-
+			friend_ids = await friend_graph.get_friends(self.user.id)
 		except Exception as e:
 			raise ValueError(f"error while getting friendship: {str(e)}")
 
-		actor = self.user
-		recipient = friend_user
+		if friend_user.id not in friend_ids:
+			return
 
 		payload = {
 			"type": "get_status_change",
-			"friend_username": actor.username,
-			"status": User.get_status_name(actor.status),
+			"friend_username": self.user.username,
+			"status": User.get_status_name(presence.get_status(self.user.id)),
 		}
 
-		await self.channel_layer.group_send(f"user_{recipient.id}", payload)
+		await self.channel_layer.group_send(f"user_{friend_user.id}", payload)
 
 	async def change_status(self, data: dict):
 		"""
-		Block a user, preventing further interaction.
+		Change the status of the user. It is saved and sent to its friends by the presence service.
 
 		Args:
-			data (dict): Data containing the username of the user to block.
-
-		Raises:
-			ValueError: If the username is not provided, the user doesn't exist, or there is no existing friendship.
+			data (dict): Data containing the name of the new status.
 		"""
 		new_status = data.get("new_status")
 		
@@ -113,17 +121,11 @@ class SocialUser:
 			if status_key is None:
 				raise ValueError(f"Invalid status: {new_status}")
 
-			self.user.status = status_key
-		
 		except Exception as e:
 			print(f" error change status {e}")
 			return
-		
-		try:
-			await database_sync_to_async(self.user.save)(update_fields=["status"])
-		except Exception as e:
-			raise ValueError(f"error while saving new status: {str(e)}")
-		await self.notify_friends_status()
+
+		presence.set_status(self.user, status_key)
 
 	async def block_user(self, data: dict):
 		"""
@@ -150,16 +152,13 @@ class SocialUser:
 			else:
 				friendship.status = Friendships.FriendshipsStatus.SECOND_USER_BLOCK
 			await database_sync_to_async(friendship.save)(update_fields=["status"])
+			friend_graph.remove_friendship(self.user.id, block_target.id)
 		except User.DoesNotExist:
 			raise ValueError(f"User '{user_to_block}' does not exist.")
 		except Exception as e:
 			raise ValueError(f"error while getting user to block: {str(e)}")
 
-		payload = {
-			"type": "get_blocked",
-			"username": self.user.username,
-		}
-		await self.channel_layer.group_send(f"user_{block_target.id}", payload)
+		await self._send_friendship_event(block_target.id, "get_blocked", False)
 
 	async def unblock_user(self, data: dict):
 		"""
@@ -181,17 +180,13 @@ class SocialUser:
 			unblock_target = await database_sync_to_async(User.objects.get)(username=user_to_unblock)
 			friendship.status = Friendships.FriendshipsStatus.FRIENDS
 			await database_sync_to_async(friendship.save)(update_fields=["status"])
+			friend_graph.add_friendship(self.user.id, unblock_target.id)
 		except User.DoesNotExist:
 			raise ValueError(f"User '{user_to_unblock}' does not exist.")
 		except Exception as e:
 			raise ValueError(f"error while getting user: {str(e)}")
 
-		payload = {
-			"type": "get_unblocked",
-			"username": self.user.username,
-		}
-
-		await self.channel_layer.group_send(f"user_{unblock_target.id}", payload)
+		await self._send_friendship_event(unblock_target.id, "get_unblocked", True)
 
 	async def send_friend_request(self, data: dict):
 		target_username = await self._validate_user(data.get("username"))
@@ -248,17 +243,13 @@ class SocialUser:
 		try:
 			target_user = await database_sync_to_async(User.objects.get)(username=target_username)
 			await database_sync_to_async(friendship.delete)()
+			friend_graph.remove_friendship(self.user.id, target_user.id)
 		except User.DoesNotExist:
 			raise ValueError(f"User '{target_username}' does not exist.")
 		except Exception as e:
 			raise ValueError(f"error while retrieving user: {str(e)}")
 
-		payload = {
-			"type": event_name,
-			"username": self.user.username,
-		}
-
-		await self.channel_layer.group_send(f"user_{target_user.id}", payload)
+		await self._send_friendship_event(target_user.id, event_name, False)
 
 	async def accept_friend_request(self, data: dict):
 		target_username = await self._validate_user(data.get("username"))
@@ -271,33 +262,72 @@ class SocialUser:
 			target_user = await database_sync_to_async(User.objects.get)(username=target_username)
 			friendship.status = Friendships.FriendshipsStatus.FRIENDS
 			await database_sync_to_async(friendship.save)(update_fields=["status"])
+			friend_graph.add_friendship(self.user.id, target_user.id)
 		except User.DoesNotExist:
 			raise ValueError(f"User '{target_username}' does not exist.")
 		except Exception as e:
 			raise ValueError(f"error while retrieving user: {str(e)}")
 
-		payload = {
-			"type": "get_friend_request_accepted",
-			"username": self.user.username,
-		}
-
-		await self.channel_layer.group_send(f"user_{target_user.id}", payload)
+		await self._send_friendship_event(target_user.id, "get_friend_request_accepted", True)
 
 		await self.notify_friend_status(target_user)
 
-	async def send_message(self, data: dict):
-		target_username = await self._validate_user(data.get("username"))
+	async def _get_conversation(self, username: str):
+		"""
+		Returns the conversation with a friend, resolved once and cached until the friendships
+		of the user change (see FriendGraph.version).
+
+		Returns:
+			Conversation or None: None if the friendship is not accepted or is blocked.
+
+		Raises:
+			ValueError: If there is no friendship with this user.
+		"""
+		version = friend_graph.version(self.user.id)
+		conversation = self.conversations.get(username)
+		if conversation is not None and conversation.version == version:
+			return conversation
 
 		try:
-			target_user = await database_sync_to_async(User.objects.get)(username=target_username)
-		except User.DoesNotExist:
-			raise ValueError(f"User '{target_username}' does not exist.")
+			friendship = await database_sync_to_async(
+				Friendships.objects.filter(
+					Q(first_user=self.user, second_user__username=username) |
+					Q(first_user__username=username, second_user=self.user)
+				).values("id", "first_user_id", "second_user_id", "status").first
+			)()
 		except Exception as e:
-			raise ValueError(f"error while retrieving user: {str(e)}")
-				
-		_friendship =  await self._get_friendship(target_username)
+			raise ValueError(f"error while getting friendships: {str(e)}")
+
+		if friendship is None:
+			self.conversations.pop(username, None)
+			raise ValueError(f"a relationship between '{self.user.username}' and '{username}' does not exist")
+
+		if friendship["status"] != Friendships.FriendshipsStatus.FRIENDS:
+			self.conversations.pop(username, None)
+			return None
+
+		target_user_id = friendship["second_user_id"] if friendship["first_user_id"] == self.user.id else friendship["first_user_id"]
+		conversation = Conversation(target_user_id, friendship["id"], version)
+		self.conversations[username] = conversation
+		return conversation
 
-		if _friendship.status != Friendships.FriendshipsStatus.FRIENDS:
+	def forget_conversation(self, username: str):
+		"""
+		Drops the cached conversation with a user that ended the friendship. FriendGraph.version only
+		changes with the edits known to this worker, which may not be the worker of that user.
+		"""
+		self.conversations.pop(username, None)
+
+	async def send_message(self, data: dict):
+		"""
+		Send a chat message to a friend. The message is delivered first, then saved by the buffered chat writer.
+		"""
+		target_username = data.get("username")
+		if target_username == self.user.username:
+			raise ValueError("Cannot perform this operation on yourself.")
+
+		conversation = await self._get_conversation(target_username)
+		if conversation is None:
 			print(f"User '{target_username}' isnt friend with {self.user.username}.")
 			return
 
@@ -311,21 +341,18 @@ class SocialUser:
 		if len(message) > MAX_MESSAGE_LENGTH:
 			raise ValueError("Message is too long.")
 
-		try:
-			await database_sync_to_async(ChatMessage.objects.create)(
-				friendship=_friendship,
-				sender=self.user,
-				message_text=message
-			)
-		except Exception as e:
-			raise ValueError(f"error while creating chat: {str(e)}")
-
 		payload = {
 			"type": "get_message",
 			"message": message,
 			"username": self.user.username,
 		}
-		await self.channel_layer.group_send(f"user_{target_user.id}", payload)
+		await self.channel_layer.group_send(f"user_{conversation.target_user_id}", payload)
+
+		chat_messages.add(ChatMessage(
+			friendship_id=conversation.friendship_id,
+			sender_id=self.user.id,
+			message_text=message
+		))
 
 	async def send_lobby_invite(self, data: dict):
 		target_username = await self._validate_user(data.get("username"))
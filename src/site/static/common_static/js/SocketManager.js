@@ -16,6 +16,10 @@ export default class SocketManager
 		this.activePing = activePing;
 		this.isSlowConnection = false;
 		this.onNormalConnection = null;
+		this.lobbyState = null;
+		this.lastFrameTick = null;
+		this.keyframeRequested = false;
+		this.frameFormat = 'delta';
 	}
 
 	/**
@@ -76,6 +80,10 @@ export default class SocketManager
 			
 				if (this.processPingMessage(data)) 
 					return;
+
+				data = this.processLobbyDelta(data);
+				if (data === null)
+					return;
 			
 				handleSocketMessage(data);
 			};
@@ -107,10 +115,14 @@ export default class SocketManager
 			const mode = SocketManager.getModeFromPath();
 			const socketUrl = `${wsProtocol}/${window.location.host}/ws/${mode}/${gameName}/${roomName}`;
 			this.socket = new WebSocket(socketUrl);
+			this.socket.binaryType = 'arraybuffer';
+			// Pong 'game_loop' frames have a binary layout, see decodeGameFrame.
+			this.frameFormat = gameName === 'pong' ? 'binary' : 'delta';
 
 			this.socket.onopen = () => {
 				console.log('WebSocket connection opened');
 				this.connected = true;
+				this.send(JSON.stringify({ type: 'set_frame_format', format: this.frameFormat }));
 				this.startPing();
 				if (onSocketOpen) 
 					onSocketOpen();
@@ -132,6 +144,14 @@ export default class SocketManager
 			};
 
 			this.socket.onmessage = (event) => {
+				if (event.data instanceof ArrayBuffer)
+				{
+					const frameData = this.processGameFrame(event.data);
+					if (frameData !== null)
+						handleSocketMessage(frameData);
+					return;
+				}
+
 				let data;
 				try {
 					data = JSON.parse(event.data);
@@ -143,6 +163,10 @@ export default class SocketManager
 			
 				if (this.processPingMessage(data)) 
 					return;
+
+				data = this.processLobbyDelta(data);
+				if (data === null)
+					return;
 			
 				handleSocketMessage(data);
 			};
@@ -201,6 +225,157 @@ export default class SocketManager
 		return false;
 	}
 
+	/**
+	 * Rebuilds the full lobby_info from a delta frame sent by the server.
+	 * Keyframes replace the local state, the other frames only carry the changed fields.
+	 * The state is never modified in place, so objects kept by the game from previous frames stay untouched.
+	 * @param {Object} data - The parsed message data.
+	 * @returns {Object|null} - The message with a full lobby_info, or null if the frame could not be applied.
+	 */
+	processLobbyDelta(data)
+	{
+		const delta = data.lobby_delta;
+		if (delta === undefined)
+			return data;
+
+		if (delta.keyframe)
+		{
+			this.lobbyState = delta.state;
+			this.keyframeRequested = false;
+		}
+		else
+		{
+			if (this.lobbyState === null || delta.base_tick !== this.lastFrameTick)
+			{
+				// A frame was missed: ask for a new keyframe and skip deltas until it arrives.
+				this.requestKeyframe();
+				return null;
+			}
+			this.lobbyState = SocketManager.applyChanges(this.lobbyState, delta.changed);
+			for (const path of delta.removed || [])
+				this.lobbyState = SocketManager.removePath(this.lobbyState, path);
+		}
+
+		this.lastFrameTick = delta.tick;
+		return { event_info: data.event_info, lobby_info: this.lobbyState };
+	}
+
+	/**
+	 * Drops the local state and asks the server for a new keyframe, once until it arrives.
+	 */
+	requestKeyframe()
+	{
+		this.lobbyState = null;
+		if (!this.keyframeRequested)
+		{
+			this.keyframeRequested = true;
+			this.send(JSON.stringify({ type: 'set_frame_format', format: this.frameFormat }));
+		}
+	}
+
+	/**
+	 * Rebuilds the full lobby_info from a binary 'game_loop' frame.
+	 * The frame only carries the moving parts of the state, the rest comes from the last keyframe.
+	 * @param {ArrayBuffer} buffer - The received frame.
+	 * @returns {Object|null} - The message with a full lobby_info, or null if the frame could not be applied.
+	 */
+	processGameFrame(buffer)
+	{
+		const frame = SocketManager.decodeGameFrame(buffer);
+		if (frame === null)
+		{
+			console.error("Unknown binary frame of", buffer.byteLength, "bytes");
+			return null;
+		}
+		if (this.lobbyState === null)
+		{
+			this.requestKeyframe();
+			return null;
+		}
+
+		const state = this.lobbyState;
+		const players = { ...state.players };
+		// Paddles are sent from left to right.
+		const playerIds = Object.keys(players).sort((a, b) => players[a].x - players[b].x).slice(0, 2);
+		playerIds.forEach((playerId, index) => {
+			players[playerId] = { ...players[playerId], y: frame.paddlesY[index], last_processed_seq: frame.lastSeqs[index] };
+		});
+
+		let scores = state.scores;
+		if (scores.player1 !== frame.scores[0] || scores.player2 !== frame.scores[1])
+			scores = { player1: frame.scores[0], player2: frame.scores[1] };
+
+		this.lobbyState = {
+			...state,
+			tick: frame.tick,
+			count_down: frame.countDown,
+			ball: { ...state.ball, ...frame.ball },
+			scores: scores,
+			players: players,
+		};
+		return { event_info: { type: 'lobby_state', event: 'game_loop' }, lobby_info: this.lobbyState };
+	}
+
+	/**
+	 * Decodes a binary 'game_loop' frame, 42 bytes little endian (see FRAME_STRUCT in pong/scripts/PongGameManager.py).
+	 * @param {ArrayBuffer} buffer - The received frame.
+	 * @returns {Object|null} - The decoded fields, or null if the buffer is not a 'game_loop' frame.
+	 */
+	static decodeGameFrame(buffer)
+	{
+		if (buffer.byteLength !== 42)
+			return null;
+
+		const view = new DataView(buffer);
+		if (view.getUint8(0) !== 1)
+			return null;
+
+		return {
+			tick: view.getUint32(1, true),
+			ball: {
+				x: view.getFloat32(5, true),
+				y: view.getFloat32(9, true),
+				speed_x: view.getFloat32(13, true),
+				speed_y: view.getFloat32(17, true),
+			},
+			paddlesY: [view.getFloat32(21, true), view.getFloat32(25, true)],
+			scores: [view.getUint16(29, true), view.getUint16(31, true)],
+			countDown: view.getUint8(33),
+			lastSeqs: [view.getUint32(34, true), view.getUint32(38, true)],
+		};
+	}
+
+	static isPlainObject(value)
+	{
+		return value !== null && typeof value === 'object' && !Array.isArray(value);
+	}
+
+	static applyChanges(target, changes)
+	{
+		const result = { ...target };
+		for (const [key, value] of Object.entries(changes))
+		{
+			if (SocketManager.isPlainObject(value) && SocketManager.isPlainObject(target[key]))
+				result[key] = SocketManager.applyChanges(target[key], value);
+			else
+				result[key] = value;
+		}
+		return result;
+	}
+
+	static removePath(target, path)
+	{
+		if (!SocketManager.isPlainObject(target) || !(path[0] in target))
+			return target;
+
+		const result = { ...target };
+		if (path.length === 1)
+			delete result[path[0]];
+		else
+			result[path[0]] = SocketManager.removePath(target[path[0]], path.slice(1));
+		return result;
+	}
+
 	/**
 	 * Starts the ping mechanism.
 	 */
@@ -221,7 +221,10 @@ export default class Game
 			if (data.players)
 			{
 				if (data.players[this.pongPlayer.playerId] != undefined)
+				{
 					this.pongPlayer.updatePosition(data.players[this.pongPlayer.playerId].y);
+					this.pongPlayer.syncWithServer(data.tick, data.players[this.pongPlayer.playerId].last_processed_seq);
+				}
 				if (data.players[this.pongOpponent.playerId] != undefined)
 					this.pongOpponent.updatePosition(data.players[this.pongOpponent.playerId].y);
 			}
@@ -1,6 +1,8 @@
 import Paddle from './Paddle.js';
 import BaseInput from '../../../common_static/js/BaseInput.js';
 
+const SERVER_TICK_RATE = 60;
+
 /**
  * Represents a Pong player, handling input and paddle synchronization.
  * @class
@@ -24,6 +26,11 @@ export default class PongPlayer {
 		this.input = null;
 		this.newY = data.y;
 
+		this.inputSeq = 0;
+		this.lastAckedSeq = 0;
+		this.serverTick = null;
+		this.serverTickReceivedAt = 0;
+
 		this.style = style;
 
 		if (this.style == "2D")
@@ -52,6 +59,35 @@ export default class PongPlayer {
 			this.paddle.mesh.position.y = newY;
 	}
 
+	/**
+	 * Stores the simulation tick of the last state received and the last input the server processed.
+	 * @param {number} tick - The server tick of the state.
+	 * @param {number} lastProcessedSeq - The sequence number of the last input applied by the server.
+	 */
+	syncWithServer(tick, lastProcessedSeq)
+	{
+		if (tick !== undefined)
+		{
+			this.serverTick = tick;
+			this.serverTickReceivedAt = performance.now();
+		}
+		if (lastProcessedSeq !== undefined)
+			this.lastAckedSeq = lastProcessedSeq;
+	}
+
+	/**
+	 * Estimates the server tick the player is reacting to: the tick of the last state shown
+	 * plus the ticks elapsed since it was received.
+	 * @returns {number|undefined} The estimated tick, or undefined before the first state.
+	 */
+	estimateServerTick()
+	{
+		if (this.serverTick === null)
+			return undefined;
+		const elapsedTicks = Math.floor((performance.now() - this.serverTickReceivedAt) * SERVER_TICK_RATE / 1000);
+		return this.serverTick + elapsedTicks;
+	}
+
 	/**
 	 * Sets up key bindings for player control and event listeners for key actions.
 	 */
@@ -99,6 +135,8 @@ export default class PongPlayer {
 						action_type: actionType,
 						key: this.controlKeys[key],
 						playerId: this.playerId,
+						seq: ++this.inputSeq,
+						tick: this.estimateServerTick(),
 					})
 				);
 			}
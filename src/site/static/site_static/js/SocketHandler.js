@@ -16,6 +16,7 @@ export default class SocketHandler {
 			console.log('🔍 Parsed socket data:', socketData);
 			const messageHandlers = {
 				'get_status_change': () => this.handleFriendStatusUpdate(socketData.friend_username, socketData.new_status),
+				'get_status_changes': () => this.handleFriendStatusUpdates(socketData.changes),
 				'get_blocked': () => this.handleUserBlocked(socketData.username),
 				'get_unblocked': () => this.handleUserUnblocked(socketData.username),
 				'get_friend_request': () => this.handleFriendRequest(socketData.username),
@@ -45,14 +46,31 @@ export default class SocketHandler {
 	}
 
 	handleFriendStatusUpdate(username, newStatus) {
+		if (this.setFriendStatus(username, newStatus)) {
+			this.friendListManager.updateFriendLists(this.socialData);
+		}
+	}
+
+	handleFriendStatusUpdates(changes) {
+		console.log(`🔄 Handling ${changes.length} status updates`);
+		let updated = false;
+		for (const change of changes) {
+			updated = this.setFriendStatus(change.friend_username, change.new_status) || updated;
+		}
+		if (updated) {
+			this.friendListManager.updateFriendLists(this.socialData);
+		}
+	}
+
+	setFriendStatus(username, newStatus) {
 		console.log(`🔄 Handling status update for ${username} to ${newStatus}`);
 		const friend = this.socialData.registeredUsers.find(user => user.username === username);
-		if (friend) {
-			friend.status = newStatus;
-			this.friendListManager.updateFriendLists(this.socialData);
-		} else {
+		if (!friend) {
 			console.warn(`⚠️ Friend not found: ${username}`);
+			return false;
 		}
+		friend.status = newStatus;
+		return true;
 	}
 
 	handleUserBlocked(username) {
@@ -252,6 +252,16 @@ const api = {
 		}
 	},
 
+	async getMatchHistory(username, cursor) {
+		try {
+			const params = new URLSearchParams({ name: username, cursor });
+			return await this.fetchJson(`/api/match_history?${params}`);
+		} catch (error) {
+			console.error('Match history error:', error);
+			return false;
+		}
+	},
+
 	async getUsers() {
 		try {
 			return await this.fetchJson('/api/users?type=simple');
@@ -1,35 +1,19 @@
-const matchHistory = {
-	getMatchDetails(match, currentUser) {
-		const isPongMatch = match.type === "Pong Match";
-		const details = match.details;
-
-		const pongWinner = isPongMatch && (
-			(details.first_user_username === currentUser && details.first_user_score > details.second_user_score) ||
-			(details.second_user_username === currentUser && details.second_user_score > details.first_user_score)
-		);
+import api from './api.js';
 
+const matchHistory = {
+	getMatchDetails(match) {
 		return {
-			isWinner: isPongMatch ? pongWinner : details.user_winner_username === currentUser,
-			otherUsers: isPongMatch ?
-			(currentUser === details.first_user_username ? details.second_user_username : details.first_user_username) :
-			[details.first_user_username, details.second_user_username, details.third_user_username, details.fourth_user_username]
-			.filter(user => user !== currentUser)
-			.join(' '),
-			mmrGain: isPongMatch ?
-			(currentUser === details.first_user_username ? details.first_user_mmr_gain : details.second_user_mmr_gain) :
-			null,
-			score: isPongMatch ?
-			(currentUser === details.first_user_username ?
-				`${details.first_user_score} - ${details.second_user_score}` :
-				`${details.second_user_score} - ${details.first_user_score}`) :
-			null,
-			duration: details.duration,
-			gameType: isPongMatch ? 'pong' : 'liarsbar'
+			isWinner: match.is_winner,
+			otherUsers: match.opponents.join(' '),
+			mmrGain: match.mmr_gain ?? 0,
+			score: match.score,
+			duration: match.duration,
+			gameType: match.game
 		};
 	},
 
 	createMatchHistoryItem(match, currentUser) {
-		const {isWinner, otherUsers, mmrGain, score, duration, gameType} = this.getMatchDetails(match, currentUser);
+		const {isWinner, otherUsers, mmrGain, score, duration, gameType} = this.getMatchDetails(match);
 		const isPongMatch = gameType === 'pong';
 
 		return `
@@ -67,13 +51,33 @@ const matchHistory = {
 		`;
 	},
 
-	renderMatchHistory(matchHistory, currentUser) {
+	renderMatchHistory(history, currentUser) {
 		const container = document.getElementById('matchHistoryContent');
-		if (!container || !matchHistory?.length || !matchHistory[0]?.all_matches) return;
+		if (!container || !history?.matches) return;
 
-		container.innerHTML = matchHistory[0].all_matches
+		container.innerHTML = history.matches
 		.map(match => this.createMatchHistoryItem(match, currentUser))
 		.join('');
+		this.addLoadMoreButton(container, history.next, currentUser);
+	},
+
+	addLoadMoreButton(container, cursor, currentUser) {
+		if (!cursor) return;
+
+		const button = document.createElement('div');
+		button.className = 'btn btn-register pixel-font w-100';
+		button.textContent = 'MORE';
+		button.addEventListener('click', async () => {
+			button.remove();
+			const page = await api.getMatchHistory(currentUser, cursor);
+			if (!page?.matches) return;
+
+			container.insertAdjacentHTML('beforeend', page.matches
+			.map(match => this.createMatchHistoryItem(match, currentUser))
+			.join(''));
+			this.addLoadMoreButton(container, page.next, currentUser);
+		});
+		container.appendChild(button);
 	}
 };
 
@@ -0,0 +1,92 @@
+import time
+import collections
+from channels_redis.core import RedisChannelLayer
+
+# The script of RedisChannelLayer.group_send, which also drops the expired messages of each channel
+# first instead of doing it in a separate pipeline. A key is given more than once when its channel
+# is in several of the groups.
+GROUP_SEND_MANY_SCRIPT = """
+local over_capacity = 0
+local current_time = ARGV[#ARGV - 1]
+local expiry = ARGV[#ARGV]
+for i=1,#KEYS do
+	redis.call('ZREMRANGEBYSCORE', KEYS[i], 0, math.floor(tonumber(current_time) - tonumber(expiry)))
+	if redis.call('ZCOUNT', KEYS[i], '-inf', '+inf') < tonumber(ARGV[i + #KEYS]) then
+		redis.call('ZADD', KEYS[i], current_time, ARGV[i])
+		redis.call('EXPIRE', KEYS[i], expiry)
+	else
+		over_capacity = over_capacity + 1
+	end
+end
+return over_capacity
+"""
+
+class BatchRedisChannelLayer(RedisChannelLayer):
+	"""
+	Redis channel layer able to send a different message to many groups at once.
+
+	group_send costs three round trips to Redis per group. group_send_many reads the members of every
+	group in one pipeline and delivers every message in one script call per Redis host, so the fan-out
+	of a presence update to hundreds of friends is two round trips.
+	"""
+
+	async def group_send_many(self, messages: list[tuple[str, dict]]):
+		"""
+		Sends each message to its group.
+
+		Args:
+			messages (list[tuple[str, dict]]): The (group name, message) pairs.
+		"""
+		if not messages:
+			return
+
+		groups_by_connection = collections.defaultdict(list)
+		for group, _ in messages:
+			assert self.valid_group_name(group), "Group name not valid"
+			groups_by_connection[self.consistent_hash(group)].append(group)
+
+		members = {}
+		min_score = int(time.time()) - self.group_expiry
+		for connection_index, groups in groups_by_connection.items():
+			pipe = self.connection(connection_index).pipeline()
+			for group in groups:
+				pipe.zremrangebyscore(self._group_key(group), min=0, max=min_score)
+				pipe.zrange(self._group_key(group), 0, -1)
+			results = await pipe.execute()
+			for group, channel_names in zip(groups, results[1::2]):
+				members[group] = [channel_name.decode("utf8") for channel_name in channel_names]
+
+		# One entry per (channel key, message): a channel in several groups gets each of their messages.
+		keys_by_connection = collections.defaultdict(list)
+		for group, message in messages:
+			connection_to_channel_keys, channel_key_to_message, channel_key_to_capacity = (
+				self._map_channel_keys_to_connection(members.get(group, []), message)
+			)
+			for connection_index, channel_keys in connection_to_channel_keys.items():
+				for channel_key in channel_keys:
+					keys_by_connection[connection_index].append(
+						(channel_key, channel_key_to_message[channel_key], channel_key_to_capacity[channel_key])
+					)
+
+		for connection_index, entries in keys_by_connection.items():
+			channel_keys = [channel_key for channel_key, _, _ in entries]
+			args = [message for _, message, _ in entries]
+			args += [capacity for _, _, capacity in entries]
+			args += [time.time(), self.expiry]
+			await self.connection(connection_index).eval(
+				GROUP_SEND_MANY_SCRIPT, len(channel_keys), *channel_keys, *args
+			)
+
+async def group_send_many(channel_layer, messages: list[tuple[str, dict]]):
+	"""
+	Sends each message to its group, in a single batch when the channel layer supports it.
+
+	Args:
+		channel_layer: The channel layer.
+		messages (list[tuple[str, dict]]): The (group name, message) pairs.
+	"""
+	if hasattr(channel_layer, "group_send_many"):
+		await channel_layer.group_send_many(messages)
+		return
+	for group, message in messages:
+		await channel_layer.group_send(group, message)
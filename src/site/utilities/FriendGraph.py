@@ -0,0 +1,110 @@
+from django.db.models import Q
+from channels.db import database_sync_to_async
+from website.models import Friendships
+
+class FriendGraph:
+	"""
+	In-memory adjacency lists of the accepted friendships of the users connected to this worker.
+
+	The friends of a user are loaded when it connects and dropped when its last connection closes.
+	In between they are kept up to date by the SocialUser methods that accept, remove, block and
+	unblock friends, so sending a presence update to the friends of a user needs no query.
+	Friendships edited outside of SocialUser (e.g. from the admin) are picked up on the next connect.
+	"""
+
+	def __init__(self):
+		self.friends: dict[int, set[int]] = {}
+		self.connections: dict[int, int] = {}
+		# Bumped on every edit of a user's friends, so a load racing with an edit is done again.
+		self.generations: dict[int, int] = {}
+
+	async def warm(self, user_id: int):
+		"""
+		Loads the friends of a user that just connected. Called on every connect, which also
+		refreshes the friends of a user that is already connected elsewhere.
+
+		Args:
+			user_id (int): The ID of the user.
+		"""
+		user_id = int(user_id)
+		self.connections[user_id] = self.connections.get(user_id, 0) + 1
+		while True:
+			generation = self.generations.get(user_id, 0)
+			friends = await self.load(user_id)
+			if self.generations.get(user_id, 0) == generation:
+				break
+		if user_id in self.connections:
+			self.friends[user_id] = friends
+
+	def release(self, user_id: int):
+		"""
+		Forgets the friends of a user once its last connection is closed.
+		"""
+		user_id = int(user_id)
+		count = self.connections.get(user_id, 0) - 1
+		if count > 0:
+			self.connections[user_id] = count
+			return
+		self.connections.pop(user_id, None)
+		self.friends.pop(user_id, None)
+		self.generations.pop(user_id, None)
+
+	async def get_friends(self, user_id: int) -> set[int]:
+		"""
+		Returns the IDs of the accepted friends of a user, from memory if the user is connected.
+
+		Args:
+			user_id (int): The ID of the user.
+
+		Returns:
+			set[int]: The IDs of its friends. Do not modify it.
+		"""
+		user_id = int(user_id)
+		friends = self.friends.get(user_id)
+		if friends is None:
+			friends = await self.load(user_id)
+		return friends
+
+	def version(self, user_id: int) -> int:
+		"""
+		Returns a number that changes whenever a friendship of a connected user is edited,
+		so data derived from its friendships can be cached until then.
+		"""
+		return self.generations.get(int(user_id), 0)
+
+	@database_sync_to_async
+	def load(self, user_id: int) -> set[int]:
+		friendships = Friendships.objects.filter(
+			Q(first_user_id=user_id) | Q(second_user_id=user_id),
+			status=Friendships.FriendshipsStatus.FRIENDS,
+		).values_list("first_user_id", "second_user_id")
+		return {
+			second_user_id if first_user_id == user_id else first_user_id
+			for first_user_id, second_user_id in friendships
+		}
+
+	def add_friendship(self, first_user_id: int, second_user_id: int):
+		"""
+		Records that two users became friends.
+		"""
+		for user_id, friend_id in ((first_user_id, second_user_id), (second_user_id, first_user_id)):
+			user_id = int(user_id)
+			if user_id not in self.connections:
+				continue
+			self.generations[user_id] = self.generations.get(user_id, 0) + 1
+			if user_id in self.friends:
+				self.friends[user_id].add(int(friend_id))
+
+	def remove_friendship(self, first_user_id: int, second_user_id: int):
+		"""
+		Records that two users are no longer friends: removed, declined or blocked.
+		"""
+		for user_id, friend_id in ((first_user_id, second_user_id), (second_user_id, first_user_id)):
+			user_id = int(user_id)
+			if user_id not in self.connections:
+				continue
+			self.generations[user_id] = self.generations.get(user_id, 0) + 1
+			if user_id in self.friends:
+				self.friends[user_id].discard(int(friend_id))
+
+friend_graph = FriendGraph()
@@ -54,6 +54,29 @@ class GameManager(ABC):
 		"""
 		return
 	
+	def pack_frame(self) -> bytes | None:
+		"""
+		Packs the moving parts of a 'game_loop' frame into a compact binary message; binary clients
+		get the rest of the state from the delta keyframes.
+		Games without a binary layout return None and their clients receive JSON frames instead.
+
+		Returns:
+			bytes | None: The packed frame, or None if the game does not support binary frames.
+		"""
+		return None
+
+	def dynamic_fields(self) -> tuple[tuple, tuple] | None:
+		"""
+		Lists the fields of to_dict that change during play, so delta frames can compare them without
+		building the whole snapshot. The other fields are only sent in keyframes.
+		Games that return None get their delta frames from a diff of the whole snapshot instead.
+
+		Returns:
+			tuple[tuple, tuple] | None: The paths of the fields in to_dict, which must stay the same object
+			while they do not change, and the current values of the fields in the same order.
+		"""
+		return None
+
 	def players_to_dict(self) -> dict[str, any]:
 		return {
 			"players": {str(player_id): player.to_dict() for player_id, player in self.players.items()},
@@ -0,0 +1,214 @@
+import io
+import time
+import random
+import pstats
+import cProfile
+from contextlib import contextmanager
+from django.conf import settings
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+# Tick phases are a fraction of the 16.7 ms budget of a 60 Hz tick.
+PHASE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.0167, 0.025, 0.05, 0.1)
+TICK_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.0167, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+PHASE_SIMULATE = "simulate"
+PHASE_SERIALIZE = "serialize"
+PHASE_BROADCAST = "broadcast"
+
+class RoomProfile:
+	"""
+	cProfile statistics collected on a sample of the ticks of one room.
+	"""
+
+	def __init__(self, sample_rate: float):
+		"""
+		Args:
+			sample_rate (float): The share of the ticks that are profiled, between 0 and 1.
+		"""
+		self.sample_rate = sample_rate
+		self.samples = 0
+		self.stats = None
+
+	def add(self, profiler: cProfile.Profile):
+		self.samples += 1
+		if self.stats is None:
+			self.stats = pstats.Stats(profiler)
+		else:
+			self.stats.add(profiler)
+
+	def report(self, limit: int = 30) -> str:
+		"""
+		Returns the most expensive functions of the sampled ticks, sorted by cumulative time.
+		"""
+		if self.stats is None:
+			return "No tick sampled yet."
+		output = io.StringIO()
+		self.stats.stream = output
+		self.stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+		return f"{self.samples} ticks sampled\n{output.getvalue()}"
+
+class GameMetrics:
+	"""
+	Prometheus metrics of the game loops run by the tick scheduler.
+
+	The tick time of every match is split into the simulate, serialize and broadcast phases.
+	Rooms can also be profiled with cProfile on a sample of their ticks, to see where the time goes
+	inside a phase without paying the profiler overhead on every room.
+	"""
+
+	def __init__(self):
+		self.phase_duration = Histogram(
+			"game_tick_phase_seconds",
+			"Time spent by a match in each phase of a tick.",
+			["game", "phase"],
+			buckets=PHASE_BUCKETS,
+		)
+		self.tick_duration = Histogram(
+			"game_tick_seconds",
+			"Time taken by the tick scheduler to step every match once.",
+			buckets=TICK_BUCKETS,
+		)
+		self.active_matches = Gauge(
+			"game_active_matches",
+			"Number of lobbies and tournaments held by a match manager.",
+			["game", "match_type"],
+		)
+		self.ticking_matches = Gauge(
+			"game_ticking_matches",
+			"Number of matches registered in the tick scheduler.",
+		)
+		self.tick_overruns = Counter(
+			"game_tick_overruns_total",
+			"Ticks that took longer than the tick interval.",
+		)
+		self.skipped_steps = Counter(
+			"game_tick_skipped_steps_total",
+			"Simulation steps dropped because the scheduler was too far behind to catch up.",
+		)
+		self.dropped_broadcasts = Counter(
+			"game_broadcasts_dropped_total",
+			"States that were never broadcast: coalesced by a catch-up tick, or lost to a channel layer error.",
+			["game", "reason"],
+		)
+		self.pending_results = Gauge(
+			"game_results_pending",
+			"Finished match results waiting to be written to the database.",
+		)
+		self.result_write_duration = Histogram(
+			"game_result_write_seconds",
+			"Time taken to write one finished match result.",
+			["game"],
+			buckets=TICK_BUCKETS,
+		)
+		self.failed_results = Counter(
+			"game_results_failed_total",
+			"Finished match results dropped after every write attempt failed.",
+			["game"],
+		)
+		self.phase_children = {}
+		self.profiled_rooms: dict[str, RoomProfile] = {}
+		self.active_profiler = None
+
+	def observe_phase(self, game_name: str, phase: str, seconds: float):
+		"""
+		Records the time a match spent in a phase of the tick.
+
+		Args:
+			game_name (str): The game the match belongs to.
+			phase (str): One of PHASE_SIMULATE, PHASE_SERIALIZE and PHASE_BROADCAST.
+			seconds (float): The time spent.
+		"""
+		key = (game_name, phase)
+		child = self.phase_children.get(key)
+		if child is None:
+			child = self.phase_children[key] = self.phase_duration.labels(game_name, phase)
+		child.observe(seconds)
+
+	@contextmanager
+	def time_phase(self, game_name: str, phase: str):
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.observe_phase(game_name, phase, time.perf_counter() - start)
+
+	def broadcast_dropped(self, game_name: str, reason: str, count: int = 1):
+		self.dropped_broadcasts.labels(game_name, reason).inc(count)
+
+	def track_match_manager(self, match_manager):
+		"""
+		Exposes the number of lobbies and tournaments of a match manager, computed when Prometheus scrapes.
+
+		Args:
+			match_manager (MatchManager): The match manager, labelled with its namespace.
+		"""
+		for match_type in ("lobby", "tournament"):
+			self.active_matches.labels(match_manager.namespace, match_type).set_function(
+				lambda match_type=match_type: sum(
+					1 for match in list(match_manager.matches.values())
+					if type(match).__name__.lower() == match_type
+				)
+			)
+
+	def enable_profiling(self, room_group_name: str, sample_rate: float = 0.01):
+		"""
+		Starts profiling a sample of the ticks of a room. Statistics collected so far are kept.
+
+		Args:
+			room_group_name (str): The group name of the room.
+			sample_rate (float): The share of the ticks that are profiled, between 0 and 1.
+		"""
+		sample_rate = min(1.0, max(0.0, float(sample_rate)))
+		profile = self.profiled_rooms.get(room_group_name)
+		if profile:
+			profile.sample_rate = sample_rate
+		else:
+			self.profiled_rooms[room_group_name] = RoomProfile(sample_rate)
+
+	def disable_profiling(self, room_group_name: str) -> str:
+		"""
+		Stops profiling a room.
+
+		Returns:
+			str: The report of the ticks sampled while profiling was on.
+		"""
+		profile = self.profiled_rooms.pop(room_group_name, None)
+		return profile.report() if profile else "Room is not profiled."
+
+	def profile_report(self, room_group_name: str, limit: int = 30) -> str:
+		profile = self.profiled_rooms.get(room_group_name)
+		return profile.report(limit) if profile else "Room is not profiled."
+
+	@contextmanager
+	def profile(self, room_group_name: str):
+		"""
+		Profiles the enclosed code if the room is profiled and this tick is sampled.
+
+		Only one profiler runs at a time: the matches of a tick are stepped concurrently, so a
+		sample may also include the steps of other rooms that ran while this one was awaiting.
+		"""
+		profile = self.profiled_rooms.get(room_group_name)
+		if profile is None or self.active_profiler is not None or random.random() >= profile.sample_rate:
+			yield
+			return
+
+		profiler = self.active_profiler = cProfile.Profile()
+		profiler.enable()
+		try:
+			yield
+		finally:
+			profiler.disable()
+			self.active_profiler = None
+			profile.add(profiler)
+
+def start_metrics_server():
+	"""
+	Serves the game metrics on GAME_METRICS_PORT. The game loops run in the websocket server,
+	which is not the process serving the django_prometheus /metrics endpoint.
+	"""
+	port = getattr(settings, "GAME_METRICS_PORT", 0)
+	if port:
+		start_http_server(port)
+		print(f"Game metrics served on port {port}.")
+
+game_metrics = GameMetrics()
@@ -1,53 +1,172 @@
+import asyncio
+import inspect
+from typing import Callable
+from django.conf import settings
+from channels.layers import get_channel_layer
 from utilities.lobby import Lobby
 from utilities.Tournament import Tournament
 from utilities.GameManager import GameManager
+from utilities.SnapshotStream import FRAME_FORMATS
+from utilities.MatchRegistry import create_match_registry
+from utilities.GameMetrics import game_metrics
+
+CALL_TIMEOUT = 5
+
+# The match managers of this process, whose worker listeners are started with the server.
+match_managers: list["MatchManager"] = []
+
+# Methods of a match (or of its game manager) another worker is allowed to call on the owner.
+REMOTE_CALLS = {
+	"to_dict",
+	"len_player",
+	"start_game",
+	"force_player_ready",
+	"mark_player_ready",
+	"add_player_to_lobby",
+	"game_manager.update_player",
+	"set_profiling",
+	"profile_report",
+}
 
 
 class MatchManager:
 	"""
 	Manages a collection of game sessions (lobbies and tournaments).
 	Allows for the creation, retrieval, and removal of matches.
+
+	When the MATCH_REGISTRY setting is set, every room is recorded in a registry shared by all the
+	worker processes together with the worker owning it. A worker asked for a room owned by another
+	worker gets a RemoteMatch, which forwards the events and calls to the owner through the channel layer.
 	"""
-	
-	def __init__(self):
+
+	def __init__(self, namespace: str, create_game_manager: Callable[..., GameManager]):
+		"""
+		Initializes an empty match manager.
+
+		Args:
+			namespace (str): The name of the game, used to separate the rooms of each game in the registry.
+			create_game_manager (Callable[..., GameManager]): Builds the game manager of a new room.
+		"""
 		self.matches = {}
-	
+		self.namespace = namespace
+		self.create_game_manager = create_game_manager
+		self.distributed = bool(getattr(settings, "MATCH_REGISTRY", None))
+		self.registry = create_match_registry()
+		self.owned_rooms: dict[str, dict] = {}
+		self.channel_layer = get_channel_layer()
+		self.worker_channel = None
+		self.worker_start = None
+		self.worker_tasks = set()
+		game_metrics.track_match_manager(self)
+		match_managers.append(self)
+
+	@property
+	def shared_channel(self) -> str:
+		"""The channel read by every worker, used to create rooms from processes that do not own any."""
+		return f"{self.namespace}.match.workers"
+
 	def create_match(self, game_name: str, room_name: str, game_manager: GameManager, match_type: str):
 		"""
 		Creates a new match (Lobby or Tournament) with the given parameters.
-		
+
 		Args:
 			game_name (str): The name of the game.
 			room_name (str): The name of the room.
 			game_manager (GameManager): The game manager instance.
 			match_type (str): The type of match ('tournament' or 'lobby').
-		
+
 		Returns:
 			Lobby or Tournament: The created match instance.
 		"""
 		if room_name in self.matches:
 			return self.matches[room_name]
-		
+
 		match = Tournament(game_name, room_name, game_manager) if match_type == "tournament" else Lobby(game_name, room_name, game_manager)
 		self.matches[room_name] = match
 		return match
-	
+
+	async def open_match(self, game_name: str, room_name: str, match_type: str, *game_manager_args):
+		"""
+		Returns the match of a room, creating it on this worker if no worker owns it yet.
+
+		Args:
+			game_name (str): The name of the game.
+			room_name (str): The name of the room.
+			match_type (str): The type of match ('tournament' or 'lobby').
+			*game_manager_args: The arguments given to create_game_manager if the room is created.
+
+		Returns:
+			Lobby or Tournament or RemoteMatch: The local match, or a proxy to the worker owning it.
+		"""
+		if room_name in self.matches:
+			return self.matches[room_name]
+
+		if self.distributed:
+			await self.start_worker()
+			entry = {"owner": self.worker_channel, "game_name": game_name, "match_type": match_type}
+			owner_entry = await self.registry.claim(self.namespace, room_name, entry)
+			if owner_entry["owner"] != self.worker_channel:
+				return RemoteMatch(self, room_name, owner_entry)
+			self.owned_rooms[room_name] = entry
+
+		return self.create_match(game_name, room_name, self.create_game_manager(*game_manager_args), match_type)
+
+	async def open_match_on_worker(self, game_name: str, room_name: str, match_type: str, *game_manager_args):
+		"""
+		Creates a room on one of the websocket workers. Used by the HTTP views, which may run in
+		a process that does not serve the websockets and cannot keep a game running.
+
+		Returns:
+			Lobby or Tournament or RemoteMatch: The created match, or a proxy to the worker that created it.
+
+		Raises:
+			TimeoutError: If no websocket worker replied within CALL_TIMEOUT seconds.
+		"""
+		if not self.distributed:
+			return await self.open_match(game_name, room_name, match_type, *game_manager_args)
+
+		entry = await self.request(self.shared_channel, {
+			"type": "match.create",
+			"game_name": game_name,
+			"room_name": room_name,
+			"match_type": match_type,
+			"args": list(game_manager_args),
+		})
+		return self.matches.get(room_name) or RemoteMatch(self, room_name, entry)
+
 	def get_match(self, room_name: str):
 		"""
 		Retrieves a match by room name.
-		
+
 		Args:
 			room_name (str): The name of the room.
-		
+
 		Returns:
 			Lobby or Tournament or None: The match instance if found, else None.
 		"""
 		return self.matches.get(room_name, None)
-	
+
+	async def find_match(self, room_name: str):
+		"""
+		Retrieves a match by room name, looking it up in the registry when it is not owned by this worker.
+
+		Args:
+			room_name (str): The name of the room.
+
+		Returns:
+			Lobby or Tournament or RemoteMatch or None: The match if found, else None.
+		"""
+		match = self.matches.get(room_name)
+		if match or not self.distributed:
+			return match
+
+		entry = await self.registry.lookup(self.namespace, room_name)
+		return RemoteMatch(self, room_name, entry) if entry else None
+
 	def remove_match(self, room_name: str):
 		"""
 		Removes the match associated with the given room name.
-		
+
 		Args:
 			room_name (str): The name of the match room to remove.
 		"""
@@ -56,3 +175,226 @@ class MatchManager:
 			del self.matches[room_name]
 		else:
 			print(f"Room '{room_name}' not found.")
+
+		entry = self.owned_rooms.pop(room_name, None)
+		if entry:
+			self.run_in_background(self.registry.release(self.namespace, room_name, entry))
+
+	async def call(self, match, method: str, *args):
+		"""
+		Calls one of the REMOTE_CALLS methods on a local match or on the worker owning a RemoteMatch.
+
+		Args:
+			match (Lobby or Tournament or RemoteMatch): The match.
+			method (str): The method name, possibly prefixed with 'game_manager.'.
+			*args: The arguments of the method.
+
+		Returns:
+			The value returned by the method.
+		"""
+		if isinstance(match, RemoteMatch):
+			return await match.call(method, *args)
+		if method not in REMOTE_CALLS:
+			raise ValueError(f"Method not allowed: {method}")
+
+		target = match
+		for name in method.split("."):
+			target = getattr(target, name)
+		result = target(*args)
+		return await result if inspect.isawaitable(result) else result
+
+	async def request(self, channel: str, message: dict) -> dict:
+		"""
+		Sends a message to a worker and waits for its reply.
+
+		Raises:
+			TimeoutError: If the worker does not reply within CALL_TIMEOUT seconds.
+			RuntimeError: If the worker replied with an error.
+		"""
+		reply_channel = await self.channel_layer.new_channel()
+		await self.channel_layer.send(channel, {**message, "reply_channel": reply_channel})
+		reply = await asyncio.wait_for(self.channel_layer.receive(reply_channel), CALL_TIMEOUT)
+		if reply.get("error"):
+			raise RuntimeError(reply["error"])
+		return reply.get("result")
+
+	def run_in_background(self, coroutine):
+		task = asyncio.create_task(coroutine)
+		self.worker_tasks.add(task)
+		task.add_done_callback(self.worker_tasks.discard)
+
+	async def start_worker(self):
+		"""
+		Starts listening on this worker's channel and on the shared channel, and keeps the
+		registry entries of the owned rooms alive. Called by start_match_workers when the server starts,
+		and again by open_match, which then waits for the first call to finish.
+		"""
+		if self.worker_start is None:
+			self.worker_start = asyncio.ensure_future(self.run_worker())
+		await asyncio.shield(self.worker_start)
+
+	async def run_worker(self):
+		try:
+			worker_channel = await self.channel_layer.new_channel(f"{self.namespace}.match.")
+		except Exception:
+			# Tried again by the next call to start_worker.
+			self.worker_start = None
+			raise
+		self.worker_channel = worker_channel
+		self.run_in_background(self.listen(self.worker_channel))
+		self.run_in_background(self.listen(self.shared_channel))
+		self.run_in_background(self.refresh_owned_rooms())
+
+	async def listen(self, channel: str):
+		while True:
+			message = await self.channel_layer.receive(channel)
+			try:
+				await self.handle_worker_message(message)
+			except Exception as e:
+				print(f"Error while handling {message.get('type')} for room {message.get('room_name')}: {e}")
+
+	async def refresh_owned_rooms(self):
+		interval = getattr(self.registry, "ttl", 30) / 3
+		while True:
+			await asyncio.sleep(interval)
+			try:
+				await self.registry.refresh(self.namespace, self.owned_rooms)
+			except Exception as e:
+				print(f"Error while refreshing the match registry: {e}")
+
+	async def handle_worker_message(self, message: dict):
+		"""
+		Handles a message sent by a RemoteMatch of another worker, or a room creation request.
+		"""
+		message_type = message.get("type")
+		room_name = message.get("room_name")
+		reply = {}
+
+		if message_type == "match.create":
+			match = await self.open_match(message["game_name"], room_name, message["match_type"], *message.get("args", []))
+			if isinstance(match, RemoteMatch):
+				reply["result"] = match.entry
+			else:
+				reply["result"] = self.owned_rooms.get(room_name)
+		else:
+			match = self.matches.get(room_name)
+			if match is None:
+				reply["error"] = f"Room '{room_name}' not found."
+			else:
+				match message_type:
+					case "match.event":
+						await match.manage_event(message["data"], self)
+					case "match.broadcast":
+						await match.broadcast_message(message["message"])
+					case "match.subscribe":
+						match.snapshot_stream.subscribe(message["channel_name"], message["frame_format"])
+					case "match.unsubscribe":
+						match.snapshot_stream.unsubscribe(message["channel_name"])
+					case "match.call":
+						try:
+							reply["result"] = await self.call(match, message["method"], *message.get("args", []))
+						except Exception as e:
+							reply["error"] = str(e)
+					case _:
+						print(f"Unhandled match message type: {message_type}")
+
+		if message.get("reply_channel"):
+			await self.channel_layer.send(message["reply_channel"], {"type": "match.reply", **reply})
+
+
+class RemoteSnapshotStream:
+	"""
+	Stands for the snapshot stream of a match owned by another worker: subscriptions are forwarded to the owner.
+	"""
+
+	def __init__(self, match: "RemoteMatch"):
+		self.match = match
+
+	def subscribe(self, channel_name: str, frame_format: str):
+		if frame_format not in FRAME_FORMATS:
+			raise ValueError(f"Unsupported frame format: {frame_format}")
+		self.match.match_manager.run_in_background(self.match.send({
+			"type": "match.subscribe",
+			"channel_name": channel_name,
+			"frame_format": frame_format,
+		}))
+
+	def unsubscribe(self, channel_name: str):
+		self.match.match_manager.run_in_background(self.match.send({
+			"type": "match.unsubscribe",
+			"channel_name": channel_name,
+		}))
+
+
+class RemoteMatch:
+	"""
+	Proxy to a lobby or tournament owned by another worker.
+
+	The consumers use it like a local match: they join its group, which spans every worker,
+	and their events and calls are forwarded to the owner.
+	"""
+
+	def __init__(self, match_manager: MatchManager, room_name: str, entry: dict):
+		"""
+		Args:
+			match_manager (MatchManager): The match manager of this worker.
+			room_name (str): The name of the room.
+			entry (dict): The registry entry of the room: the owner channel, the game name and the match type.
+		"""
+		kind = "tournament" if entry["match_type"] == "tournament" else "lobby"
+		self.match_manager = match_manager
+		self.room_name = room_name
+		self.entry = entry
+		self.owner = entry["owner"]
+		self.room_group_name = f"{entry['game_name']}_{kind}_{room_name}"
+		self.snapshot_stream = RemoteSnapshotStream(self)
+
+	async def send(self, message: dict):
+		await self.match_manager.channel_layer.send(self.owner, {**message, "room_name": self.room_name})
+
+	async def call(self, method: str, *args):
+		return await self.match_manager.request(self.owner, {
+			"type": "match.call",
+			"room_name": self.room_name,
+			"method": method,
+			"args": list(args),
+		})
+
+	async def broadcast_message(self, message: dict):
+		"""
+		Broadcasts through the owner, which adds the snapshot of the match to state events.
+		"""
+		await self.send({"type": "match.broadcast", "message": message})
+
+	async def manage_event(self, data: dict, match_manager):
+		await self.send({"type": "match.event", "data": data})
+
+	async def add_player_to_lobby(self, data: dict, is_bot: bool):
+		await self.call("add_player_to_lobby", data, is_bot)
+
+	async def mark_player_ready(self, data: dict):
+		await self.call("mark_player_ready", data)
+
+	async def force_player_ready(self):
+		await self.call("force_player_ready")
+
+	async def start_game(self):
+		await self.call("start_game")
+
+	def to_dict(self) -> dict:
+		"""
+		The state of a remote match is only known through the snapshots its owner adds to every state event,
+		including those broadcast from this worker. Use `await call("to_dict")` to read it otherwise.
+		"""
+		return {}
+
+
+def start_match_workers():
+	"""
+	Starts the worker listeners of the distributed match managers of this process, so it can create
+	the rooms requested by the HTTP views before any of its websockets opened one.
+	Must be called from the running event loop of the websocket server.
+	"""
+	for match_manager in match_managers:
+		if match_manager.distributed:
+			match_manager.run_in_background(match_manager.start_worker())
@@ -0,0 +1,131 @@
+import json
+import weakref
+import asyncio
+from django.conf import settings
+
+REGISTRY_TTL = 30
+
+# Deletes or refreshes a room key only if it is still owned by the caller.
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+	return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+REFRESH_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+	return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+class LocalMatchRegistry:
+	"""
+	In-process room registry, used when a single worker serves every websocket (DEBUG).
+	"""
+
+	def __init__(self):
+		self.rooms: dict[str, dict] = {}
+
+	async def claim(self, namespace: str, room_name: str, entry: dict) -> dict:
+		"""
+		Records `entry` as the owner of the room unless the room already has one.
+
+		Args:
+			namespace (str): The game the room belongs to.
+			room_name (str): The name of the room.
+			entry (dict): The owner worker channel, the game name and the match type.
+
+		Returns:
+			dict: The entry of the owner of the room, which is `entry` if the claim succeeded.
+		"""
+		return self.rooms.setdefault(f"{namespace}:{room_name}", entry)
+
+	async def lookup(self, namespace: str, room_name: str) -> dict | None:
+		return self.rooms.get(f"{namespace}:{room_name}")
+
+	async def release(self, namespace: str, room_name: str, entry: dict):
+		key = f"{namespace}:{room_name}"
+		if self.rooms.get(key) == entry:
+			del self.rooms[key]
+
+	async def refresh(self, namespace: str, entries: dict[str, dict]):
+		return
+
+class RedisMatchRegistry:
+	"""
+	Room registry stored in Redis, shared by every worker process.
+
+	Each room is a key holding its owner entry, written with SET NX so only one worker can own
+	a room. The key expires after `ttl` seconds unless the owner keeps refreshing it, so the
+	rooms of a crashed worker can be claimed again.
+	"""
+
+	def __init__(self, host: str, port: int, ttl: int = REGISTRY_TTL):
+		"""
+		Initializes the registry. Connections are opened lazily, one pool per event loop.
+
+		Args:
+			host (str): The Redis host.
+			port (int): The Redis port.
+			ttl (int): The number of seconds a room is kept without being refreshed by its owner.
+		"""
+		self.host = host
+		self.port = port
+		self.ttl = ttl
+		self.clients = weakref.WeakKeyDictionary()
+
+	def get_client(self):
+		import redis.asyncio as redis
+
+		loop = asyncio.get_running_loop()
+		if loop not in self.clients:
+			self.clients[loop] = redis.Redis(host=self.host, port=self.port, decode_responses=True)
+		return self.clients[loop]
+
+	def key(self, namespace: str, room_name: str) -> str:
+		return f"match_registry:{namespace}:{room_name}"
+
+	async def claim(self, namespace: str, room_name: str, entry: dict) -> dict:
+		client = self.get_client()
+		key = self.key(namespace, room_name)
+		value = json.dumps(entry)
+		if await client.set(key, value, nx=True, ex=self.ttl):
+			return entry
+		current = await client.get(key)
+		if current is None:
+			# The owner released the room in between: try once more.
+			return entry if await client.set(key, value, nx=True, ex=self.ttl) else await self.lookup(namespace, room_name)
+		return json.loads(current)
+
+	async def lookup(self, namespace: str, room_name: str) -> dict | None:
+		value = await self.get_client().get(self.key(namespace, room_name))
+		return json.loads(value) if value else None
+
+	async def release(self, namespace: str, room_name: str, entry: dict):
+		await self.get_client().eval(RELEASE_SCRIPT, 1, self.key(namespace, room_name), json.dumps(entry))
+
+	async def refresh(self, namespace: str, entries: dict[str, dict]):
+		"""
+		Extends the expiry of the rooms owned by this worker.
+
+		Args:
+			namespace (str): The game the rooms belong to.
+			entries (dict[str, dict]): The owner entries of the rooms, keyed by room name.
+		"""
+		if not entries:
+			return
+		async with self.get_client().pipeline(transaction=False) as pipe:
+			for room_name, entry in entries.items():
+				pipe.eval(REFRESH_SCRIPT, 1, self.key(namespace, room_name), json.dumps(entry), self.ttl)
+			await pipe.execute()
+
+def create_match_registry():
+	"""
+	Returns the registry configured by the MATCH_REGISTRY setting: Redis when hosts are given, in-process otherwise.
+	"""
+	config = getattr(settings, "MATCH_REGISTRY", None)
+	if not config:
+		return LocalMatchRegistry()
+	host, port = config["hosts"][0]
+	return RedisMatchRegistry(host, port, config.get("ttl", REGISTRY_TTL))
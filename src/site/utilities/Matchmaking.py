@@ -0,0 +1,431 @@
+import json
+import time
+import uuid
+import weakref
+import asyncio
+import collections
+from django.conf import settings
+from channels.layers import get_channel_layer
+from utilities.MatchmakingQueue import MatchmakingQueue, QueuedPlayer
+
+# Seconds between two runs of the matcher.
+MATCH_INTERVAL = 1
+# A matcher keeps the leadership of a queue this long without renewing it.
+LEADER_TTL = 5
+# Entries whose worker has not refreshed them for this long belong to a dead worker.
+STALE_AFTER = 15
+# Joins and leaves kept for the leader. A leader further behind reloads the whole queue.
+MAX_CHANGES = 10000
+
+# Removes the given players (ARGV[2..]) from the queue only if all of them are still queued,
+# so two matchers can never hand the same player to two matches, and logs their leaves.
+CLAIM_SCRIPT = """
+local members = {unpack(ARGV, 2)}
+for _, member in ipairs(members) do
+	if not redis.call('ZSCORE', KEYS[1], member) then
+		return 0
+	end
+end
+for _, key in ipairs({KEYS[1], KEYS[2], KEYS[3]}) do
+	redis.call('ZREM', key, unpack(members))
+end
+redis.call('HDEL', KEYS[4], unpack(members))
+for _, member in ipairs(members) do
+	redis.call('RPUSH', KEYS[5], cjson.encode({'leave', member}))
+end
+redis.call('INCRBY', KEYS[6], #members)
+redis.call('LTRIM', KEYS[5], -tonumber(ARGV[1]), -1)
+return 1
+"""
+# Returns the number of changes ever logged and the changes logged after the cursor (ARGV[1]),
+# or nil if some of them were already trimmed.
+CHANGES_SCRIPT = """
+local seq = tonumber(redis.call('GET', KEYS[2]) or '0')
+local cursor = tonumber(ARGV[1])
+local first = seq - redis.call('LLEN', KEYS[1])
+if cursor < first or cursor > seq then
+	return nil
+end
+return {seq, redis.call('LRANGE', KEYS[1], cursor - first, -1)}
+"""
+# Takes the leadership of a queue, or renews it if the caller already holds it.
+LEAD_SCRIPT = """
+local leader = redis.call('GET', KEYS[1])
+if leader == false or leader == ARGV[1] then
+	redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+	return 1
+end
+return 0
+"""
+RESIGN_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+	return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+class QueueEntry:
+	"""
+	A waiting player, as stored by a matchmaking store.
+	"""
+
+	def __init__(self, channel_name: str, user_id: int, mmr: int, join_time: float):
+		self.channel_name = channel_name
+		self.user_id = user_id
+		self.mmr = mmr
+		self.join_time = join_time
+
+class LocalMatchmakingStore:
+	"""
+	In-process matchmaking queues, used when a single worker serves every websocket (DEBUG).
+	"""
+
+	def __init__(self):
+		self.queues: dict[str, dict[str, QueueEntry]] = {}
+		self.changes: dict[str, collections.deque] = {}
+		self.seqs: dict[str, int] = {}
+
+	def log(self, queue_name: str, change: list):
+		self.changes.setdefault(queue_name, collections.deque(maxlen=MAX_CHANGES)).append(change)
+		self.seqs[queue_name] = self.seqs.get(queue_name, 0) + 1
+
+	async def join(self, queue_name: str, entry: QueueEntry) -> bool:
+		"""
+		Adds a player to a queue.
+
+		Returns:
+			bool: False if the player was already queued.
+		"""
+		queue = self.queues.setdefault(queue_name, {})
+		if entry.channel_name in queue:
+			return False
+		queue[entry.channel_name] = entry
+		self.log(queue_name, ["join", entry.channel_name, entry.user_id, entry.mmr, entry.join_time])
+		return True
+
+	async def leave(self, queue_name: str, channel_name: str):
+		if self.queues.get(queue_name, {}).pop(channel_name, None):
+			self.log(queue_name, ["leave", channel_name])
+
+	async def drop_stale(self, queue_name: str):
+		return
+
+	async def snapshot(self, queue_name: str) -> tuple[int, list[QueueEntry]]:
+		"""
+		Returns the number of changes logged so far and the players of a queue, longest waiting first.
+		"""
+		return self.seqs.get(queue_name, 0), list(self.queues.get(queue_name, {}).values())
+
+	async def get_changes(self, queue_name: str, cursor: int) -> tuple[int, list[list]] | None:
+		"""
+		Returns the joins and leaves logged since a snapshot or a previous call.
+
+		Args:
+			queue_name (str): The name of the queue.
+			cursor (int): The number of changes already applied, as returned with the last snapshot or changes.
+
+		Returns:
+			tuple[int, list[list]] | None: The new cursor and the changes, ['join', channel name, user ID, MMR, join time]
+			or ['leave', channel name], or None if some of them were already dropped from the log.
+		"""
+		seq = self.seqs.get(queue_name, 0)
+		changes = self.changes.get(queue_name, ())
+		first = seq - len(changes)
+		if cursor < first or cursor > seq:
+			return None
+		return seq, list(changes)[cursor - first:]
+
+	async def claim(self, queue_name: str, channel_names: list[str]) -> bool:
+		"""
+		Removes the given players from the queue if all of them are still queued.
+
+		Returns:
+			bool: True if the players were claimed for a match.
+		"""
+		queue = self.queues.get(queue_name, {})
+		if not all(channel_name in queue for channel_name in channel_names):
+			return False
+		for channel_name in channel_names:
+			del queue[channel_name]
+			self.log(queue_name, ["leave", channel_name])
+		return True
+
+	async def refresh(self, queue_name: str, channel_names: list[str]):
+		return
+
+	async def lead(self, queue_name: str, worker_id: str) -> bool:
+		return True
+
+	async def resign(self, queue_name: str, worker_id: str):
+		return
+
+class RedisMatchmakingStore:
+	"""
+	Matchmaking queues stored in Redis, shared by every worker process.
+
+	A queue is a sorted set of channel names scored by MMR, a sorted set scored by join time,
+	a sorted set scored by the last time the owning worker vouched for the entry, and a hash
+	holding the user IDs. Players are only ever removed for a match through CLAIM_SCRIPT.
+	Every join and leave is also appended to a capped list, counted by a sequence number, so the
+	leader can keep its copy of the queue up to date without reading the whole queue each pass.
+	"""
+
+	def __init__(self, host: str, port: int):
+		"""
+		Initializes the store. Connections are opened lazily, one pool per event loop.
+
+		Args:
+			host (str): The Redis host.
+			port (int): The Redis port.
+		"""
+		self.host = host
+		self.port = port
+		self.clients = weakref.WeakKeyDictionary()
+
+	def get_client(self):
+		import redis.asyncio as redis
+
+		loop = asyncio.get_running_loop()
+		if loop not in self.clients:
+			self.clients[loop] = redis.Redis(host=self.host, port=self.port, decode_responses=True)
+		return self.clients[loop]
+
+	def keys(self, queue_name: str) -> list[str]:
+		prefix = f"matchmaking:{queue_name}"
+		return [f"{prefix}:mmr", f"{prefix}:joined", f"{prefix}:seen", f"{prefix}:users", f"{prefix}:changes", f"{prefix}:seq"]
+
+	def log(self, pipe, changes_key: str, seq_key: str, change: list):
+		pipe.rpush(changes_key, json.dumps(change))
+		pipe.incr(seq_key)
+		pipe.ltrim(changes_key, -MAX_CHANGES, -1)
+
+	async def join(self, queue_name: str, entry: QueueEntry) -> bool:
+		mmr_key, joined_key, seen_key, users_key, changes_key, seq_key = self.keys(queue_name)
+		async with self.get_client().pipeline(transaction=True) as pipe:
+			pipe.zadd(mmr_key, {entry.channel_name: entry.mmr}, nx=True)
+			pipe.zadd(joined_key, {entry.channel_name: entry.join_time}, nx=True)
+			pipe.zadd(seen_key, {entry.channel_name: entry.join_time})
+			pipe.hset(users_key, entry.channel_name, json.dumps(entry.user_id))
+			# Logged even when already queued: the leader ignores the joins of players it already has.
+			self.log(pipe, changes_key, seq_key, ["join", entry.channel_name, entry.user_id, entry.mmr, entry.join_time])
+			added, *_ = await pipe.execute()
+		return bool(added)
+
+	async def leave(self, queue_name: str, channel_name: str):
+		mmr_key, joined_key, seen_key, users_key, changes_key, seq_key = self.keys(queue_name)
+		async with self.get_client().pipeline(transaction=True) as pipe:
+			for key in (mmr_key, joined_key, seen_key):
+				pipe.zrem(key, channel_name)
+			pipe.hdel(users_key, channel_name)
+			self.log(pipe, changes_key, seq_key, ["leave", channel_name])
+			await pipe.execute()
+
+	async def drop_stale(self, queue_name: str):
+		"""
+		Removes the entries of dead workers.
+		"""
+		seen_key = self.keys(queue_name)[2]
+		for channel_name in await self.get_client().zrangebyscore(seen_key, "-inf", time.time() - STALE_AFTER):
+			await self.leave(queue_name, channel_name)
+
+	async def snapshot(self, queue_name: str) -> tuple[int, list[QueueEntry]]:
+		mmr_key, joined_key, seen_key, users_key, changes_key, seq_key = self.keys(queue_name)
+		async with self.get_client().pipeline(transaction=True) as pipe:
+			pipe.zrange(joined_key, 0, -1, withscores=True)
+			pipe.zrange(mmr_key, 0, -1, withscores=True)
+			pipe.hgetall(users_key)
+			pipe.get(seq_key)
+			joined, mmrs, users, seq = await pipe.execute()
+
+		mmrs = dict(mmrs)
+		return int(seq or 0), [
+			QueueEntry(channel_name, json.loads(users[channel_name]), int(mmrs[channel_name]), join_time)
+			for channel_name, join_time in joined
+			if channel_name in mmrs and channel_name in users
+		]
+
+	async def get_changes(self, queue_name: str, cursor: int) -> tuple[int, list[list]] | None:
+		result = await self.get_client().eval(CHANGES_SCRIPT, 2, *self.keys(queue_name)[4:], cursor)
+		if result is None:
+			return None
+		seq, changes = result
+		return int(seq), [json.loads(change) for change in changes]
+
+	async def claim(self, queue_name: str, channel_names: list[str]) -> bool:
+		return bool(await self.get_client().eval(CLAIM_SCRIPT, 6, *self.keys(queue_name), MAX_CHANGES, *channel_names))
+
+	async def refresh(self, queue_name: str, channel_names: list[str]):
+		"""
+		Marks the entries of the players connected to this worker as alive.
+		"""
+		if channel_names:
+			now = time.time()
+			await self.get_client().zadd(self.keys(queue_name)[2], {channel_name: now for channel_name in channel_names}, xx=True)
+
+	async def lead(self, queue_name: str, worker_id: str) -> bool:
+		"""
+		Takes or renews the leadership of a queue. Only the leader runs the matcher.
+
+		Returns:
+			bool: True if this worker leads the queue for the next LEADER_TTL seconds.
+		"""
+		return bool(await self.get_client().eval(LEAD_SCRIPT, 1, f"matchmaking:{queue_name}:leader", worker_id, LEADER_TTL))
+
+	async def resign(self, queue_name: str, worker_id: str):
+		await self.get_client().eval(RESIGN_SCRIPT, 1, f"matchmaking:{queue_name}:leader", worker_id)
+
+def create_matchmaking_store():
+	"""
+	Returns the store configured by the MATCHMAKING setting: Redis when hosts are given, in-process otherwise.
+	"""
+	config = getattr(settings, "MATCHMAKING", None)
+	if not config:
+		return LocalMatchmakingStore()
+	host, port = config["hosts"][0]
+	return RedisMatchmakingStore(host, port)
+
+class MatchmakingService:
+	"""
+	Matchmaking queue of a game, shared by every worker through the matchmaking store.
+
+	Each worker keeps track of the players connected to it and, while it has some, runs a matcher
+	loop. Only the worker holding the leadership of the queue actually matches: it keeps a copy of
+	the queue, reads it whole once then only applies the joins and leaves logged since its last pass.
+	It pairs the players and claims each group atomically before notifying the players through the
+	'send.match.found' event on their channels, whichever worker they are connected to.
+	"""
+
+	def __init__(self, queue_name: str, group_size: int = 2, room_prefix: str = ""):
+		"""
+		Args:
+			queue_name (str): The name of the queue in the store.
+			group_size (int): The number of players of a match. Pairs are matched by MMR, larger groups in join order.
+			room_prefix (str): Prepended to the generated room names.
+		"""
+		self.queue_name = queue_name
+		self.group_size = group_size
+		self.room_prefix = room_prefix
+		self.store = create_matchmaking_store()
+		self.worker_id = str(uuid.uuid4())
+		self.local_channels: set[str] = set()
+		self.matcher_task = None
+		# Copy of the queue kept while this worker leads it, and the number of store changes it includes.
+		self.queue = None
+		self.cursor = 0
+
+	async def join(self, channel_name: str, user_id: int, mmr: int = 0) -> bool:
+		"""
+		Queues a player and makes sure this worker runs the matcher loop.
+
+		Returns:
+			bool: False if the player was already queued.
+		"""
+		if not await self.store.join(self.queue_name, QueueEntry(channel_name, user_id, mmr, time.time())):
+			return False
+		self.local_channels.add(channel_name)
+		if self.matcher_task is None or self.matcher_task.done():
+			self.matcher_task = asyncio.create_task(self.run_matcher())
+		return True
+
+	async def leave(self, channel_name: str):
+		self.local_channels.discard(channel_name)
+		await self.store.leave(self.queue_name, channel_name)
+
+	def matched(self, channel_name: str):
+		"""
+		Called by the consumer once its player was matched, possibly by the matcher of another worker.
+		"""
+		self.local_channels.discard(channel_name)
+
+	async def sync_queue(self):
+		"""
+		Brings the copy of the queue up to date: applies the changes logged since the last pass,
+		or reloads the whole queue when there is no copy yet or it is too far behind.
+		"""
+		result = None
+		if self.queue is not None:
+			result = await self.store.get_changes(self.queue_name, self.cursor)
+
+		if result is None:
+			self.cursor, entries = await self.store.snapshot(self.queue_name)
+			self.queue = MatchmakingQueue()
+			for entry in entries:
+				self.queue.add(entry.channel_name, entry.user_id, entry.mmr, entry.join_time)
+			return
+
+		self.cursor, changes = result
+		for change in changes:
+			if change[0] == "join":
+				self.queue.add(*change[1:])
+			else:
+				self.queue.remove(change[1])
+
+	def make_groups(self) -> list[list[QueuedPlayer]]:
+		"""
+		Takes the matches out of the copy of the queue.
+
+		Returns:
+			list[list[QueuedPlayer]]: The groups of `group_size` players to claim.
+			Pairs are matched by MMR, larger groups in join order.
+		"""
+		if self.group_size == 2:
+			return [list(pair) for pair in self.queue.match()]
+
+		players = list(self.queue.players.values())
+		groups = [players[i:i + self.group_size] for i in range(0, len(players) - self.group_size + 1, self.group_size)]
+		for group in groups:
+			for player in group:
+				self.queue.remove(player.channel_name)
+		return groups
+
+	async def match_once(self, channel_layer):
+		"""
+		Runs one matcher pass: updates the copy of the queue, claims each group and notifies its players.
+		"""
+		await self.store.drop_stale(self.queue_name)
+		await self.sync_queue()
+		for group in self.make_groups():
+			channel_names = [player.channel_name for player in group]
+			if not await self.store.claim(self.queue_name, channel_names):
+				# One of them left after the sync: put them back, the leave is applied on the next pass.
+				for player in group:
+					self.queue.add(player.channel_name, player.user_id, player.mmr, player.join_time)
+				continue
+
+			room_name = f"{self.room_prefix}{uuid.uuid4()}"
+			print(f"Match found in {self.queue_name}: {[player.user_id for player in group]} -> {room_name}")
+			for channel_name in channel_names:
+				self.local_channels.discard(channel_name)
+				await channel_layer.send(
+					channel_name,
+					{
+						"type": "send.match.found",
+						"room_name": room_name,
+					}
+				)
+
+	async def run_matcher(self):
+		"""
+		Matcher loop of this worker, running while it has queued players. Each pass refreshes
+		the entries of the local players, then matches the queue if this worker is the leader.
+		"""
+		channel_layer = get_channel_layer()
+		try:
+			while self.local_channels:
+				try:
+					await self.store.refresh(self.queue_name, list(self.local_channels))
+					if await self.store.lead(self.queue_name, self.worker_id):
+						await self.match_once(channel_layer)
+					else:
+						self.queue = None
+				except Exception as e:
+					# The copy may have missed part of a pass: reload it.
+					self.queue = None
+					print(f"Error in the {self.queue_name} matcher: {e}")
+				await asyncio.sleep(MATCH_INTERVAL)
+		finally:
+			self.queue = None
+			try:
+				await self.store.resign(self.queue_name, self.worker_id)
+			except Exception as e:
+				print(f"Error while resigning the {self.queue_name} matcher: {e}")
@@ -0,0 +1,172 @@
+import time
+import bisect
+
+BASE_MMR_GAP = 20
+MAX_MMR_GAP = 100
+# The gap widens by MMR_GAP_STEP every WIDEN_INTERVAL seconds spent in the queue.
+MMR_GAP_STEP = 20
+WIDEN_INTERVAL = 20
+# Past this wait, a player is matched with the closest opponent whatever the gap.
+FORCE_MATCH_AFTER = 60
+
+class QueuedPlayer:
+	"""
+	A player waiting in the matchmaking queue.
+	"""
+
+	def __init__(self, channel_name: str, user_id: int, mmr: int, join_time: float, order: int):
+		self.channel_name = channel_name
+		self.user_id = user_id
+		self.mmr = mmr
+		self.join_time = join_time
+		# Breaks ties between equal MMRs so every player has a unique position in the queue.
+		self.key = (mmr, order)
+
+	def to_dict(self) -> dict:
+		return {"channel_name": self.channel_name, "user_id": self.user_id, "mmr": self.mmr}
+
+class MatchmakingQueue:
+	"""
+	Matchmaking queue kept sorted by MMR.
+
+	The closest opponent of a player is always one of its two neighbours in the sorted queue,
+	so it is found with a binary search instead of a scan. Each player has its own tolerance,
+	widening with the time it has spent waiting; two players can be matched when their MMR gap
+	fits the tolerance of the one who waited longest.
+	"""
+
+	def __init__(
+		self,
+		base_mmr_gap: int = BASE_MMR_GAP,
+		max_mmr_gap: int = MAX_MMR_GAP,
+		mmr_gap_step: int = MMR_GAP_STEP,
+		widen_interval: float = WIDEN_INTERVAL,
+		force_match_after: float = FORCE_MATCH_AFTER,
+	):
+		"""
+		Initializes an empty queue.
+
+		Args:
+			base_mmr_gap (int): The tolerance of a player who just joined.
+			max_mmr_gap (int): The largest tolerance reached by widening.
+			mmr_gap_step (int): The tolerance added every `widen_interval` seconds of waiting.
+			widen_interval (float): The number of seconds between two widenings.
+			force_match_after (float): The wait after which any gap is accepted.
+		"""
+		self.base_mmr_gap = base_mmr_gap
+		self.max_mmr_gap = max_mmr_gap
+		self.mmr_gap_step = mmr_gap_step
+		self.widen_interval = widen_interval
+		self.force_match_after = force_match_after
+		self.keys: list[tuple] = []
+		self.sorted_players: list[QueuedPlayer] = []
+		# Insertion ordered, so iterating it visits the players who waited longest first.
+		self.players: dict[str, QueuedPlayer] = {}
+		self.order = 0
+
+	def __len__(self) -> int:
+		return len(self.players)
+
+	def __contains__(self, channel_name: str) -> bool:
+		return channel_name in self.players
+
+	def add(self, channel_name: str, user_id: int, mmr: int, join_time: float = None) -> bool:
+		"""
+		Adds a player to the queue.
+
+		Args:
+			channel_name (str): The channel of the player's matchmaking connection.
+			user_id (int): The ID of the player.
+			mmr (int): The MMR of the player.
+			join_time (float): When the player joined the queue, now by default.
+
+		Returns:
+			bool: False if the player was already queued.
+		"""
+		if channel_name in self.players:
+			return False
+
+		self.order += 1
+		player = QueuedPlayer(channel_name, user_id, mmr, time.time() if join_time is None else join_time, self.order)
+		index = bisect.bisect_left(self.keys, player.key)
+		self.keys.insert(index, player.key)
+		self.sorted_players.insert(index, player)
+		self.players[channel_name] = player
+		return True
+
+	def remove(self, channel_name: str) -> QueuedPlayer | None:
+		"""
+		Removes a player from the queue.
+
+		Args:
+			channel_name (str): The channel of the player's matchmaking connection.
+
+		Returns:
+			QueuedPlayer or None: The removed player, or None if it was not queued.
+		"""
+		player = self.players.pop(channel_name, None)
+		if player:
+			index = bisect.bisect_left(self.keys, player.key)
+			del self.keys[index]
+			del self.sorted_players[index]
+		return player
+
+	def tolerance(self, player: QueuedPlayer, now: float) -> float:
+		"""
+		Returns the largest MMR gap a player accepts after waiting until `now`.
+		"""
+		waited = now - player.join_time
+		if waited >= self.force_match_after:
+			return float("inf")
+		widened = self.base_mmr_gap + (waited // self.widen_interval) * self.mmr_gap_step
+		return min(widened, self.max_mmr_gap)
+
+	def find_opponent(self, player: QueuedPlayer, now: float) -> QueuedPlayer | None:
+		"""
+		Finds the closest eligible opponent of a queued player.
+
+		Args:
+			player (QueuedPlayer): The player looking for an opponent.
+			now (float): The current time, used to widen the tolerances.
+
+		Returns:
+			QueuedPlayer or None: The opponent with the smallest MMR gap, if the gap is accepted.
+		"""
+		index = bisect.bisect_left(self.keys, player.key)
+		neighbours = []
+		if index > 0:
+			neighbours.append(self.sorted_players[index - 1])
+		if index + 1 < len(self.sorted_players):
+			neighbours.append(self.sorted_players[index + 1])
+		if not neighbours:
+			return None
+
+		opponent = min(neighbours, key=lambda neighbour: abs(neighbour.mmr - player.mmr))
+		longest_wait = player if player.join_time <= opponent.join_time else opponent
+		if abs(opponent.mmr - player.mmr) <= self.tolerance(longest_wait, now):
+			return opponent
+		return None
+
+	def match(self, now: float = None) -> list[tuple[QueuedPlayer, QueuedPlayer]]:
+		"""
+		Pairs every player that has an eligible opponent, longest waiting players first,
+		and removes the pairs from the queue.
+
+		Args:
+			now (float): The current time, now by default.
+
+		Returns:
+			list[tuple[QueuedPlayer, QueuedPlayer]]: The matched pairs.
+		"""
+		now = time.time() if now is None else now
+		pairs = []
+		for channel_name in list(self.players):
+			player = self.players.get(channel_name)
+			if player is None:
+				continue
+			opponent = self.find_opponent(player, now)
+			if opponent:
+				self.remove(player.channel_name)
+				self.remove(opponent.channel_name)
+				pairs.append((player, opponent))
+		return pairs
@@ -0,0 +1,140 @@
+import time
+import uuid
+import asyncio
+from typing import Callable
+from django.db import close_old_connections
+from channels.db import database_sync_to_async
+from utilities.GameMetrics import game_metrics
+
+QUEUE_SIZE = 1000
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 5
+# Seconds before the first retry of a failed record, doubled on each attempt.
+RETRY_DELAY = 1
+
+class MatchResultQueue:
+	"""
+	Write-behind queue of finished match results.
+
+	The game managers hand their results to the queue and go on without waiting for the database.
+	A background task drains the queue in batches, each batch written in a single thread hop, and
+	every record in its own transaction so one bad record does not roll back the others.
+	Records carry a `result_id` idempotency key: the writers skip a result already recorded, so a
+	record retried after a commit whose acknowledgement was lost is not saved twice.
+
+	Results still queued when the process stops are lost.
+	"""
+
+	def __init__(self, maxsize: int = QUEUE_SIZE, batch_size: int = BATCH_SIZE, max_attempts: int = MAX_ATTEMPTS):
+		"""
+		Initializes an empty queue. The writer task starts with the first submitted result.
+
+		Args:
+			maxsize (int): The number of results waiting to be written before submit blocks.
+			batch_size (int): The largest number of results written in one thread hop.
+			max_attempts (int): The number of times a result is tried before it is dropped.
+		"""
+		self.maxsize = maxsize
+		self.batch_size = batch_size
+		self.max_attempts = max_attempts
+		self.writers: dict[str, Callable[[dict], None]] = {}
+		self.queue = None
+		self.worker_task = None
+		self.retry_tasks = set()
+
+	def register(self, kind: str, writer: Callable[[dict], None]):
+		"""
+		Registers the function saving one kind of result.
+
+		Args:
+			kind (str): The kind of result, e.g. the game name.
+			writer (Callable[[dict], None]): Saves a record. Runs in a database thread, must be idempotent on 'result_id'.
+		"""
+		self.writers[kind] = writer
+
+	async def submit(self, kind: str, record: dict) -> str:
+		"""
+		Queues a result to be written. Only waits when the queue is full.
+
+		Args:
+			kind (str): The kind of result, used to pick its writer.
+			record (dict): The result. A 'result_id' is added if missing.
+
+		Returns:
+			str: The idempotency key of the result.
+		"""
+		if kind not in self.writers:
+			raise ValueError(f"No writer registered for {kind} results.")
+		record.setdefault("result_id", str(uuid.uuid4()))
+		self.start()
+		item = (kind, record, 1)
+		try:
+			self.queue.put_nowait(item)
+		except asyncio.QueueFull:
+			print(f"Match result queue is full, waiting to queue {kind} result {record['result_id']}.")
+			await self.queue.put(item)
+		game_metrics.pending_results.set(self.queue.qsize())
+		return record["result_id"]
+
+	def start(self):
+		if self.queue is None:
+			self.queue = asyncio.Queue(self.maxsize)
+		if self.worker_task is None or self.worker_task.done():
+			self.worker_task = asyncio.create_task(self.run())
+
+	async def run(self):
+		"""
+		Writer loop: waits for a result, takes whatever else is queued up to the batch size, writes the batch.
+		"""
+		while True:
+			batch = [await self.queue.get()]
+			while len(batch) < self.batch_size and not self.queue.empty():
+				batch.append(self.queue.get_nowait())
+			game_metrics.pending_results.set(self.queue.qsize())
+
+			try:
+				failures = await self.write_batch(batch)
+			except Exception as e:
+				failures = [(item, e) for item in batch]
+			for item, error in failures:
+				self.retry(item, error)
+
+	@database_sync_to_async
+	def write_batch(self, batch: list) -> list:
+		"""
+		Writes a batch of results in the current database thread.
+
+		Returns:
+			list: The (item, exception) pairs of the results that could not be written.
+		"""
+		close_old_connections()
+		failures = []
+		for item in batch:
+			kind, record, _ = item
+			start = time.perf_counter()
+			try:
+				self.writers[kind](record)
+			except Exception as e:
+				failures.append((item, e))
+			else:
+				game_metrics.result_write_duration.labels(kind).observe(time.perf_counter() - start)
+		return failures
+
+	def retry(self, item: tuple, error: Exception):
+		kind, record, attempt = item
+		if attempt >= self.max_attempts:
+			game_metrics.failed_results.labels(kind).inc()
+			print(f"Dropping {kind} result {record['result_id']} after {attempt} attempts: {error}")
+			return
+
+		delay = RETRY_DELAY * 2 ** (attempt - 1)
+		print(f"Failed to save {kind} result {record['result_id']} (attempt {attempt}), retrying in {delay}s: {error}")
+		task = asyncio.create_task(self.requeue((kind, record, attempt + 1), delay))
+		self.retry_tasks.add(task)
+		task.add_done_callback(self.retry_tasks.discard)
+
+	async def requeue(self, item: tuple, delay: float):
+		await asyncio.sleep(delay)
+		await self.queue.put(item)
+
+match_results = MatchResultQueue()
@@ -0,0 +1,207 @@
+import time
+import asyncio
+from django.utils import timezone
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from website.models import User
+from utilities.FriendGraph import friend_graph
+from utilities.PresenceStore import PRESENCE_TTL, presence_store
+from utilities.ChannelLayers import group_send_many
+
+# Seconds between two flushes of the pending status changes.
+PRESENCE_INTERVAL = 1
+# Seconds a status must stay unchanged before it is saved and sent, so a reconnect or a page reload is not seen.
+PRESENCE_DEBOUNCE = 2
+# Seconds between two refreshes of the statuses of the connected users in the presence store.
+PRESENCE_HEARTBEAT = PRESENCE_TTL / 3
+
+class PendingStatus:
+	"""
+	The last status requested for a user that was not flushed yet.
+	"""
+
+	def __init__(self, user: User, status: int):
+		self.user = user
+		self.status = status
+		self.changed_at = time.monotonic()
+
+class PresenceService:
+	"""
+	Status of the users connected to the social socket of this worker.
+
+	Connections are counted per user: only the first connect sets a user online and only the last
+	disconnect sets it offline, so opening a second tab does nothing. Status changes are debounced
+	per user and flushed together every PRESENCE_INTERVAL: the settled statuses that differ from the
+	stored ones are written to the presence store, and the friends of the changed users receive
+	a single 'get_status_changes' event per flush listing every change. The database is only written
+	when a user goes offline, to record when it was last seen.
+
+	While users are connected, their statuses are set again in the store every PRESENCE_HEARTBEAT
+	seconds; the statuses of a worker that stopped expire on their own.
+	"""
+
+	def __init__(self, interval: float = PRESENCE_INTERVAL, debounce: float = PRESENCE_DEBOUNCE, heartbeat: float = PRESENCE_HEARTBEAT):
+		"""
+		Args:
+			interval (float): The number of seconds between two flushes.
+			debounce (float): The number of seconds a status must stay unchanged before it is flushed.
+			heartbeat (float): The number of seconds between two refreshes of the statuses of the connected users.
+		"""
+		self.interval = interval
+		self.debounce = debounce
+		self.heartbeat = heartbeat
+		self.last_heartbeat = time.monotonic()
+		self.connections: dict[int, int] = {}
+		# The status stored for the users known to this worker.
+		self.statuses: dict[int, int] = {}
+		self.pending: dict[int, PendingStatus] = {}
+		# Disconnected users whose friends stay in the friend graph until their offline status is sent.
+		self.releases: dict[int, int] = {}
+		self.flush_task = None
+
+	async def connect(self, user: User):
+		"""
+		Counts a new social connection of a user, setting it online if it is the first.
+
+		Args:
+			user (User): The user, as loaded for the connection.
+		"""
+		await friend_graph.warm(user.id)
+		if user.id not in self.statuses:
+			stored = await presence_store.get_statuses([user.id])
+			self.statuses[user.id] = stored.get(user.id, User.UserStatus.OFFLINE)
+		self.connections[user.id] = self.connections.get(user.id, 0) + 1
+		if self.connections[user.id] == 1:
+			self.set_status(user, User.UserStatus.ONLINE)
+
+	def disconnect(self, user: User):
+		"""
+		Counts a closed social connection of a user, setting it offline if it was the last.
+		"""
+		count = self.connections.get(user.id, 0) - 1
+		self.releases[user.id] = self.releases.get(user.id, 0) + 1
+		if count > 0:
+			self.connections[user.id] = count
+		else:
+			self.connections.pop(user.id, None)
+			self.set_status(user, User.UserStatus.OFFLINE)
+		self.start()
+
+	def set_status(self, user: User, status: int):
+		"""
+		Requests a status change. It is saved and sent once it stayed the same for the debounce delay.
+
+		Args:
+			user (User): The user.
+			status (int): The new status, a User.UserStatus.
+		"""
+		pending = self.pending.get(user.id)
+		if pending is None or pending.status != status:
+			self.pending[user.id] = PendingStatus(user, status)
+		self.start()
+
+	def get_status(self, user_id: int) -> int:
+		"""
+		Returns the last status requested for a user connected to this worker, flushed or not.
+		"""
+		pending = self.pending.get(user_id)
+		if pending is not None:
+			return pending.status
+		return self.statuses.get(user_id, User.UserStatus.OFFLINE)
+
+	def start(self):
+		if self.flush_task is None or self.flush_task.done():
+			self.flush_task = asyncio.create_task(self.run())
+
+	async def run(self):
+		"""
+		Flush loop, running while users are connected or status changes are pending.
+		"""
+		while self.pending or self.releases or self.connections:
+			await asyncio.sleep(self.interval)
+			try:
+				await self.flush()
+				if time.monotonic() - self.last_heartbeat >= self.heartbeat:
+					self.last_heartbeat = time.monotonic()
+					await self.send_heartbeat()
+			except Exception as e:
+				print(f"Error while flushing presence updates: {e}")
+
+	async def flush(self):
+		"""
+		Saves and sends the status changes that are settled.
+		"""
+		now = time.monotonic()
+		settled = [
+			pending for pending in self.pending.values()
+			if now - pending.changed_at >= self.debounce
+		]
+		for pending in settled:
+			del self.pending[pending.user.id]
+		changed = [pending for pending in settled if self.statuses.get(pending.user.id) != pending.status]
+
+		if changed:
+			await self.save_statuses(changed)
+			for pending in changed:
+				self.statuses[pending.user.id] = pending.status
+			await self.send_status_changes(changed)
+
+		for user_id in list(self.releases):
+			if user_id in self.pending:
+				continue
+			for _ in range(self.releases.pop(user_id)):
+				friend_graph.release(user_id)
+			if user_id not in self.connections:
+				self.statuses.pop(user_id, None)
+
+	async def send_heartbeat(self):
+		"""
+		Sets again the stored statuses of the connected users. This also restores a status that expired
+		while its user was still connected, e.g. when the worker was too busy to send the heartbeat in time.
+		"""
+		await presence_store.set_statuses({
+			user_id: self.statuses[user_id]
+			for user_id in self.connections
+			if self.statuses.get(user_id, User.UserStatus.OFFLINE) != User.UserStatus.OFFLINE
+		})
+
+	async def save_statuses(self, changed: list[PendingStatus]):
+		"""
+		Writes the changed statuses to the presence store, and the last seen time of the users that went offline.
+		"""
+		offline_ids = [pending.user.id for pending in changed if pending.status == User.UserStatus.OFFLINE]
+		await presence_store.set_statuses({
+			pending.user.id: pending.status
+			for pending in changed
+			if pending.status != User.UserStatus.OFFLINE
+		})
+		if offline_ids:
+			await presence_store.remove(offline_ids)
+			await self.save_last_seen(offline_ids)
+
+	@database_sync_to_async
+	def save_last_seen(self, user_ids: list[int]):
+		User.objects.filter(id__in=user_ids).update(last_seen=timezone.now())
+
+	async def send_status_changes(self, changed: list[PendingStatus]):
+		"""
+		Sends one event per friend listing the status changes of all of its friends.
+		"""
+		changes_by_friend: dict[int, list[dict]] = {}
+		for pending in changed:
+			change = {
+				"friend_username": pending.user.username,
+				"status": User.get_status_name(pending.status),
+			}
+			for friend_id in await friend_graph.get_friends(pending.user.id):
+				changes_by_friend.setdefault(friend_id, []).append(change)
+
+		try:
+			await group_send_many(get_channel_layer(), [
+				(f"user_{friend_id}", {"type": "get_status_changes", "changes": changes})
+				for friend_id, changes in changes_by_friend.items()
+			])
+		except Exception as e:
+			print(f"Failed to send status changes to {len(changes_by_friend)} users: {e}")
+
+presence = PresenceService()
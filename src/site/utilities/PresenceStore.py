@@ -0,0 +1,143 @@
+import time
+import weakref
+import asyncio
+from django.conf import settings
+from website.models import User
+
+# Seconds a status is kept without being refreshed by the worker holding the user's connections.
+PRESENCE_TTL = 60
+
+def add_bot_statuses(user_ids: list[int], statuses: dict[int, int]) -> dict[int, int]:
+	"""
+	Adds the status of the bot users (the negative IDs of create_bot_user), which never connect
+	and are always shown online.
+	"""
+	for user_id in user_ids:
+		if user_id < 0:
+			statuses[user_id] = User.UserStatus.ONLINE
+	return statuses
+
+class LocalPresenceStore:
+	"""
+	In-process presence store, used when a single process serves both the pages and the websockets (DEBUG).
+	"""
+
+	def __init__(self, ttl: int = PRESENCE_TTL):
+		self.ttl = ttl
+		self.statuses: dict[int, tuple[int, float]] = {}
+
+	async def set_statuses(self, statuses: dict[int, int]):
+		"""
+		Records the status of users that are not offline.
+
+		Args:
+			statuses (dict[int, int]): The User.UserStatus of each user, keyed by user ID.
+		"""
+		expires_at = time.time() + self.ttl
+		for user_id, status in statuses.items():
+			self.statuses[user_id] = (status, expires_at)
+
+	async def remove(self, user_ids: list[int]):
+		"""
+		Forgets users that went offline.
+		"""
+		for user_id in user_ids:
+			self.statuses.pop(user_id, None)
+
+	async def get_statuses(self, user_ids: list[int]) -> dict[int, int]:
+		return self.read_statuses(user_ids)
+
+	def read_statuses(self, user_ids: list[int]) -> dict[int, int]:
+		"""
+		Returns the status of the users that are not offline. Synchronous, for the HTTP views.
+
+		Args:
+			user_ids (list[int]): The IDs of the users.
+
+		Returns:
+			dict[int, int]: The User.UserStatus of each user, keyed by user ID. Offline users are missing.
+		"""
+		now = time.time()
+		return add_bot_statuses(user_ids, {
+			user_id: self.statuses[user_id][0]
+			for user_id in user_ids
+			if user_id in self.statuses and self.statuses[user_id][1] > now
+		})
+
+class RedisPresenceStore:
+	"""
+	Presence store kept in Redis, shared by every process.
+
+	The status of a user is a key that expires after `ttl` seconds unless the worker holding its
+	connections sets it again, so the users of a crashed worker fall offline on their own.
+	"""
+
+	def __init__(self, host: str, port: int, ttl: int = PRESENCE_TTL):
+		"""
+		Initializes the store. Connections are opened lazily, one pool per event loop and one for the synchronous reads.
+
+		Args:
+			host (str): The Redis host.
+			port (int): The Redis port.
+			ttl (int): The number of seconds a status is kept without being refreshed.
+		"""
+		self.host = host
+		self.port = port
+		self.ttl = ttl
+		self.clients = weakref.WeakKeyDictionary()
+		self.sync_client = None
+
+	def get_client(self):
+		import redis.asyncio as redis
+
+		loop = asyncio.get_running_loop()
+		if loop not in self.clients:
+			self.clients[loop] = redis.Redis(host=self.host, port=self.port, decode_responses=True)
+		return self.clients[loop]
+
+	def get_sync_client(self):
+		import redis
+
+		if self.sync_client is None:
+			self.sync_client = redis.Redis(host=self.host, port=self.port, decode_responses=True)
+		return self.sync_client
+
+	def key(self, user_id: int) -> str:
+		return f"presence:{user_id}"
+
+	async def set_statuses(self, statuses: dict[int, int]):
+		if not statuses:
+			return
+		async with self.get_client().pipeline(transaction=False) as pipe:
+			for user_id, status in statuses.items():
+				pipe.set(self.key(user_id), int(status), ex=self.ttl)
+			await pipe.execute()
+
+	async def remove(self, user_ids: list[int]):
+		if not user_ids:
+			return
+		await self.get_client().delete(*[self.key(user_id) for user_id in user_ids])
+
+	async def get_statuses(self, user_ids: list[int]) -> dict[int, int]:
+		if not user_ids:
+			return {}
+		values = await self.get_client().mget([self.key(user_id) for user_id in user_ids])
+		return add_bot_statuses(user_ids, {user_id: int(value) for user_id, value in zip(user_ids, values) if value is not None})
+
+	def read_statuses(self, user_ids: list[int]) -> dict[int, int]:
+		if not user_ids:
+			return {}
+		values = self.get_sync_client().mget([self.key(user_id) for user_id in user_ids])
+		return add_bot_statuses(user_ids, {user_id: int(value) for user_id, value in zip(user_ids, values) if value is not None})
+
+def create_presence_store():
+	"""
+	Returns the store configured by the PRESENCE setting: Redis when hosts are given, in-process otherwise.
+	"""
+	config = getattr(settings, "PRESENCE", None)
+	if not config:
+		return LocalPresenceStore()
+	host, port = config["hosts"][0]
+	return RedisPresenceStore(host, port, config.get("ttl", PRESENCE_TTL))
+
+presence_store = create_presence_store()
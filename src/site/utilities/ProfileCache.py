@@ -0,0 +1,87 @@
+import time
+from collections import OrderedDict
+from channels.db import database_sync_to_async
+from website.models import User
+
+# Backstop for saves made by another process, whose signals never reach this cache.
+PROFILE_CACHE_TTL = 60
+PROFILE_CACHE_SIZE = 10000
+
+class ProfileCache:
+	"""
+	Read-through cache of the profile of a user needed by the games: ID, username, MMR and avatar.
+
+	A miss loads the user, its stats and its image in a single joined query. Entries are dropped
+	when the user, its stats or its image are saved in this process (see website/signals.py),
+	and expire after `ttl` seconds otherwise.
+	"""
+
+	def __init__(self, ttl: float = PROFILE_CACHE_TTL, max_size: int = PROFILE_CACHE_SIZE):
+		"""
+		Initializes an empty cache.
+
+		Args:
+			ttl (float): The number of seconds an entry is kept.
+			max_size (int): The number of entries kept, least recently used ones are evicted first.
+		"""
+		self.ttl = ttl
+		self.max_size = max_size
+		self.entries: OrderedDict[int, tuple[float, dict]] = OrderedDict()
+		# Bumped on every invalidation, so a load racing with a save does not store the old profile.
+		self.generations: dict[int, int] = {}
+
+	async def get(self, user_id: int) -> dict | None:
+		"""
+		Returns the profile of a user, loading it from the database on a miss.
+
+		Args:
+			user_id (int): The ID of the user.
+
+		Returns:
+			dict or None: The profile ('id', 'username', 'mmr', 'image_url'), or None if the user does not exist.
+		"""
+		user_id = int(user_id)
+		entry = self.entries.get(user_id)
+		if entry and entry[0] > time.monotonic():
+			self.entries.move_to_end(user_id)
+			return entry[1]
+
+		generation = self.generations.get(user_id, 0)
+		profile = await self.load(user_id)
+		if profile is not None and self.generations.get(user_id, 0) == generation:
+			self.entries[user_id] = (time.monotonic() + self.ttl, profile)
+			self.entries.move_to_end(user_id)
+			while len(self.entries) > self.max_size:
+				self.entries.popitem(last=False)
+		return profile
+
+	@database_sync_to_async
+	def load(self, user_id: int) -> dict | None:
+		user = (
+			User.objects
+			.select_related("user_stat", "user_image")
+			.only("id", "username", "user_stat__mmr", "user_image__user_avatar")
+			.filter(id=user_id)
+			.first()
+		)
+		if user is None:
+			return None
+
+		user_stat = getattr(user, "user_stat", None)
+		user_image = getattr(user, "user_image", None)
+		return {
+			"id": user.id,
+			"username": user.username,
+			"mmr": user_stat.mmr if user_stat else 0,
+			"image_url": {"avatar_url": user_image.user_avatar.url} if user_image else {},
+		}
+
+	def invalidate(self, user_id: int):
+		"""
+		Drops the cached profile of a user. Called from the post_save signals, possibly from a database thread.
+		"""
+		user_id = int(user_id)
+		self.generations[user_id] = self.generations.get(user_id, 0) + 1
+		self.entries.pop(user_id, None)
+
+profile_cache = ProfileCache()
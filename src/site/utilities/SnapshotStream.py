@@ -0,0 +1,222 @@
+import json
+import functools
+
+KEYFRAME_INTERVAL = 60
+
+FRAME_FORMAT_JSON = "json"
+FRAME_FORMAT_DELTA = "delta"
+FRAME_FORMAT_BINARY = "binary"
+FRAME_FORMATS = {FRAME_FORMAT_JSON, FRAME_FORMAT_DELTA, FRAME_FORMAT_BINARY}
+
+def diff_snapshot(previous: dict, current: dict, path: tuple = ()) -> tuple[dict, list]:
+	"""
+	Computes the difference between two snapshots.
+
+	Nested dictionaries are compared key by key; any other value (lists included) is replaced as a whole.
+
+	Args:
+		previous (dict): The snapshot that was last sent.
+		current (dict): The new snapshot.
+		path (tuple): The keys leading to the compared dictionaries, used for the removed paths.
+
+	Returns:
+		tuple[dict, list]: The changed fields, nested like the snapshot, and the list of paths of removed keys.
+	"""
+	changed = {}
+	removed = []
+
+	for key, value in current.items():
+		if key not in previous:
+			changed[key] = value
+			continue
+
+		old_value = previous[key]
+		if isinstance(value, dict) and isinstance(old_value, dict):
+			nested_changed, nested_removed = diff_snapshot(old_value, value, path + (key,))
+			if nested_changed:
+				changed[key] = nested_changed
+			removed.extend(nested_removed)
+		elif value != old_value:
+			changed[key] = value
+
+	for key in previous:
+		if key not in current:
+			removed.append(list(path + (key,)))
+
+	return changed, removed
+
+def copy_snapshot(value):
+	"""
+	Copies the dictionaries and lists of a snapshot so later in-place changes of the game state
+	(e.g. the scores dictionary) do not leak into the stored snapshot.
+	"""
+	if isinstance(value, dict):
+		return {key: copy_snapshot(item) for key, item in value.items()}
+	if isinstance(value, list):
+		return [copy_snapshot(item) for item in value]
+	return value
+
+def changed_fields(paths: tuple, previous: tuple, current: tuple) -> dict:
+	"""
+	Compares the values of the dynamic fields of two ticks (see GameManager.dynamic_fields).
+
+	Args:
+		paths (tuple): The paths of the fields in the snapshot.
+		previous (tuple): The values that were last sent.
+		current (tuple): The new values, in the same order.
+
+	Returns:
+		dict: The changed fields, nested like the snapshot.
+	"""
+	changed = {}
+	if previous == current:
+		return changed
+
+	for path, old_value, value in zip(paths, previous, current):
+		if value != old_value:
+			node = changed
+			for key in path[:-1]:
+				node = node.setdefault(key, {})
+			node[path[-1]] = value
+	return changed
+
+class SnapshotStream:
+	"""
+	Turns the per-tick snapshots of a match into the frames sent to its subscribers.
+
+	Subscribers using the "json" format receive the full snapshot every tick, as before.
+	Subscribers using the "delta" format receive a full keyframe when they subscribe and every
+	`keyframe_interval` ticks, and only the changed fields in between. Between keyframes only the
+	dynamic fields of the game manager are compared, so the rest of the snapshot is not even built;
+	games without dynamic fields are diffed as a whole.
+	Subscribers using the "binary" format receive the delta keyframes, as text, and the packed frame
+	of the game manager in between, when it has one.
+	"""
+
+	def __init__(self, keyframe_interval: int = KEYFRAME_INTERVAL):
+		"""
+		Initializes an empty stream.
+
+		Args:
+			keyframe_interval (int): The number of ticks between two periodic keyframes.
+		"""
+		self.keyframe_interval = keyframe_interval
+		self.subscribers: dict[str, str] = {}
+		self.last_snapshot = None
+		self.last_paths = None
+		self.last_values = None
+		self.tick = 0
+		self.last_delta_tick = 0
+		self.last_keyframe_tick = 0
+		self.keyframe_requested = True
+
+	def subscribe(self, channel_name: str, frame_format: str = FRAME_FORMAT_JSON):
+		"""
+		Registers a consumer channel with the frame format it wants. Delta and binary subscribers get a keyframe on the next tick.
+
+		Args:
+			channel_name (str): The channel name of the consumer.
+			frame_format (str): One of FRAME_FORMATS.
+
+		Raises:
+			ValueError: If the frame format is not supported.
+		"""
+		if frame_format not in FRAME_FORMATS:
+			raise ValueError(f"Unsupported frame format: {frame_format}")
+
+		self.subscribers[channel_name] = frame_format
+		if frame_format in (FRAME_FORMAT_DELTA, FRAME_FORMAT_BINARY):
+			self.request_keyframe()
+
+	def unsubscribe(self, channel_name: str):
+		self.subscribers.pop(channel_name, None)
+
+	def request_keyframe(self):
+		self.keyframe_requested = True
+
+	def has_subscribers(self, frame_format: str) -> bool:
+		return frame_format in self.subscribers.values()
+
+	def next_delta(self, game_manager, get_snapshot) -> dict:
+		"""
+		Builds the delta frame of the current tick and makes it the new reference.
+
+		Args:
+			game_manager (GameManager): The game manager of the match, giving the dynamic fields.
+			get_snapshot (callable): Returns the current snapshot of the match, only called when needed.
+
+		Returns:
+			dict: Either a keyframe with the whole state, or the changed fields (and removed paths) since the previous tick.
+		"""
+		base_tick = self.last_delta_tick
+		self.last_delta_tick = self.tick
+
+		fields = game_manager.dynamic_fields()
+		paths, values = fields if fields is not None else (None, None)
+
+		is_keyframe = (
+			self.keyframe_requested
+			or (paths is None and self.last_snapshot is None)
+			or paths is not self.last_paths
+			or self.tick - self.last_keyframe_tick >= self.keyframe_interval
+		)
+
+		if is_keyframe:
+			delta = {"keyframe": True, "tick": self.tick, "state": get_snapshot()}
+			self.keyframe_requested = False
+			self.last_keyframe_tick = self.tick
+		elif paths is not None:
+			delta = {"keyframe": False, "tick": self.tick, "base_tick": base_tick, "changed": changed_fields(paths, self.last_values, values)}
+		else:
+			changed, removed = diff_snapshot(self.last_snapshot, get_snapshot())
+			delta = {"keyframe": False, "tick": self.tick, "base_tick": base_tick, "changed": changed}
+			if removed:
+				delta["removed"] = removed
+
+		self.last_paths = paths
+		self.last_values = values
+		self.last_snapshot = copy_snapshot(get_snapshot()) if paths is None else None
+		return delta
+
+	def encode_frames(self, match, event_info: dict) -> dict:
+		"""
+		Encodes the 'game_loop' frame once for every format used by the subscribers, so consumers
+		can forward it as-is instead of serializing the same snapshot once per connection.
+
+		Args:
+			match (Lobby | Tournament): The match being broadcast, giving its snapshot and game manager.
+			event_info (dict): The event sent to the clients along with the state.
+
+		Returns:
+			dict: The ready-to-send frames, keyed by format: text, except for the 'binary' frames between keyframes.
+		"""
+		self.tick += 1
+		frames = {}
+		get_snapshot = functools.cache(match.to_dict)
+		needs_snapshot = not self.subscribers or self.has_subscribers(FRAME_FORMAT_JSON)
+
+		needs_delta = self.has_subscribers(FRAME_FORMAT_DELTA)
+		binary_frame = None
+		if self.has_subscribers(FRAME_FORMAT_BINARY):
+			binary_frame = match.game_manager.pack_frame()
+			if binary_frame is None:
+				# Games without a binary layout fall back to the full snapshot.
+				needs_snapshot = True
+			else:
+				needs_delta = True
+
+		if needs_delta:
+			delta = self.next_delta(match.game_manager, get_snapshot)
+			if delta["keyframe"] or self.has_subscribers(FRAME_FORMAT_DELTA):
+				frames[FRAME_FORMAT_DELTA] = json.dumps({
+					"event_info": event_info,
+					"lobby_delta": delta,
+				})
+			if binary_frame is not None:
+				frames[FRAME_FORMAT_BINARY] = frames[FRAME_FORMAT_DELTA] if delta["keyframe"] else binary_frame
+		if needs_snapshot:
+			frames[FRAME_FORMAT_JSON] = json.dumps({
+				"event_info": event_info,
+				"lobby_info": get_snapshot(),
+			})
+		return frames
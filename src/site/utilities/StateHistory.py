@@ -0,0 +1,48 @@
+class StateHistory:
+	"""
+	Fixed-size ring buffer of world states indexed by simulation tick.
+
+	Only the last `size` ticks are kept: recording tick `t` overwrites tick `t - size`.
+	"""
+
+	def __init__(self, size: int):
+		"""
+		Initializes an empty history.
+
+		Args:
+			size (int): The number of ticks kept.
+		"""
+		self.size = size
+		self.ticks = [None] * size
+		self.states = [None] * size
+
+	def record(self, tick: int, state):
+		"""
+		Stores the world state at the start of a tick.
+
+		Args:
+			tick (int): The simulation tick.
+			state: The world state, as returned by the game manager.
+		"""
+		index = tick % self.size
+		self.ticks[index] = tick
+		self.states[index] = state
+
+	def get(self, tick: int):
+		"""
+		Returns the world state recorded at the start of a tick.
+
+		Args:
+			tick (int): The simulation tick.
+
+		Returns:
+			The world state, or None if the tick is too old or was never recorded.
+		"""
+		index = tick % self.size
+		if self.ticks[index] != tick:
+			return None
+		return self.states[index]
+
+	def clear(self):
+		self.ticks = [None] * self.size
+		self.states = [None] * self.size
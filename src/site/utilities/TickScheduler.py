@@ -0,0 +1,190 @@
+import asyncio
+import time
+from utilities.GameMetrics import game_metrics, PHASE_SIMULATE
+
+TICK_RATE = 60
+MAX_CATCH_UP_STEPS = 5
+
+class TickScheduler:
+	"""
+	Drives every running match from a single fixed-timestep clock.
+
+	Instead of each lobby or tournament owning an asyncio task that sleeps on its own,
+	matches register themselves here and are stepped together, once per tick.
+
+	The clock is deadline based: it only sleeps for what is left of the current tick, and when
+	it falls behind it runs up to `max_catch_up_steps` simulation steps before broadcasting,
+	so the game speed does not depend on the server load.
+
+	Each match is stepped in its own task and the clock only waits for them until the next deadline,
+	so a match awaiting I/O (a full result queue, a slow channel layer) does not hold back the others.
+	It is not stepped again before its step is done, and then catches up on the steps it missed.
+	"""
+
+	def __init__(self, tick_rate: int = TICK_RATE, max_catch_up_steps: int = MAX_CATCH_UP_STEPS):
+		"""
+		Initializes the scheduler with the given tick rate and no registered matches.
+
+		Args:
+			tick_rate (int): The number of ticks per second.
+			max_catch_up_steps (int): The maximum number of simulation steps run in a single tick when late.
+		"""
+		self.tick_rate = tick_rate
+		self.tick_interval = 1 / tick_rate
+		self.max_catch_up_steps = max_catch_up_steps
+		self.matches: dict[str, object] = {}
+		self.clock_task = None
+		self.step_tasks: dict[str, asyncio.Task] = {}
+		self.missed_steps: dict[str, int] = {}
+		self.finishing_tasks = set()
+		self.tick_count = 0
+		self.overrun_count = 0
+		self.skipped_steps = 0
+		self.last_tick_duration = 0.0
+		self.max_tick_duration = 0.0
+
+	def register(self, match):
+		"""
+		Adds a match to the scheduler and starts the clock if it is not running.
+
+		Args:
+			match (Lobby or Tournament): The match to step every tick. It must expose
+				`room_group_name`, an async `simulate()` returning False once the game is over,
+				an async `broadcast_state()` and an async `game_ended()` called after it has been unregistered.
+		"""
+		self.matches[match.room_group_name] = match
+		if self.clock_task is None or self.clock_task.done():
+			self.clock_task = asyncio.create_task(self.run())
+
+	def unregister(self, match):
+		"""
+		Removes a match from the scheduler. The clock stops by itself once no match is left.
+
+		Args:
+			match (Lobby or Tournament): The match to remove.
+		"""
+		self.matches.pop(match.room_group_name, None)
+		self.missed_steps.pop(match.room_group_name, None)
+
+	def is_registered(self, match) -> bool:
+		return self.matches.get(match.room_group_name) is match
+
+	async def run(self):
+		"""
+		The clock loop. Works out how many simulation steps are due since the last tick,
+		steps all registered matches, then sleeps until the next deadline.
+		"""
+		try:
+			next_deadline = time.perf_counter()
+			while self.matches:
+				tick_start = time.perf_counter()
+				steps_due = max(1, int((tick_start - next_deadline) // self.tick_interval) + 1)
+				steps = min(steps_due, self.max_catch_up_steps)
+				next_deadline += steps * self.tick_interval
+
+				if steps_due > steps:
+					# Too far behind to catch up: drop the backlog instead of speeding the game up.
+					self.skipped_steps += steps_due - steps
+					game_metrics.skipped_steps.inc(steps_due - steps)
+					next_deadline = tick_start + self.tick_interval
+
+				await self.step(steps, max(0, next_deadline - time.perf_counter()))
+
+				self.last_tick_duration = time.perf_counter() - tick_start
+				self.max_tick_duration = max(self.max_tick_duration, self.last_tick_duration)
+				game_metrics.tick_duration.observe(self.last_tick_duration)
+				if self.last_tick_duration > self.tick_interval:
+					self.overrun_count += 1
+					game_metrics.tick_overruns.inc()
+				self.tick_count += 1
+				await asyncio.sleep(max(0, next_deadline - time.perf_counter()))
+		except asyncio.CancelledError:
+			print("Tick scheduler was cancelled.")
+			for task in list(self.step_tasks.values()):
+				task.cancel()
+			for match in list(self.matches.values()):
+				self.unregister(match)
+				await match.game_ended()
+
+	async def step(self, steps: int = 1, timeout: float | None = None):
+		"""
+		Runs the due simulation steps of every registered match, each in its own task, broadcasts
+		each match state once, and retires the finished matches.
+
+		A match whose previous step is still running is skipped and owes the steps of this tick.
+
+		Args:
+			steps (int): The number of simulation steps to run before broadcasting.
+			timeout (float | None): The number of seconds to wait for the steps, None to wait for all of them.
+		"""
+		matches = list(self.matches.values())
+		game_metrics.ticking_matches.set(len(matches))
+		for match in matches:
+			name = match.room_group_name
+			if name in self.step_tasks and not self.step_tasks[name].done():
+				self.missed_steps[name] = self.missed_steps.get(name, 0) + steps
+				continue
+
+			match_steps = steps + self.missed_steps.pop(name, 0)
+			if match_steps > self.max_catch_up_steps:
+				self.skipped_steps += match_steps - self.max_catch_up_steps
+				game_metrics.skipped_steps.inc(match_steps - self.max_catch_up_steps)
+				match_steps = self.max_catch_up_steps
+			task = asyncio.create_task(self.step_match(match, match_steps))
+			self.step_tasks[name] = task
+			task.add_done_callback(lambda task, match=match: self.step_done(match, task))
+
+		if self.step_tasks:
+			await asyncio.wait(list(self.step_tasks.values()), timeout=timeout)
+
+	def step_done(self, match, task: asyncio.Task):
+		"""
+		Retires a match once its step found it finished or failed.
+		"""
+		if self.step_tasks.get(match.room_group_name) is task:
+			del self.step_tasks[match.room_group_name]
+		if task.cancelled():
+			return
+		if task.exception() is not None:
+			print(f"Error while ticking {match.room_group_name}: {task.exception()}")
+		elif task.result():
+			return
+		if not self.is_registered(match):
+			return
+		self.unregister(match)
+		finishing_task = asyncio.create_task(match.game_ended())
+		self.finishing_tasks.add(finishing_task)
+		finishing_task.add_done_callback(self.finishing_tasks.discard)
+
+	async def step_match(self, match, steps: int) -> bool:
+		with game_metrics.profile(match.room_group_name):
+			is_active = True
+			with game_metrics.time_phase(match.game_name, PHASE_SIMULATE):
+				for _ in range(steps):
+					is_active = await match.simulate()
+					if not is_active:
+						break
+			if steps > 1:
+				# Only the last of the catch-up steps is broadcast.
+				game_metrics.broadcast_dropped(match.game_name, "coalesced", steps - 1)
+			await match.broadcast_state()
+		return is_active
+
+	def stats(self) -> dict:
+		"""
+		Returns timing information about the clock.
+
+		Returns:
+			dict: The number of registered matches, ticks run, overruns, skipped steps,
+				and the last and worst tick duration in milliseconds.
+		"""
+		return {
+			"matches": len(self.matches),
+			"tick_count": self.tick_count,
+			"overrun_count": self.overrun_count,
+			"skipped_steps": self.skipped_steps,
+			"last_tick_ms": self.last_tick_duration * 1000,
+			"max_tick_ms": self.max_tick_duration * 1000,
+		}
+
+tick_scheduler = TickScheduler()
@@ -1,13 +1,14 @@
+import time
 import asyncio
 from enum import Enum
 from utilities.GameManager import GameManager
+from utilities.TickScheduler import tick_scheduler
+from utilities.SnapshotStream import SnapshotStream
+from utilities.GameMetrics import game_metrics, PHASE_SERIALIZE, PHASE_BROADCAST
 from channels.layers import get_channel_layer
 from pong.models import PongTournament
 from channels.db import database_sync_to_async
-
-from website.models import User
-from channels.db import database_sync_to_async
-from website.serializers import SimpleUserProfileSerializer
+from utilities.ProfileCache import profile_cache
 
 PLAYER_NUMBER = 4
 MATCH_PLAYER_NUMBER = 2
@@ -21,6 +22,7 @@ class Tournament():
 		PLAYER_DISCONNECTED = "PLAYER_DISCONNECTED"
 
 	def __init__(self, game_name: str, room_name: str, game_manager: GameManager):
+		self.game_name = game_name
 		self.room_group_name = f"{game_name}_tournament_{room_name}"
 		self.tournament_status = self.TournamentStatus.TO_SETUP
 		self.game_manager: GameManager = game_manager
@@ -28,6 +30,7 @@ class Tournament():
 		self.tournament_player = PLAYER_NUMBER
 		self.update_lock = asyncio.Lock()
 		self.room_name = room_name
+		self.snapshot_stream = SnapshotStream()
 
 		self.players: list = []
 		self.all_players: list = []
@@ -35,9 +38,10 @@ class Tournament():
 		self.current_round_winners: list = []  
 		self.current_round_index: int = 0
 		self.match_played: int = 0
-		self.game_loop_task = None
 
 	async def broadcast_message(self, message: dict):
+		if message.get("type") == "lobby_state" and "frames" not in message:
+			message.setdefault("tournament_snapshot", self.to_dict())
 		await self.channel_layer.group_send(self.room_group_name, message)
 
 	async def manage_event(self, data: dict, match_manager):
@@ -153,7 +157,6 @@ class Tournament():
 		# Start the next match in the current round.
 		match = current_round_matches.pop(0)
 		self.game_manager.reset()
-		self.game_loop_task = None
 		await self.game_manager.add_player(match[0], False)
 		await self.game_manager.add_player(match[1], False)
 		self.tournament_status = self.TournamentStatus.TO_SETUP
@@ -168,7 +171,7 @@ class Tournament():
 		print(f" setup_pong_manager end")
 
 	async def tournament_start(self):
-		"""Starts the tournament by kicking off the game loop and the first match."""
+		"""Starts the tournament by registering it with the tick scheduler and starting the next match."""
 		print(f" tournament_start")
 
 		if not self.bracket:
@@ -181,7 +184,8 @@ class Tournament():
 
 		self.game_manager.start_game()
 		self.tournament_status = self.TournamentStatus.PLAYING
-		self.game_loop_task = asyncio.create_task(self.game_loop())
+		self.snapshot_stream.request_keyframe()
+		tick_scheduler.register(self)
 		
 		snapshot = self.to_dict()
 		await self.broadcast_message({
@@ -191,15 +195,9 @@ class Tournament():
 		})
 		print(f" tournament_start end")
 
-	@database_sync_to_async
-	def get_serialized_user(self, player_id):
-		"""Fetches user and serializes data in a synchronous context."""
-		try:
-			user = User.objects.get(id=player_id)
-			serializer = SimpleUserProfileSerializer(user)
-			return serializer.data
-		except User.DoesNotExist:
-			return None
+	async def get_serialized_user(self, player_id):
+		"""Returns the cached profile of a user, or None if it does not exist."""
+		return await profile_cache.get(player_id)
 
 	async def add_player_to_tournament(self, data: dict):
 		print(f" add_player_to_tournament")
@@ -231,49 +229,63 @@ class Tournament():
 			self.setup_first_round()
 		print(f" add_player_to_tournament end")
 
-	async def game_loop(self):
+	async def simulate(self) -> bool:
+		"""
+		Runs one fixed-timestep step of the current match.
+		Called by the tick scheduler, possibly several times per tick when the server is catching up.
+
+		Returns:
+			bool: False once the current match is no longer active.
+		"""
+		async with self.update_lock:
+			await self.game_manager.game_loop()
+		return self.game_manager.game_loop_is_active
+
+	async def broadcast_state(self):
+		"""
+		Broadcasts the current tournament state. Called by the tick scheduler once per tick.
+		"""
+		event_info = {
+			"type": "lobby_state",
+			"event": "game_loop",
+		}
+		start = time.perf_counter()
+		frames = self.snapshot_stream.encode_frames(self, event_info)
+		serialized = time.perf_counter()
+		game_metrics.observe_phase(self.game_name, PHASE_SERIALIZE, serialized - start)
+		try:
+			await self.broadcast_message({**event_info, "frames": frames})
+		except Exception:
+			game_metrics.broadcast_dropped(self.game_name, "error")
+			raise
+		game_metrics.observe_phase(self.game_name, PHASE_BROADCAST, time.perf_counter() - serialized)
+
+	async def game_ended(self):
 		"""
-		Runs the core game loop for the current match.
-		After the match concludes, records the winner and moves on.
+		Called by the tick scheduler once the current match stopped ticking.
+		Records the winner and moves on.
 		"""
+		print(f" score {self.game_manager.scores}", flush=True)
+		loser_id = self.game_manager.get_loser()
+		winner_id = self.game_manager.get_winner()
+		self.current_round_winners.append(winner_id)
+		self.tournament_status = self.TournamentStatus.ENDED
+
+		self.match_played += 1
 		try:
-			while self.game_manager.game_loop_is_active:
-				async with self.update_lock:
-					await self.game_manager.game_loop()
-				await asyncio.sleep(1 / 60)
+			if self.match_played == 3:
+				print(f" end", flush=True)
+				await self.close_and_save()
+			else:
 				snapshot = self.to_dict()
 				await self.broadcast_message({
 					"type": "lobby_state",
-					"event": "game_loop",
+					"event": "match_finished",
+					"loser_id": loser_id,
 					"tournament_snapshot": snapshot,
 				})
-		except asyncio.CancelledError:
-			print("Game loop task was cancelled.")
-		finally:
-			print(f" score {self.game_manager.scores}", flush=True)
-			print(f" lucaaaa", flush=True)
-			loser_id = self.game_manager.get_loser()
-			winner_id = self.game_manager.get_winner()
-			self.current_round_winners.append(winner_id)
-			self.tournament_status = self.TournamentStatus.ENDED
-
-			self.match_played += 1
-			try:
-				if self.match_played == 3:
-					print(f" end", flush=True)
-					await self.close_and_save()
-				else:
-					print(f" alleto", flush=True)
-
-					snapshot = self.to_dict()
-					await self.broadcast_message({
-						"type": "lobby_state",
-						"event": "match_finished",
-						"loser_id": loser_id,
-						"tournament_snapshot": snapshot,
-					})
-			except Exception as e:
-				print(f" error game loop {e}")
+		except Exception as e:
+			print(f" error game loop {e}")
 	
 	async def close_and_save(self):
 		try:
@@ -291,6 +303,24 @@ class Tournament():
 		except Exception as e:
 			print(f" test {e}",flush=True)
 	
+	def set_profiling(self, sample_rate: float) -> str:
+		"""
+		Profiles a sample of the ticks of this room, or stops profiling it when the rate is 0.
+
+		Args:
+			sample_rate (float): The share of the ticks that are profiled, between 0 and 1.
+
+		Returns:
+			str: The profile collected so far.
+		"""
+		if sample_rate > 0:
+			game_metrics.enable_profiling(self.room_group_name, sample_rate)
+			return game_metrics.profile_report(self.room_group_name)
+		return game_metrics.disable_profiling(self.room_group_name)
+
+	def profile_report(self) -> str:
+		return game_metrics.profile_report(self.room_group_name)
+
 	def to_dict(self) -> dict:
 		tournament_data = {
 			"current_tournament_status": self.tournament_status.name,
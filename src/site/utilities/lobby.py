@@ -1,7 +1,11 @@
+import time
 import asyncio
 from enum import Enum
 from channels.layers import get_channel_layer
 from utilities.GameManager import GameManager
+from utilities.TickScheduler import tick_scheduler
+from utilities.SnapshotStream import SnapshotStream
+from utilities.GameMetrics import game_metrics, PHASE_SERIALIZE, PHASE_BROADCAST
 
 class Lobby:
 	"""
@@ -24,6 +28,7 @@ class Lobby:
 			room_name (str): The name of the room (used for group communication).
 			game_manager (GameManager): The game manager responsible for managing the game state and players.
 		"""
+		self.game_name = game_name
 		self.room_group_name = f"{game_name}_lobby_{room_name}"
 		self.lobby_status = Lobby.LobbyStatus.TO_SETUP
 		self.channel_layer = get_channel_layer()
@@ -31,15 +36,19 @@ class Lobby:
 		self.game_manager = game_manager
 		self.ready_players = set()
 		self.room_name = room_name
-		self.game_loop_task = None
+		self.snapshot_stream = SnapshotStream()
 
 	async def broadcast_message(self, message: dict):
 		"""
 		Broadcasts a message to all clients in the lobby.
 
+		State events carry the lobby snapshot, so consumers running on other workers do not need the lobby.
+
 		Args:
 			message (dict): The message to send, typically containing event type and data.
 		"""
+		if message.get("type") == "lobby_state" and "frames" not in message:
+			message.setdefault("lobby_snapshot", self.to_dict())
 		if self.channel_layer:
 			await self.channel_layer.group_send(self.room_group_name, message)
 
@@ -92,21 +101,40 @@ class Lobby:
 
 	async def start_game(self):
 		"""
-		Transitions the lobby into the PLAYING state, starts the game manager, and initiates the game loop.
-		Also broadcasts a 'game_started' event to all players.
+		Transitions the lobby into the PLAYING state, starts the game manager, and registers the lobby
+		with the tick scheduler. Also broadcasts a 'game_started' event to all players.
 		"""
-		if self.game_loop_task != None:
+		if self.lobby_status != Lobby.LobbyStatus.TO_SETUP:
 			return
 		
 		self.lobby_status = Lobby.LobbyStatus.PLAYING
 		self.game_manager.start_game()
-		self.game_loop_task = asyncio.create_task(self.game_loop())
+		self.snapshot_stream.request_keyframe()
+		tick_scheduler.register(self)
 		data_to_send = {
 			"type": "lobby_state",
 			"event_name": "game_started",
 		}
 		await self.broadcast_message(data_to_send)
 
+	def set_profiling(self, sample_rate: float) -> str:
+		"""
+		Profiles a sample of the ticks of this room, or stops profiling it when the rate is 0.
+
+		Args:
+			sample_rate (float): The share of the ticks that are profiled, between 0 and 1.
+
+		Returns:
+			str: The profile collected so far.
+		"""
+		if sample_rate > 0:
+			game_metrics.enable_profiling(self.room_group_name, sample_rate)
+			return game_metrics.profile_report(self.room_group_name)
+		return game_metrics.disable_profiling(self.room_group_name)
+
+	def profile_report(self) -> str:
+		return game_metrics.profile_report(self.room_group_name)
+
 	def len_player(self)-> int:
 		return len(self.game_manager.players)
 
@@ -144,32 +172,49 @@ class Lobby:
 		}
 		await self.broadcast_message(data_to_send)
 
-	async def game_loop(self):
+	async def simulate(self) -> bool:
 		"""
-		Runs the core game loop for the lobby. This loop updates the game state at a fixed frame rate,
-		broadcasts updates to all players, and terminates when the game is no longer active.
+		Runs one fixed-timestep step of the game.
+		Called by the tick scheduler, possibly several times per tick when the server is catching up.
+
+		Returns:
+			bool: False once the game is no longer active.
 		"""
+		async with self.update_lock:
+			await self.game_manager.game_loop()
+		return self.game_manager.game_loop_is_active
+
+	async def broadcast_state(self):
+		"""
+		Broadcasts the current state to all players. Called by the tick scheduler once per tick.
+		"""
+		event_info = {
+			"type": "lobby_state",
+			"event": "game_loop",
+		}
+		start = time.perf_counter()
+		frames = self.snapshot_stream.encode_frames(self, event_info)
+		serialized = time.perf_counter()
+		game_metrics.observe_phase(self.game_name, PHASE_SERIALIZE, serialized - start)
 		try:
-			while self.game_manager.game_loop_is_active:
-				async with self.update_lock:
-					await self.game_manager.game_loop()
-				await asyncio.sleep(1 / 60)
-				snapshot = self.to_dict()
-				await self.broadcast_message({
-					"type": "lobby_state",
-					"event": "game_loop",
-					"lobby_snapshot": snapshot,
-				})
-		except asyncio.CancelledError:
-			print("Game loop task was cancelled.")
-		finally:
-			self.lobby_status = self.LobbyStatus.ENDED
-			snapshot = self.to_dict()
-			await self.broadcast_message({
-				"type": "lobby_state",
-				"event": "game_finished",
-				"lobby_snapshot": snapshot,
-			})
+			await self.broadcast_message({**event_info, "frames": frames})
+		except Exception:
+			game_metrics.broadcast_dropped(self.game_name, "error")
+			raise
+		game_metrics.observe_phase(self.game_name, PHASE_BROADCAST, time.perf_counter() - serialized)
+
+	async def game_ended(self):
+		"""
+		Called by the tick scheduler once the lobby stopped ticking. Marks the lobby as ended
+		and broadcasts the final state to all players.
+		"""
+		self.lobby_status = self.LobbyStatus.ENDED
+		snapshot = self.to_dict()
+		await self.broadcast_message({
+			"type": "lobby_state",
+			"event": "game_finished",
+			"lobby_snapshot": snapshot,
+		})
 
 	async def close_lobby(self, data: dict, match_manager):
 		player_disconnected_id = data.get("player_id")
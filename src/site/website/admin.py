@@ -1,5 +1,5 @@
 from django.contrib import admin
-from website.models import UserImage, MatchHistory, UserStats
+from website.models import UserImage, MatchHistory, MatchTimeline, UserStats
 from .models import Friendships
 from django.contrib import admin
 from website.models import User 
@@ -14,15 +14,15 @@ class UserAdmin(UserAdmin):
     form = UserChangeForm
     model = User
 
-    list_display = ["id", "username", "email", "status", "created_at", "updated_at"]
+    list_display = ["id", "username", "email", "last_seen", "created_at", "updated_at"]
     search_fields = ["username", "email"]
     ordering = ["-created_at"]
 
     fieldsets = (
         (None, {"fields": ("username", "password")}),
-        ("Personal Info", {"fields": ("email", "status")}),
+        ("Personal Info", {"fields": ("email",)}),
         ("Permissions", {"fields": ("is_active", "is_staff", "is_superuser", "groups", "user_permissions")}),
-        ("Important Dates", {"fields": ("last_login", "date_joined")}),
+        ("Important Dates", {"fields": ("last_login", "last_seen", "date_joined")}),
     )
 
     add_fieldsets = (
@@ -41,6 +41,13 @@ class MatchHistoryAdmin(admin.ModelAdmin):
     filter_horizontal = ("pong_matches", "liarsbar_matches")
     autocomplete_fields = ["user"]
 
+class MatchTimelineAdmin(admin.ModelAdmin):
+    list_display = ("user", "game", "start_date", "is_winner")
+    list_filter = ("game",)
+    search_fields = ("user__username",)
+    ordering = ("-start_date",)
+    raw_id_fields = ("user", "pong_match", "liarsbar_match")
+
 class FriendshipsAdmin(admin.ModelAdmin):
     list_display = ('first_user', 'second_user', 'status', 'date_created', 'date_updated')
     
@@ -72,4 +79,5 @@ admin.site.register(User, UserAdmin)
 admin.site.register(UserStats)
 admin.site.register(UserImage)
 admin.site.register(MatchHistory, MatchHistoryAdmin)
+admin.site.register(MatchTimeline, MatchTimelineAdmin)
 admin.site.register(Friendships, FriendshipsAdmin)
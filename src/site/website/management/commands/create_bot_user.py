@@ -10,7 +10,6 @@ class Command(BaseCommand):
             id=user_id,
             username=username,
             email=email,
-            status=User.UserStatus.ONLINE
         )
         if username != "admin":
             bot_user.set_password("bot")
@@ -0,0 +1,285 @@
+import json
+import time
+import random
+import asyncio
+from urllib.parse import parse_qs
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from channels.layers import channel_layers
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from website.models import User, UserStats, UserImage, Friendships
+
+
+class LoadTestUserMiddleware:
+    """Authenticates the simulated clients from the user_id query parameter instead of a session cookie."""
+
+    def __init__(self, app, users):
+        self.app = app
+        self.users = users
+
+    async def __call__(self, scope, receive, send):
+        query = parse_qs(scope.get("query_string", b"").decode())
+        user_id = int(query["user_id"][0])
+        return await self.app(dict(scope, user=self.users[user_id]), receive, send)
+
+
+def percentiles(values):
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+    pick = lambda ratio: values[min(len(values) - 1, int(len(values) * ratio))] * 1000
+    return {"count": len(values), "p50_ms": pick(0.5), "p95_ms": pick(0.95), "p99_ms": pick(0.99), "max_ms": values[-1] * 1000}
+
+
+class LoadStats:
+    """Measurements shared by every simulated client."""
+
+    def __init__(self):
+        self.connect = {"matchmaking": [], "multiplayer": [], "social": []}
+        self.matchmaking_wait = []
+        self.input_to_frame = []
+        self.chat_delivery = []
+        self.frames = 0
+        self.dropped_frames = 0
+        self.chat_sent = 0
+        self.errors = {}
+
+    def error(self, journey, error):
+        key = f"{journey}: {type(error).__name__}"
+        self.errors[key] = self.errors.get(key, 0) + 1
+
+    def to_dict(self):
+        return {
+            "connect": {name: percentiles(values) for name, values in self.connect.items()},
+            "matchmaking_wait": percentiles(self.matchmaking_wait),
+            "input_to_frame": percentiles(self.input_to_frame),
+            "frames": self.frames,
+            "dropped_frames": self.dropped_frames,
+            "dropped_ratio": self.dropped_frames / max(1, self.frames + self.dropped_frames),
+            "chat_sent": self.chat_sent,
+            "chat_delivery": percentiles(self.chat_delivery),
+            "errors": self.errors,
+        }
+
+
+class Command(BaseCommand):
+    help = ('Simulate websocket clients against the ASGI app: matchmaking, multiplayer Pong with key events, '
+            'and social chat. Reports connect latency, input-to-frame latency and dropped frames.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=100, help='Number of simulated users (rounded to an even number).')
+        parser.add_argument('--ramp-up', type=float, default=5.0, help='Seconds over which the clients connect.')
+        parser.add_argument('--duration', type=float, default=30.0, help='Seconds each client plays once its game started.')
+        parser.add_argument('--input-rate', type=float, default=5.0, help='Key events per second per player.')
+        parser.add_argument('--chat-rate', type=float, default=0.2, help='Chat messages per second per user.')
+        parser.add_argument('--timeout', type=float, default=10.0, help='Seconds to wait for an expected message.')
+        parser.add_argument('--redis', help='host:port of a Redis server to use as channel layer instead of the configured one.')
+        parser.add_argument('--output', help='Write the report as JSON to this file.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def create_users(self, count):
+        """Helper method to create the load test users, each one friend with the next one."""
+        users = []
+        for index in range(count):
+            user, created = User.objects.get_or_create(
+                username=f"lt_{index:05d}",
+                defaults={"email": f"lt_{index:05d}@load.test"},
+            )
+            if created:
+                UserStats.objects.create(user=user)
+                UserImage.objects.create(user=user)
+            users.append(user)
+
+        for first_user, second_user in zip(users[::2], users[1::2]):
+            Friendships.objects.update_or_create(
+                first_user=first_user,
+                second_user=second_user,
+                defaults={"status": Friendships.FriendshipsStatus.FRIENDS},
+            )
+        return users
+
+    async def connect(self, application, path, user, stats, journey):
+        communicator = WebsocketCommunicator(application, f"{path}?user_id={user.id}")
+        start = time.perf_counter()
+        connected, _ = await communicator.connect(timeout=self.options['timeout'])
+        if not connected:
+            raise ConnectionError(f"{path} refused the connection")
+        stats.connect[journey].append(time.perf_counter() - start)
+        return communicator
+
+    async def disconnect(self, communicator):
+        """Closes a client, unless its application already stopped, e.g. cancelled by a receive_from timeout."""
+        if not communicator.future.done():
+            await communicator.disconnect()
+
+    async def receive_json(self, communicator):
+        return json.loads(await communicator.receive_from(timeout=self.options['timeout']))
+
+    async def find_match(self, application, user, stats):
+        """Joins the Pong matchmaking queue and returns the room it was paired into."""
+        communicator = await self.connect(application, "/ws/multiplayer/pong/matchmaking", user, stats, "matchmaking")
+        try:
+            start = time.perf_counter()
+            await communicator.send_json_to({"action": "join_matchmaking"})
+            while True:
+                message = await self.receive_json(communicator)
+                if message.get("type") == "setup_pong_lobby":
+                    stats.matchmaking_wait.append(time.perf_counter() - start)
+                    return message["room_name"]
+        finally:
+            await self.disconnect(communicator)
+
+    async def play(self, application, user, room_name, stats):
+        """Joins the multiplayer room, readies up, then streams key events until the game ends or the duration elapses."""
+        communicator = await self.connect(application, f"/ws/multiplayer/pong/{room_name}", user, stats, "multiplayer")
+        try:
+            await communicator.send_json_to({"type": "set_frame_format", "format": "json"})
+            await communicator.send_json_to({"type": "init_player", "player_id": user.id})
+
+            sent_inputs = {}
+            last_tick = None
+            seq = 0
+            is_ready = False
+            deadline = None
+            next_input = 0.0
+            key_down = False
+
+            while deadline is None or time.perf_counter() < deadline:
+                message = await self.receive_json(communicator)
+                lobby_info = message.get("lobby_info") or {}
+                status = lobby_info.get("current_lobby_status")
+                players = lobby_info.get("players") or {}
+
+                if status == "TO_SETUP" and len(players) == 2 and not is_ready:
+                    is_ready = True
+                    await communicator.send_json_to({"type": "client_ready", "player_id": user.id})
+                elif status in ("ENDED", "PLAYER_DISCONNECTED"):
+                    break
+                elif status != "PLAYING" or "tick" not in lobby_info:
+                    continue
+
+                now = time.perf_counter()
+                deadline = deadline or now + self.options['duration']
+                stats.frames += 1
+                tick = lobby_info["tick"]
+                if last_tick is not None and tick > last_tick + 1:
+                    stats.dropped_frames += tick - last_tick - 1
+                last_tick = tick
+
+                acked_seq = (players.get(str(user.id)) or {}).get("last_processed_seq", 0)
+                for acked in [pending for pending in sent_inputs if pending <= acked_seq]:
+                    stats.input_to_frame.append(now - sent_inputs.pop(acked))
+
+                if now >= next_input:
+                    seq += 1
+                    key_down = not key_down
+                    sent_inputs[seq] = now
+                    await communicator.send_json_to({
+                        "type": "update_player",
+                        "action_type": "key_down" if key_down else "key_up",
+                        "key": random.choice(["KeyW", "KeyS"]),
+                        "playerId": user.id,
+                        "seq": seq,
+                        "tick": tick,
+                    })
+                    next_input = now + random.expovariate(self.options['input_rate'])
+
+            await communicator.send_json_to({"type": "quit_game", "player_id": user.id})
+        finally:
+            await self.disconnect(communicator)
+
+    async def chat(self, application, user, friend, stats, stop):
+        """Sits on the social socket, sending messages to its friend on a timer while a separate task times the ones it receives."""
+        communicator = await self.connect(application, "/ws/social/", user, stats, "social")
+        receiver = asyncio.create_task(self.receive_chat(communicator, stats))
+        try:
+            while not stop.is_set() and not receiver.done():
+                try:
+                    await asyncio.wait_for(stop.wait(), random.expovariate(self.options['chat_rate']))
+                except asyncio.TimeoutError:
+                    stats.chat_sent += 1
+                    await communicator.send_json_to({
+                        "type": "send_message",
+                        "username": friend.username,
+                        "message": f"lt:{time.perf_counter()}",
+                    })
+        finally:
+            receiver.cancel()
+            try:
+                # Raises the error that ended the receiver, if any.
+                await receiver
+            except asyncio.CancelledError:
+                pass
+            finally:
+                await self.disconnect(communicator)
+
+    async def receive_chat(self, communicator, stats):
+        """
+        Reads the social socket until cancelled, timing the load test messages.
+        Reads the output queue directly: a receive_from timeout would cancel the application.
+        """
+        while True:
+            output = await communicator.output_queue.get()
+            if output["type"] == "websocket.close":
+                raise ConnectionError("/ws/social/ closed the connection")
+            message = json.loads(output.get("text") or "{}")
+            if message.get("type") == "get_message" and message.get("message", "").startswith("lt:"):
+                stats.chat_delivery.append(time.perf_counter() - float(message["message"][3:]))
+
+    async def run_client(self, application, user, friend, delay, stats):
+        await asyncio.sleep(delay)
+        stop = asyncio.Event()
+        chat_task = asyncio.create_task(self.chat(application, user, friend, stats, stop))
+        try:
+            room_name = await self.find_match(application, user, stats)
+            await self.play(application, user, room_name, stats)
+        except Exception as e:
+            stats.error("pong", e)
+        finally:
+            stop.set()
+            try:
+                await chat_task
+            except Exception as e:
+                stats.error("social", e)
+
+    async def run(self, users):
+        from ft_transcendence.asgi import websocket_urlpatterns
+
+        application = LoadTestUserMiddleware(URLRouter(websocket_urlpatterns), {user.id: user for user in users})
+        stats = LoadStats()
+        friends = {}
+        for first_user, second_user in zip(users[::2], users[1::2]):
+            friends[first_user.id], friends[second_user.id] = second_user, first_user
+
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            self.run_client(application, user, friends[user.id], self.options['ramp_up'] * index / len(users), stats)
+            for index, user in enumerate(users)
+        ))
+        report = stats.to_dict()
+        report["clients"] = len(users)
+        report["elapsed_s"] = time.perf_counter() - start
+        return report
+
+    def handle(self, *args, **options):
+        self.options = options
+        random.seed(options['seed'])
+
+        if options['redis']:
+            host, port = options['redis'].split(":")
+            settings.CHANNEL_LAYERS = {"default": {
+                "BACKEND": "channels_redis.core.RedisChannelLayer",
+                "CONFIG": {"hosts": [(host, int(port))], "capacity": 1500, "expiry": 10},
+            }}
+            channel_layers.backends = {}
+
+        users = self.create_users(options['clients'] - options['clients'] % 2)
+        self.stdout.write(f"Running {len(users)} clients for {options['duration']}s of play each...")
+        report = asyncio.run(self.run(users))
+
+        self.stdout.write(json.dumps(report, indent=2))
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
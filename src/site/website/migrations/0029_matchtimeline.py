@@ -0,0 +1,40 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('liarsbar', '0005_liarsbarmatch_result_id'),
+        ('pong', '0009_pongmatch_result_id'),
+        ('website', '0028_alter_userstats_mmr'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MatchTimeline',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('game', models.IntegerField(choices=[(1, 'Pong'), (2, 'Liars Bar')])),
+                ('start_date', models.DateTimeField()),
+                ('end_date', models.DateTimeField(blank=True, null=True)),
+                ('is_winner', models.BooleanField(default=False)),
+                ('opponents', models.JSONField(default=list, help_text='The usernames of the other players.')),
+                ('user_score', models.IntegerField(blank=True, null=True)),
+                ('opponent_score', models.IntegerField(blank=True, null=True)),
+                ('mmr_gain', models.IntegerField(blank=True, null=True)),
+                ('liarsbar_match', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='liarsbar.liarsbarmatch')),
+                ('pong_match', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='pong.pongmatch')),
+                ('user', models.ForeignKey(help_text='The user whose timeline the match belongs to.', on_delete=django.db.models.deletion.CASCADE, related_name='match_timeline', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Match timeline entry',
+                'verbose_name_plural': 'Match timeline',
+                'indexes': [models.Index(fields=['user', '-start_date', '-id'], name='match_timeline_page_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'pong_match'), name='unique_timeline_pong_match'), models.UniqueConstraint(fields=('user', 'liarsbar_match'), name='unique_timeline_liarsbar_match')],
+            },
+        ),
+    ]
@@ -0,0 +1,80 @@
+from django.db import migrations
+
+PONG = 1
+LIARSBAR = 2
+BATCH_SIZE = 1000
+
+
+def pong_entries(MatchTimeline, match):
+    players = [
+        (match.first_user, match.first_user_score, match.first_user_mmr_gain),
+        (match.second_user, match.second_user_score, match.second_user_mmr_gain),
+    ]
+    return [
+        MatchTimeline(
+            user=user,
+            game=PONG,
+            pong_match=match,
+            start_date=match.start_date or match.end_date,
+            end_date=match.end_date,
+            is_winner=score > opponent_score,
+            opponents=[opponent.username],
+            user_score=score,
+            opponent_score=opponent_score,
+            mmr_gain=mmr_gain,
+        )
+        for (user, score, mmr_gain), (opponent, opponent_score, _) in zip(players, reversed(players))
+        if user is not None and opponent is not None
+    ]
+
+
+def liarsbar_entries(MatchTimeline, match):
+    players = [match.first_user, match.second_user, match.third_user, match.fourth_user]
+    return [
+        MatchTimeline(
+            user=user,
+            game=LIARSBAR,
+            liarsbar_match=match,
+            start_date=match.start_date or match.end_date,
+            end_date=match.end_date,
+            is_winner=match.user_winner_id == user.id,
+            opponents=[other.username for other in players if other is not None and other.id != user.id],
+        )
+        for user in players
+        if user is not None
+    ]
+
+
+def backfill_match_timeline(apps, schema_editor):
+    """
+    Builds the timeline rows of the matches saved before the timeline existed,
+    the same way MatchTimeline.build_entries does for new matches.
+    """
+    MatchTimeline = apps.get_model('website', 'MatchTimeline')
+    PongMatch = apps.get_model('pong', 'PongMatch')
+    LiarsBarMatch = apps.get_model('liarsbar', 'LiarsBarMatch')
+
+    pong_matches = PongMatch.objects.select_related('first_user', 'second_user').order_by('id')
+    liarsbar_matches = LiarsBarMatch.objects.select_related(
+        'first_user', 'second_user', 'third_user', 'fourth_user'
+    ).order_by('id')
+
+    entries = []
+    for matches, build in ((pong_matches, pong_entries), (liarsbar_matches, liarsbar_entries)):
+        for match in matches.iterator(chunk_size=BATCH_SIZE):
+            entries.extend(build(MatchTimeline, match))
+            if len(entries) >= BATCH_SIZE:
+                MatchTimeline.objects.bulk_create(entries, ignore_conflicts=True)
+                entries = []
+    MatchTimeline.objects.bulk_create(entries, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0029_matchtimeline'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_match_timeline, migrations.RunPython.noop),
+    ]
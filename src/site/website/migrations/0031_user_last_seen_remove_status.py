@@ -0,0 +1,22 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0030_backfill_matchtimeline'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='user',
+            name='status',
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='last_seen',
+            field=models.DateTimeField(blank=True, help_text='The date and time when the user last went offline. The live status is kept in the presence store.', null=True),
+        ),
+    ]
@@ -7,7 +7,6 @@ from datetime import datetime, timezone
 from django.contrib.auth.models import AbstractUser, Group, Permission
 from django.core.validators import MinLengthValidator, RegexValidator, MinValueValidator
 from django.utils.timezone import now
-from itertools import chain
 from django.utils import timezone
 from datetime import timedelta
 
@@ -34,10 +33,10 @@ class User(AbstractUser):
 		help_text="User's unique username."
 	)
 	email = models.EmailField(max_length=100, unique=True)
-	status = models.IntegerField(
-		choices=UserStatus.choices,
-		default=UserStatus.OFFLINE,
-		help_text="The current status of the user."
+	last_seen = models.DateTimeField(
+		null=True,
+		blank=True,
+		help_text="The date and time when the user last went offline. The live status is kept in the presence store."
 	)
 	account42Nickname = models.CharField(blank=True, null=True, unique=True)
 	created_at = models.DateField(auto_now_add=True, help_text="The date and time when the object was created.")
@@ -175,7 +174,8 @@ class UserStats(models.Model):
 			match (PongMatch): The match instance containing match data.
 		"""
 		self.exp += match.get_player_xp_gained(self.user.username)
-		self.mmr += match.get_player_mmr_gained(self.user)
+		# mmr is unsigned: a loss never takes it below zero.
+		self.mmr = max(0, self.mmr + int(match.get_player_mmr_gained(self.user)))
 		if match.get_winner() == self.user.username:
 			self.win += 1
 		else:
@@ -336,6 +336,36 @@ class MatchHistory(models.Model):
 		self.pong_matches.add(match)
 		return True
 
+	@classmethod
+	def add_match_for_users(cls, match, user_ids: list):
+		"""
+		Adds a new PongMatch or LiarsBarMatch to the match history of several users with one bulk insert,
+		creating the missing histories.
+
+		Args:
+			match (PongMatch or LiarsBarMatch): The match to be added.
+			user_ids (list): The IDs of the users.
+		"""
+		if isinstance(match, PongMatch):
+			through, match_column = cls.pong_matches.through, "pongmatch_id"
+		elif isinstance(match, LiarsBarMatch):
+			through, match_column = cls.liarsbar_matches.through, "liarsbarmatch_id"
+		else:
+			raise ValueError("Expected a PongMatch or LiarsBar instance.")
+
+		histories = {}
+		for history_id, user_id in cls.objects.filter(user_id__in=user_ids).order_by("id").values_list("id", "user_id"):
+			histories.setdefault(user_id, history_id)
+
+		missing = [cls(user_id=user_id) for user_id in user_ids if user_id not in histories]
+		for history in cls.objects.bulk_create(missing):
+			histories[history.user_id] = history.id
+
+		through.objects.bulk_create(
+			[through(matchhistory_id=histories[user_id], **{match_column: match.id}) for user_id in user_ids],
+			ignore_conflicts=True,
+		)
+
 	def add_liarsbar_match(self, match):
 			"""
 			Adds a LiarsBar to the user's match history if not already added.
@@ -355,16 +385,6 @@ class MatchHistory(models.Model):
 			self.liarsbar_matches.add(match)
 			return True
 
-	def get_all_matches(self):
-		"""
-		Combines and sorts all matches by start date in descending order.
-		"""
-		return sorted(
-			chain(self.pong_matches.all(), self.liarsbar_matches.all()),
-			key=lambda match: match.start_date or datetime.min,
-			reverse=True
-		)
-
 	def __str__(self):
 		"""
 		String representation of the MatchHistory instance.
@@ -373,3 +393,190 @@ class MatchHistory(models.Model):
 	
 	class Meta:
 		verbose_name = "Match history"
+
+class MatchTimeline(models.Model):
+	"""
+	Model representing one match in the timeline of a user.
+
+	The rows are written when a match is saved, one per player, and hold everything the match
+	history shows, so a page of the timeline is read with a single indexed query whatever the
+	number of matches played.
+	"""
+	PAGE_SIZE = 20
+
+	class GameType(models.IntegerChoices):
+		PONG = 1, "Pong"
+		LIARSBAR = 2, "Liars Bar"
+
+	user = models.ForeignKey(
+		settings.AUTH_USER_MODEL,
+		on_delete=models.CASCADE,
+		related_name="match_timeline",
+		help_text="The user whose timeline the match belongs to."
+	)
+	game = models.IntegerField(choices=GameType.choices)
+	pong_match = models.ForeignKey(
+		PongMatch,
+		on_delete=models.CASCADE,
+		null=True,
+		blank=True,
+		related_name="timeline_entries"
+	)
+	liarsbar_match = models.ForeignKey(
+		LiarsBarMatch,
+		on_delete=models.CASCADE,
+		null=True,
+		blank=True,
+		related_name="timeline_entries"
+	)
+	start_date = models.DateTimeField()
+	end_date = models.DateTimeField(null=True, blank=True)
+	is_winner = models.BooleanField(default=False)
+	opponents = models.JSONField(default=list, help_text="The usernames of the other players.")
+	user_score = models.IntegerField(null=True, blank=True)
+	opponent_score = models.IntegerField(null=True, blank=True)
+	mmr_gain = models.IntegerField(null=True, blank=True)
+
+	@classmethod
+	def build_entries(cls, match) -> list:
+		"""
+		Builds the unsaved timeline rows of a match, one per player. The players must be loaded on the match.
+
+		Args:
+			match (PongMatch or LiarsBarMatch): The saved match.
+
+		Returns:
+			list[MatchTimeline]: The rows to insert.
+		"""
+		# Old matches may have no start date, they are placed in the timeline by their end date.
+		if isinstance(match, PongMatch):
+			players = [
+				(match.first_user, match.first_user_score, match.first_user_mmr_gain),
+				(match.second_user, match.second_user_score, match.second_user_mmr_gain),
+			]
+			return [
+				cls(
+					user=user,
+					game=cls.GameType.PONG,
+					pong_match=match,
+					start_date=match.start_date or match.end_date,
+					end_date=match.end_date,
+					is_winner=score > opponent_score,
+					opponents=[opponent.username],
+					user_score=score,
+					opponent_score=opponent_score,
+					mmr_gain=mmr_gain,
+				)
+				for (user, score, mmr_gain), (opponent, opponent_score, _) in zip(players, reversed(players))
+				if user is not None and opponent is not None
+			]
+
+		if isinstance(match, LiarsBarMatch):
+			players = [match.first_user, match.second_user, match.third_user, match.fourth_user]
+			return [
+				cls(
+					user=user,
+					game=cls.GameType.LIARSBAR,
+					liarsbar_match=match,
+					start_date=match.start_date or match.end_date,
+					end_date=match.end_date,
+					is_winner=match.user_winner_id == user.id,
+					opponents=[other.username for other in players if other is not None and other.id != user.id],
+				)
+				for user in players
+				if user is not None
+			]
+
+		raise ValueError("Expected a PongMatch or LiarsBar instance.")
+
+	@classmethod
+	def add_match(cls, match):
+		"""
+		Adds a match to the timeline of each of its players. A match already added is ignored.
+
+		Args:
+			match (PongMatch or LiarsBarMatch): The saved match.
+		"""
+		cls.objects.bulk_create(cls.build_entries(match), ignore_conflicts=True)
+
+	@classmethod
+	def get_page(cls, user, cursor: str = None, limit: int = PAGE_SIZE):
+		"""
+		Returns a page of the timeline of a user, most recent match first.
+
+		Pages are fetched by keyset: the next page starts after the last row of the previous one,
+		so a deep page costs the same as the first one.
+
+		Args:
+			user (User): The user.
+			cursor (str): The cursor returned with the previous page, or None for the first page.
+			limit (int): The number of matches of the page.
+
+		Returns:
+			tuple[list[MatchTimeline], str or None]: The matches, and the cursor of the next page if there is one.
+
+		Raises:
+			ValueError: If the cursor is malformed.
+		"""
+		queryset = cls.objects.filter(user=user).order_by("-start_date", "-id")
+		if cursor:
+			start_date, entry_id = cls.parse_cursor(cursor)
+			queryset = queryset.filter(
+				models.Q(start_date__lt=start_date) | models.Q(start_date=start_date, id__lt=entry_id)
+			)
+
+		return cls.split_page(list(queryset[:limit + 1]), limit)
+
+	@classmethod
+	def prefetch_first_page(cls, limit: int = PAGE_SIZE) -> models.Prefetch:
+		"""
+		Prefetches the first page of the timeline of several users in a single query, into `timeline_page`.
+		The extra row tells whether there is a next page, see split_page.
+		"""
+		return models.Prefetch(
+			"match_timeline",
+			queryset=cls.objects.order_by("-start_date", "-id")[:limit + 1],
+			to_attr="timeline_page",
+		)
+
+	@staticmethod
+	def split_page(entries: list, limit: int = PAGE_SIZE) -> tuple:
+		"""
+		Args:
+			entries (list[MatchTimeline]): Up to `limit` + 1 rows, in timeline order.
+			limit (int): The number of matches of the page.
+
+		Returns:
+			tuple[list[MatchTimeline], str or None]: The matches, and the cursor of the next page if there is one.
+		"""
+		if len(entries) <= limit:
+			return entries, None
+		entries = entries[:limit]
+		return entries, entries[-1].cursor
+
+	@property
+	def cursor(self) -> str:
+		"""
+		The position of this row in the timeline, from which the next page starts.
+		"""
+		return f"{self.start_date.isoformat()}_{self.id}"
+
+	@staticmethod
+	def parse_cursor(cursor: str) -> tuple:
+		start_date, _, entry_id = cursor.rpartition("_")
+		# A '+' of the UTC offset reads as a space when the cursor was not URL-encoded.
+		return datetime.fromisoformat(start_date.replace(" ", "+")), int(entry_id)
+
+	def __str__(self):
+		return f"{self.get_game_display()} match of {self.user} on {self.start_date}"
+
+	class Meta:
+		verbose_name = "Match timeline entry"
+		verbose_name_plural = "Match timeline"
+		indexes = [
+			models.Index(fields=["user", "-start_date", "-id"], name="match_timeline_page_idx"),
+		]
+		constraints = [
+			models.UniqueConstraint(fields=["user", "pong_match"], name="unique_timeline_pong_match"),
+			models.UniqueConstraint(fields=["user", "liarsbar_match"], name="unique_timeline_liarsbar_match"),
+		]
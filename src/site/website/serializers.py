@@ -1,7 +1,6 @@
 from rest_framework import serializers
-from .models import Friendships, UserStats, UserImage, MatchHistory, User
-from pong.serializers import PongMatchSerializer
-from liarsbar.serializers import LiarsBarMatchSerializer
+from .models import Friendships, UserStats, UserImage, MatchTimeline, User
+from utilities.PresenceStore import presence_store
 from pong.models import *
 
 class UserStatsSerializer(serializers.ModelSerializer):
@@ -30,35 +29,60 @@ class UserImageSerializer(serializers.ModelSerializer):
         return userImage.user_avatar.url
 
 
-class MatchHistorySerializer(serializers.ModelSerializer):
-    pong_matches = PongMatchSerializer(many=True, read_only=True)
-    liarsbar_matches = LiarsBarMatchSerializer(many=True, read_only=True)
-    all_matches = serializers.SerializerMethodField()
+class MatchTimelineSerializer(serializers.ModelSerializer):
+    """
+    A match of the timeline of a user, seen from that user. Reads only the timeline row.
+    """
+    game = serializers.SerializerMethodField()
+    score = serializers.SerializerMethodField()
+    duration = serializers.SerializerMethodField()
 
     class Meta:
-        model = MatchHistory
-        fields = ['user', 'pong_matches', 'liarsbar_matches', 'all_matches']
-        read_only_fields = ['all_matches']
+        model = MatchTimeline
+        fields = ['game', 'is_winner', 'opponents', 'score', 'mmr_gain', 'start_date', 'end_date', 'duration']
+        read_only_fields = fields
+
+    def get_game(self, obj):
+        return 'pong' if obj.game == MatchTimeline.GameType.PONG else 'liarsbar'
+
+    def get_score(self, obj):
+        if obj.user_score is None or obj.opponent_score is None:
+            return None
+        return f"{obj.user_score} - {obj.opponent_score}"
+
+    def get_duration(self, obj):
+        if not obj.end_date:
+            return "Match is still ongoing"
+        minutes, seconds = divmod(int((obj.end_date - obj.start_date).total_seconds()), 60)
+        if obj.game == MatchTimeline.GameType.PONG:
+            return f"{obj.start_date.strftime('%d-%m-%Y')} {minutes}m {seconds}s"
+        return f"{minutes}m {seconds}s"
 
-    def get_all_matches(self, obj):
-        matches = obj.get_all_matches()
-        return [
-            {
-                'type': 'Pong Match' if isinstance(match, PongMatch) else 'Liars Bar Match',
-                'details': (
-                    PongMatchSerializer(match).data
-                    if isinstance(match, PongMatch) else LiarsBarMatchSerializer(match).data
-                ),
-            }
-            for match in matches
-        ]
+
+def serialize_timeline_page(entries, next_cursor):
+    return {
+        'matches': MatchTimelineSerializer(entries, many=True).data,
+        'next': next_cursor,
+    }
+
+
+def get_presence_status(serializer, user) -> int:
+    """
+    The status of a user, from the statuses the view read from the presence store for every serialized user,
+    or from the store itself when the view did not.
+    """
+    statuses = serializer.context.get('statuses')
+    if statuses is None:
+        statuses = presence_store.read_statuses([user.id])
+    return statuses.get(user.id, User.UserStatus.OFFLINE)
 
 
 class UserProfileSerializer(serializers.ModelSerializer):
     image_url = UserImageSerializer(source='user_image', read_only=True)
     stat = UserStatsSerializer(source='user_stat', read_only=True)
     friendships = serializers.SerializerMethodField()
-    history = MatchHistorySerializer(source='match_history', many=True, read_only=True)
+    history = serializers.SerializerMethodField()
+    status = serializers.SerializerMethodField()
 
     class Meta:
         model = User
@@ -75,6 +99,17 @@ class UserProfileSerializer(serializers.ModelSerializer):
             for field_name in existing - allowed:
                 self.fields.pop(field_name)
 
+    def get_status(self, obj):
+        return get_presence_status(self, obj)
+
+    def get_history(self, obj):
+        """
+        The first page of the match timeline, prefetched by the view when it serializes several users.
+        """
+        if hasattr(obj, 'timeline_page'):
+            return serialize_timeline_page(*MatchTimeline.split_page(obj.timeline_page))
+        return serialize_timeline_page(*MatchTimeline.get_page(obj))
+
     def get_friendships(self, obj):
         current_user = self.context['request'].user
         friendships = Friendships.objects.filter(
@@ -99,7 +134,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
 class SimpleUserProfileSerializer(serializers.ModelSerializer):
     username = serializers.CharField(read_only=True)
     image_url = UserImageSerializer(source='user_image', read_only=True)
-    status = serializers.CharField(source='get_status_display', read_only=True)
+    status = serializers.SerializerMethodField()
     id = serializers.IntegerField(read_only=True)
 
     class Meta:
@@ -117,6 +152,9 @@ class SimpleUserProfileSerializer(serializers.ModelSerializer):
             for field_name in existing - allowed:
                 self.fields.pop(field_name)
 
+    def get_status(self, obj):
+        return User.get_status_name(get_presence_status(self, obj))
+
 
 class ChangePasswordSerializer(serializers.Serializer):
     current_password = serializers.CharField(write_only=True)
@@ -0,0 +1,15 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from website.models import User, UserStats, UserImage
+from utilities.ProfileCache import profile_cache
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_profile(sender, instance: User, **kwargs):
+	profile_cache.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=UserStats)
+@receiver(post_save, sender=UserImage)
+def invalidate_related_profile(sender, instance, **kwargs):
+	profile_cache.invalidate(instance.user_id)
@@ -0,0 +1,82 @@
+from datetime import timedelta
+from django.test import TestCase
+from django.utils import timezone
+from website.models import User, MatchTimeline
+
+class MatchTimelinePageTests(TestCase):
+	"""
+	Keyset pagination of the match timeline (MatchTimeline.get_page).
+	"""
+
+	@classmethod
+	def setUpTestData(cls):
+		cls.user = User.objects.create(username="player", email="player@example.com")
+		cls.other_user = User.objects.create(username="other", email="other@example.com")
+		cls.start = timezone.now().replace(microsecond=0)
+		# Matches share their start date by pairs, so the pages have to break ties on the ID.
+		for index in range(25):
+			cls.add_entry(cls.user, cls.start + timedelta(minutes=index // 2))
+		cls.add_entry(cls.other_user, cls.start)
+
+	@classmethod
+	def add_entry(cls, user, start_date):
+		return MatchTimeline.objects.create(
+			user=user,
+			game=MatchTimeline.GameType.PONG,
+			start_date=start_date,
+			end_date=start_date + timedelta(minutes=3),
+		)
+
+	def expected_order(self) -> list[int]:
+		entries = MatchTimeline.objects.filter(user=self.user)
+		return [entry.id for entry in sorted(entries, key=lambda entry: (entry.start_date, entry.id), reverse=True)]
+
+	def read_pages(self, limit: int) -> list[list[int]]:
+		pages = []
+		cursor = None
+		while True:
+			entries, cursor = MatchTimeline.get_page(self.user, cursor, limit)
+			pages.append([entry.id for entry in entries])
+			if cursor is None:
+				return pages
+
+	def test_pages_list_every_match_once_most_recent_first(self):
+		pages = self.read_pages(10)
+
+		self.assertEqual([len(page) for page in pages], [10, 10, 5])
+		self.assertEqual([entry_id for page in pages for entry_id in page], self.expected_order())
+
+	def test_last_full_page_has_no_cursor(self):
+		entries, cursor = MatchTimeline.get_page(self.user, None, 25)
+
+		self.assertEqual(len(entries), 25)
+		self.assertIsNone(cursor)
+
+	def test_next_page_is_stable_when_new_matches_are_added(self):
+		first_page, cursor = MatchTimeline.get_page(self.user, None, 10)
+		expected_next_page = [entry.id for entry in MatchTimeline.get_page(self.user, cursor, 10)[0]]
+
+		self.add_entry(self.user, self.start + timedelta(hours=1))
+		next_page, _ = MatchTimeline.get_page(self.user, cursor, 10)
+
+		self.assertEqual([entry.id for entry in next_page], expected_next_page)
+
+	def test_prefetched_first_page_matches_get_page(self):
+		user = User.objects.prefetch_related(MatchTimeline.prefetch_first_page(10)).get(pk=self.user.pk)
+		entries, cursor = MatchTimeline.split_page(user.timeline_page, 10)
+		expected_entries, expected_cursor = MatchTimeline.get_page(self.user, None, 10)
+
+		self.assertEqual([entry.id for entry in entries], [entry.id for entry in expected_entries])
+		self.assertEqual(cursor, expected_cursor)
+
+	def test_parse_cursor(self):
+		entry = MatchTimeline.objects.filter(user=self.user).first()
+
+		self.assertEqual(MatchTimeline.parse_cursor(entry.cursor), (entry.start_date, entry.id))
+		# A cursor that was not URL-encoded has its '+' read as a space.
+		self.assertEqual(MatchTimeline.parse_cursor(entry.cursor.replace("+", " ")), (entry.start_date, entry.id))
+
+	def test_malformed_cursor_raises(self):
+		for cursor in ("garbage", "2024-01-01T00:00:00+00:00_x", "_12"):
+			with self.subTest(cursor=cursor), self.assertRaises(ValueError):
+				MatchTimeline.get_page(self.user, cursor)
@@ -1,12 +1,13 @@
 from django.urls import path, re_path
 from . import views
-from .views import UserProfileView, UsersView, ChangePasswordView, UploadUserImageView
+from .views import UserProfileView, UsersView, ChangePasswordView, UploadUserImageView, MatchHistoryView
 
 urlpatterns = [
     path('api/profile', UserProfileView.as_view()),
     path('api/change_password', ChangePasswordView.as_view()),
     path('api/upload_profile_image', UploadUserImageView.as_view()),
     path('api/users', UsersView.as_view()),
+    path('api/match_history', MatchHistoryView.as_view()),
     path('', views.main_page, name='main_page'),
     re_path(r'^(?!media/).*$', views.main_page),
 ]
\ No newline at end of file
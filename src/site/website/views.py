@@ -2,9 +2,10 @@ from rest_framework.views import APIView
 from django.shortcuts import render
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
-from website.models import User, UserImage
+from website.models import User, UserImage, MatchTimeline
+from utilities.PresenceStore import presence_store
 from website.form import UserImageForm
-from .serializers import UserProfileSerializer, SimpleUserProfileSerializer, ChangePasswordSerializer
+from .serializers import UserProfileSerializer, SimpleUserProfileSerializer, ChangePasswordSerializer, serialize_timeline_page
 from rest_framework.response import Response
 from django.middleware.csrf import get_token
 from django.core.validators import validate_slug
@@ -160,13 +161,66 @@ class UsersView(APIView):
 			else:
 				users = User.objects.all()
 
+			if query_type == "full":
+				users = users.select_related('user_stat', 'user_image').prefetch_related(
+					MatchTimeline.prefetch_first_page()
+				)
+			users = list(users)
+			statuses = presence_store.read_statuses([user.id for user in users])
+
 			if query_type == "simple":
-				serializer = SimpleUserProfileSerializer(users, many=True)
+				serializer = SimpleUserProfileSerializer(users, many=True, context={'statuses': statuses})
 			else:
 				serializer = UserProfileSerializer(
-					users, many=True, context={'request': request},
+					users, many=True, context={'request': request, 'statuses': statuses},
 					fields=['username', 'image_url', 'stat', 'status', 'created_at', 'history']
 				)
 			return Response(serializer.data, status=status.HTTP_200_OK)
 		except Exception as e:
-			return Response({"server_error": f"{str(e)}"}, status=503)
\ No newline at end of file
+			return Response({"server_error": f"{str(e)}"}, status=503)
+
+class MatchHistoryView(APIView):
+	"""
+	A view to page through the match timeline of a user.
+	"""
+	permission_classes = [IsAuthenticated]
+	max_limit = 100
+
+	def get(self, request, *args, **kwargs):
+		"""
+		Retrieve a page of the matches of the user given by 'name', or of the logged-in user.
+		'cursor' is the 'next' value of the previous page, 'limit' the number of matches of the page.
+		"""
+		try:
+			name = request.query_params.get('name')
+			cursor = request.query_params.get('cursor')
+
+			try:
+				limit = min(int(request.query_params.get('limit', MatchTimeline.PAGE_SIZE)), self.max_limit)
+				if limit <= 0:
+					raise ValueError
+			except ValueError:
+				return Response(
+					{"detail": "Invalid 'limit' parameter."},
+					status=status.HTTP_400_BAD_REQUEST
+				)
+
+			user = request.user
+			if name:
+				user = User.objects.filter(username=name).first()
+				if user is None:
+					return Response(
+						{"detail": "No matching users found."},
+						status=status.HTTP_404_NOT_FOUND
+					)
+
+			try:
+				entries, next_cursor = MatchTimeline.get_page(user, cursor, limit)
+			except ValueError:
+				return Response(
+					{"detail": "Invalid 'cursor' parameter."},
+					status=status.HTTP_400_BAD_REQUEST
+				)
+			return Response(serialize_timeline_page(entries, next_cursor), status=status.HTTP_200_OK)
+		except Exception as e:
+			return Response({"server_error": f"{str(e)}"}, status=503)